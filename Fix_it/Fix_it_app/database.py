@@ -0,0 +1,63 @@
+"""Connection settings for the database aliases, chosen by ``DB_POOL_MODE``.
+
+- ``persistent`` (default): each worker thread keeps its connection open for
+  ``DB_CONN_MAX_AGE`` seconds and checks it before reuse, so most requests skip
+  the connect/authenticate round trips.
+- ``pool``: Django's native psycopg 3 connection pool (PostgreSQL only,
+  needs ``psycopg[pool]``), sized per worker by ``pool_size``.
+- ``off``: a new connection per request, Django's historical default.
+"""
+from importlib.util import find_spec
+
+from django.core.exceptions import ImproperlyConfigured
+
+POOL_MODES = ('persistent', 'pool', 'off')
+
+
+def pool_size(workers, threads=1, max_connections=100, reserved=5):
+    """Per-worker pool bounds that keep every worker under the server's connection limit.
+
+    A Django thread holds at most one connection per alias at a time, so a
+    worker never needs more than ``threads`` connections; ``reserved`` leaves
+    room for migrations, cron jobs and psql sessions.
+    """
+    workers = max(int(workers), 1)
+    threads = max(int(threads), 1)
+    budget = (max_connections - reserved) // workers
+    if budget < 1:
+        raise ImproperlyConfigured(
+            f'{workers} workers cannot share {max_connections} connections '
+            f'with {reserved} reserved; lower WEB_CONCURRENCY or raise DB_MAX_CONNECTIONS')
+    max_size = min(threads, budget)
+    return {'min_size': max(1, max_size // 2), 'max_size': max_size}
+
+
+def configure_connections(config, mode='persistent', conn_max_age=60, workers=1, threads=1,
+                          max_connections=100, pool_timeout=10):
+    """Apply ``mode`` to a ``dj_database_url`` config dict and return it."""
+    if mode not in POOL_MODES:
+        raise ImproperlyConfigured(f'DB_POOL_MODE must be one of {", ".join(POOL_MODES)}, not {mode!r}')
+    is_postgres = config.get('ENGINE', '').endswith('postgresql')
+    if mode == 'pool' and not is_postgres:
+        # Nothing to pool for SQLite; keep local runs working with the same env.
+        mode = 'persistent'
+
+    if mode == 'off':
+        config['CONN_MAX_AGE'] = 0
+        config['CONN_HEALTH_CHECKS'] = False
+    elif mode == 'persistent':
+        config['CONN_MAX_AGE'] = conn_max_age
+        config['CONN_HEALTH_CHECKS'] = True
+    else:
+        if find_spec('psycopg_pool') is None:
+            raise ImproperlyConfigured('DB_POOL_MODE=pool needs psycopg 3 with the pool extra: '
+                                       'pip install "psycopg[binary,pool]"')
+        # The pool owns connection lifetime; Django refuses persistent
+        # connections on top of it.
+        config['CONN_MAX_AGE'] = 0
+        config['CONN_HEALTH_CHECKS'] = False
+        config.setdefault('OPTIONS', {})['pool'] = {
+            **pool_size(workers, threads, max_connections),
+            'timeout': pool_timeout,
+        }
+    return config
@@ -0,0 +1,124 @@
+"""API documentation views, built on first use.
+
+drf_spectacular's views pull in the whole schema generator, which costs
+more than 100 ms per process to import. Routing through ``lazy_view`` keeps
+that off worker startup and management commands; only the first docs
+request in a process pays for it.
+
+``schema_view`` serves the files written by ``manage.py build_schema`` with
+an ETag, gzip and long cache headers. When no build exists it generates the
+schema live in DEBUG; otherwise it renders it once per process and serves
+that copy the same way.
+"""
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_safe
+
+from main_body.schema import SCHEMA_FILES, compress, render, version_tag
+
+logger = logging.getLogger('Fix_it_app.docs')
+
+CONTENT_TYPES = {
+    'yaml': 'application/vnd.oai.openapi; charset=utf-8',
+    'json': 'application/vnd.oai.openapi+json; charset=utf-8',
+}
+
+# path -> (mtime_ns, content, gzipped content, version tag); reloaded when a deploy rewrites the file.
+_documents = {}
+# format -> (content, gzipped content, version tag), rendered in this process when no build exists.
+_generated = {}
+_generate_lock = threading.Lock()
+
+
+def lazy_view(factory):
+    view = None
+
+    @csrf_exempt
+    def wrapper(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = factory()
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _schema_view():
+    from drf_spectacular.views import SpectacularAPIView
+    return SpectacularAPIView.as_view()
+
+
+def _swagger_view():
+    from drf_spectacular.views import SpectacularSwaggerView
+    from rest_framework.permissions import AllowAny
+    return SpectacularSwaggerView.as_view(
+        url_name='schema',
+        permission_classes=[AllowAny]  # Explicitly set permissions
+    )
+
+
+live_schema_view = lazy_view(_schema_view)
+swagger_view = lazy_view(_swagger_view)
+
+
+def schema_format(request):
+    # Same choices as SpectacularAPIView: ?format=json, or JSON in Accept; YAML otherwise.
+    fmt = request.GET.get('format')
+    if fmt in SCHEMA_FILES:
+        return fmt
+    return 'json' if 'json' in request.headers.get('Accept', '') else 'yaml'
+
+
+def load_document(fmt):
+    path = os.path.join(settings.OPENAPI_SCHEMA_DIR, SCHEMA_FILES[fmt])
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _documents.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as f:
+            content = f.read()
+        with open(f'{path}.gz', 'rb') as f:
+            compressed = f.read()
+        cached = _documents[path] = (mtime, content, compressed, version_tag(content))
+    return cached[1:]
+
+
+def generated_document(fmt):
+    with _generate_lock:
+        if not _generated:
+            logger.warning('No API schema in %s; generating it in this process. '
+                           'Run manage.py build_schema on deploy.', settings.OPENAPI_SCHEMA_DIR)
+            for name, content in render().items():
+                _generated[name] = (content, compress(content), version_tag(content))
+    return _generated[fmt]
+
+
+@csrf_exempt
+@require_safe
+def schema_view(request):
+    fmt = schema_format(request)
+    document = load_document(fmt)
+    if document is None:
+        if settings.DEBUG:
+            return live_schema_view(request)
+        document = generated_document(fmt)
+    content, compressed, tag = document
+
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    etag = f'"{tag}-gzip"' if use_gzip else f'"{tag}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(compressed if use_gzip else content, content_type=CONTENT_TYPES[fmt])
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=settings.OPENAPI_SCHEMA_MAX_AGE)
+    patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+    return response
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import dj_database_url
+from .database import configure_connections
 import os
 from pathlib import Path
 import os
@@ -50,19 +51,29 @@ SPECTACULAR_SETTINGS = {
     'SERVE_AUTHENTICATION': None,  # or add your auth classes
     'SERVE_PERMISSIONS': None,
     'COMPONENT_NO_READ_ONLY_REQUIRED': True,
+    'DEFAULT_GENERATOR_CLASS': 'main_body.schema.SchemaGenerator',
     'SERVE_PERMISSIONS': ['rest_framework.permissions.AllowAny'],
     'SERVE_AUTHENTICATION': None,
+    # A fixed version rather than @latest, so browsers and the CDN can cache the assets.
+    'SWAGGER_UI_DIST': 'https://cdn.jsdelivr.net/npm/swagger-ui-dist@5.17.14',
+    'SWAGGER_UI_FAVICON_HREF': 'https://cdn.jsdelivr.net/npm/swagger-ui-dist@5.17.14/favicon-32x32.png',
     'SWAGGER_UI_SETTINGS': {
         'deepLinking': True,
         'persistAuthorization': True,
     },
 }
 MIDDLEWARE = [
+    'Fix_it_app.staticfiles.StaticFilesMiddleware',  # first: static hits skip everything below
+    'main_body.metrics.MetricsMiddleware',
+    'main_body.compression.CompressionMiddleware',
+    'main_body.profiling.QueryProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main_body.replicas.ReplicaRoutingMiddleware',
+    'main_body.hashing.HashingBusyMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -98,13 +109,52 @@ AUTH_USER_MODEL = 'main_body.User'
 #     }
 # }
 
+# Connection reuse: DB_POOL_MODE=persistent (default), pool (psycopg 3 pool) or off.
+# Pools are sized from the gunicorn worker/thread counts, see Fix_it_app.database.
+DB_CONNECTION_OPTIONS = {
+    'mode': os.environ.get('DB_POOL_MODE', 'persistent'),
+    'conn_max_age': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+    'workers': int(os.environ.get('WEB_CONCURRENCY', 1)),
+    'threads': int(os.environ.get('GUNICORN_THREADS', 1)),
+    'max_connections': int(os.environ.get('DB_MAX_CONNECTIONS', 100)),
+    'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+}
+
 DATABASES = {
-    'default': dj_database_url.config(default='sqlite:///db.sqlite3')
+    'default': configure_connections(
+        dj_database_url.config(default='sqlite:///db.sqlite3'), **DB_CONNECTION_OPTIONS)
 }
 
+# Read replicas for GET traffic to the API viewsets (see main_body.replicas),
+# e.g. DATABASE_REPLICA_URLS=postgres://replica1/db,postgres://replica2/db
+DATABASE_REPLICAS = []
+for _number, _url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), 1):
+    DATABASES[f'replica{_number}'] = configure_connections(
+        dj_database_url.parse(_url.strip()), **DB_CONNECTION_OPTIONS)
+    DATABASES[f'replica{_number}']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(f'replica{_number}')
+DATABASE_ROUTERS = ['main_body.replicas.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 10))
+REPLICA_LAG_CHECK_INTERVAL = 5
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
+# Hashing runs on a small per-process pool (main_body.hashing); 0 threads hashes inline.
+# It reads and writes Django's pbkdf2_sha256 format, so it replaces PBKDF2PasswordHasher (two
+# hashers with one algorithm name would shadow each other); the others still verify old hashes.
+PASSWORD_HASHERS = [
+    'main_body.hashing.BoundedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 1_000_000))
+PASSWORD_HASHING_THREADS = int(os.environ.get('PASSWORD_HASHING_THREADS', 2))
+PASSWORD_HASHING_QUEUE = int(os.environ.get('PASSWORD_HASHING_QUEUE', 8))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -133,6 +183,21 @@ LOGGING = {
         'handlers': ['console'],
         'level': 'INFO',
     },
+    'loggers': {
+        'main_body.profiling': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Per-request SQL profiling (main_body.profiling); off unless API_PROFILING=1
+API_PROFILING = {
+    'ENABLED': os.environ.get('API_PROFILING') == '1',
+    'SLOW_REQUEST_MS': int(os.environ.get('API_PROFILING_SLOW_MS', 500)),
+    'SAMPLE_RATE': float(os.environ.get('API_PROFILING_SAMPLE_RATE', 1.0)),
+    'KEEP': 100,
 }
 
 
@@ -153,6 +218,15 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# collectstatic writes content-hashed names plus .gz/.br copies, which
+# Fix_it_app.staticfiles.StaticFilesMiddleware serves with immutable caching.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'Fix_it_app.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+# Cache lifetime for static files requested by their unhashed name.
+STATIC_MAX_AGE = 60 * 5
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -173,14 +247,18 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ],
     'SEARCH_PARAM': 'search',
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_SCHEMA_CLASS': 'main_body.schema.DeferredAutoSchema',  # see main_body/schema.py
+    'EXCEPTION_HANDLER': 'main_body.hashing.exception_handler',
+    # Reverse proxies in front of gunicorn whose X-Forwarded-For entries are trusted when
+    # throttling by client IP. With 0 the address is REMOTE_ADDR and the header is ignored.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
     'ORDERING_PARAM': 'ordering',
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # The browsable API (forms, templates) is a development aid only.
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
-    ]
+    ] + (['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
 }
 # Email settings (for password reset)
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -192,6 +270,65 @@ EMAIL_HOST_PASSWORD = 'your-email-password'  # to add
 DEFAULT_FROM_EMAIL = 'your-email@example.com'  # to add
 FRONTEND_URL = 'http://your-frontend-url.com'
 
+# Prometheus metrics served at /metrics (main_body.metrics). Point
+# PROMETHEUS_MULTIPROC_DIR at a directory shared by all gunicorn workers to
+# aggregate across processes; set METRICS_TOKEN to require a bearer token.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+METRICS_FLUSH_INTERVAL = 1.0
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Soft-deleted users older than this are anonymized by purge_deleted_users
+USER_PURGE_RETENTION_DAYS = int(os.environ.get('USER_PURGE_RETENTION_DAYS', 90))
+
+# Monthly range partitioning of the order tables (PostgreSQL only, see main_body.partitions)
+DB_PARTITIONING = os.environ.get('DB_PARTITIONING', '0') == '1'
+DB_PARTITION_MONTHS_AHEAD = int(os.environ.get('DB_PARTITION_MONTHS_AHEAD', 3))
+
+# Completed/cancelled orders older than this are moved to the archive tables by archive_orders
+ORDER_ARCHIVE_AFTER_DAYS = int(os.environ.get('ORDER_ARCHIVE_AFTER_DAYS', 365))
+
+# Columnar exports for offline analytics (main_body.export, manage.py export_data)
+EXPORT_DIR = os.environ.get('EXPORT_DIR', os.path.join(BASE_DIR, 'exports'))
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 50_000))
+# Rows younger than this are left for the next run, so in-flight transactions can commit first.
+EXPORT_SETTLE_SECONDS = int(os.environ.get('EXPORT_SETTLE_SECONDS', 60))
+# Rows per table exported by one POST to /api/exports/, so a request stays well inside the
+# gunicorn timeout; the response says which tables have more and the client posts again.
+EXPORT_REQUEST_MAX_ROWS = int(os.environ.get('EXPORT_REQUEST_MAX_ROWS', 100_000))
+
+# Token-bucket throttling of the open endpoints (main_body.throttling). Rates are generous
+# for people and stop scripted bursts; '<scope>.<action>' keys narrow a viewset to one action.
+THROTTLE_ENABLED = os.environ.get('THROTTLE_ENABLED', '1') == '1'
+THROTTLE_STORE = os.environ.get('THROTTLE_STORE', 'main_body.throttling.LocalBucketStore')
+THROTTLE_LOCAL_MAX_KEYS = 100_000
+THROTTLE_BUCKETS = {
+    'login': {'ip': '30/min', 'email': '10/min', 'global': '50/s'},
+    'forgot_password': {'ip': '10/min', 'email': '3/min', 'global': '10/s'},
+    'user.create': {'ip': '10/min', 'email': '3/min', 'global': '10/s'},
+}
+
+# Response compression (main_body.compression): brotli when the package is installed, else gzip.
+# Brotli quality 5 and gzip level 6 trade a little size for far less CPU than the maximums.
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', '1') == '1'
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 5))
+# Views whose responses are the same for everyone; their compressed bodies are cached.
+COMPRESSION_CACHE_VIEWS = {'city-list', 'city-detail'}
+COMPRESSION_CACHE_TIMEOUT = 60 * 10
+
+# Prebuilt OpenAPI schema served at /api/schema/ (manage.py build_schema, see Fix_it_app/docs.py).
+# The schema only changes on deploy, so clients may cache it for a day and revalidate by ETag.
+OPENAPI_SCHEMA_DIR = os.environ.get('OPENAPI_SCHEMA_DIR', os.path.join(BASE_DIR, 'openapi'))
+OPENAPI_SCHEMA_MAX_AGE = int(os.environ.get('OPENAPI_SCHEMA_MAX_AGE', 60 * 60 * 24))
+
+# How long a stored Idempotency-Key response is replayed for
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24  # 24 hours in seconds
+# How long a key stays claimed by a request that hasn't finished. A worker killed mid-request
+# (timeout, recycling) never releases its key; after this a retry may claim it again.
+IDEMPOTENCY_IN_FLIGHT_LEASE = int(os.environ.get('IDEMPOTENCY_IN_FLIGHT_LEASE', 120))
+
 SESSION_COOKIE_AGE = 1209600  # 2 weeks in seconds
 SESSION_COOKIE_SECURE = True if DEBUG else False
 SESSION_COOKIE_HTTPONLY = True
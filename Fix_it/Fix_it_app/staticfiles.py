@@ -0,0 +1,119 @@
+"""Hashed, pre-compressed static files served by the app itself.
+
+``collectstatic`` with ``CompressedManifestStaticFilesStorage`` writes every
+file under a content-hashed name (``base.4f1d2c.css``) and, for text
+formats, ``.gz`` and (with the ``brotli`` package) ``.br`` copies compressed
+at the highest level, since that cost is paid once per deploy.
+
+``StaticFilesMiddleware`` answers ``STATIC_URL`` requests straight from
+``STATIC_ROOT`` before the rest of the middleware runs. It picks the
+smallest variant the client accepts, and marks hashed names immutable for a
+year; a changed file gets a new name, so clients never need to revalidate.
+"""
+import gzip
+import mimetypes
+import os
+from functools import cached_property
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.http import FileResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from main_body.compression import brotli, parse_accept_encoding
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.html', '.xml',
+                           '.ico', '.ttf', '.otf', '.eot')
+
+# Variants in order of preference: file suffix -> Content-Encoding.
+VARIANTS = (('.br', 'br'), ('.gz', 'gzip'))
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def stored_name(self, name):
+        if not self.hashed_files:
+            # collectstatic hasn't run (tests, a fresh checkout): use the plain name.
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in paths:
+            for stored in {name, self.hashed_files.get(self.hash_key(self.clean_name(name)), name)}:
+                if stored.endswith(COMPRESSIBLE_EXTENSIONS):
+                    self.write_variants(self.path(stored))
+
+    def write_variants(self, path):
+        with open(path, 'rb') as f:
+            content = f.read()
+        variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(content, quality=11)
+        for suffix, compressed in variants.items():
+            # Not worth a second file unless it saves at least 5%.
+            if len(compressed) < len(content) * 0.95:
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+
+
+class StaticFilesMiddleware:
+    def __init__(self, get_response):
+        # In DEBUG, runserver serves the app directories as they are edited.
+        if settings.DEBUG or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            response = self.serve(request, request.path[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    @cached_property
+    def hashed_names(self):
+        return set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def serve(self, request, name):
+        try:
+            path = safe_join(settings.STATIC_ROOT, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None  # falls through to the URLconf, which answers 404
+
+        accepted = parse_accept_encoding(request.headers.get('Accept-Encoding', ''))
+        served, encoding = path, None
+        has_variants = False
+        for suffix, coding in VARIANTS:
+            if os.path.isfile(path + suffix):
+                has_variants = True
+                if encoding is None and accepted.get(coding, accepted.get('*', 0)) > 0:
+                    served, encoding = path + suffix, coding
+
+        stat = os.stat(served)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if response is None:
+            content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            response = FileResponse(open(served, 'rb'), content_type=content_type,
+                                    filename=os.path.basename(path))
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if name in self.hashed_names:
+            patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+        else:
+            patch_cache_control(response, public=True, max_age=settings.STATIC_MAX_AGE)
+        if has_variants:
+            patch_vary_headers(response, ('Accept-Encoding',))
+        return response
@@ -1,15 +1,13 @@
 from django.contrib import admin
 from django.urls import path, include
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
-from rest_framework.permissions import AllowAny  
+from main_body.metrics import metrics_view
+from .docs import schema_view, swagger_view
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('main_body.urls')),  # Your existing API endpoints
+    path('metrics', metrics_view, name='metrics'),
     
-    # Swagger/OpenAPI documentation URLs
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
-    path('api/docs/', SpectacularSwaggerView.as_view(
-        url_name='schema',
-        permission_classes=[AllowAny]  # Explicitly set permissions
-    ), name='swagger-ui'),
-]
\ No newline at end of file
+    # Swagger/OpenAPI documentation URLs (loaded on first request, see docs.py)
+    path('api/schema/', schema_view, name='schema'),
+    path('api/docs/', swagger_view, name='swagger-ui'),
+]
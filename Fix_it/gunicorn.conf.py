@@ -0,0 +1,94 @@
+"""Gunicorn settings for the Fix It API.
+
+Gunicorn reads this file automatically when started from this directory
+(see the Procfile). Every value can be overridden from the environment:
+
+GUNICORN_WORKER_CLASS  sync (default), gthread, or uvicorn for the ASGI app
+WEB_CONCURRENCY        worker processes (default: 2 x CPUs + 1, or CPUs + 1 for gthread/uvicorn)
+GUNICORN_THREADS       threads per gthread worker (default 4)
+GUNICORN_PRELOAD       1 (default) imports Django once in the master and forks
+                       the workers from it, so they share that memory copy-on-write
+GUNICORN_MAX_REQUESTS  recycle a worker after this many requests (default 1000, 0 = never)
+GUNICORN_TIMEOUT       seconds before a stuck worker is killed (default 30)
+"""
+import multiprocessing
+import os
+from importlib.util import find_spec
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Fix_it_app.settings')
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'uvicorn': 'uvicorn.workers.UvicornWorker',
+}
+
+_kind = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+if _kind not in WORKER_CLASSES:
+    raise RuntimeError(f'GUNICORN_WORKER_CLASS must be one of {", ".join(WORKER_CLASSES)}, not {_kind!r}')
+if _kind == 'uvicorn' and find_spec('uvicorn') is None:
+    raise RuntimeError('GUNICORN_WORKER_CLASS=uvicorn needs uvicorn: pip install "uvicorn[standard]"')
+if _kind == 'uvicorn':
+    # Django can't reuse or close connections opened in async contexts, so
+    # persistent connections would leak under ASGI (see Fix_it_app.database).
+    if os.environ.get('DB_POOL_MODE') == 'persistent':
+        raise RuntimeError('GUNICORN_WORKER_CLASS=uvicorn needs DB_POOL_MODE=pool or off, not persistent')
+    os.environ.setdefault('DB_POOL_MODE', 'off')
+    os.environ['DB_CONN_MAX_AGE'] = '0'  # also covers pool falling back to persistent on SQLite
+
+_cpus = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = WORKER_CLASSES[_kind]
+wsgi_app = 'Fix_it_app.asgi:application' if _kind == 'uvicorn' else 'Fix_it_app.wsgi:application'
+
+# Sync workers block on the database, so run more of them than there are
+# cores; threaded and async workers overlap I/O within one process instead.
+workers = int(os.environ.get('WEB_CONCURRENCY', _cpus * 2 + 1 if _kind == 'sync' else _cpus + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4)) if _kind == 'gthread' else 1
+
+# The database pool is sized from these (Fix_it_app.database), so settings
+# must see the values gunicorn actually uses.
+os.environ['WEB_CONCURRENCY'] = str(workers)
+os.environ['GUNICORN_THREADS'] = str(threads)
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# Recycle workers gradually to cap slow memory growth; the jitter keeps them
+# from all restarting at the same moment.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5  # behind a load balancer that keeps connections open
+
+# Heartbeat files on tmpfs, so a slow disk can't make workers look hung.
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    # Connections must never be shared across processes. Django doesn't
+    # connect while importing, but drop anything preload may have opened.
+    if preload_app:
+        from django.db import connections
+        connections.close_all()
+
+
+def worker_exit(server, worker):
+    # Write out the last metric samples before a recycled worker goes away.
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        from main_body import metrics
+        metrics.registry.flush(directory)
+
+
+def child_exit(server, worker):
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        from main_body import metrics
+        metrics.mark_process_dead(worker.pid, directory)
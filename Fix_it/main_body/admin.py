@@ -1,10 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, City, Address, Order, Offer, Complaint, Rating
+from .models import User, City, Address, Order, Offer, Complaint, Rating, StatusTransition, ArchivedOrder
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('email', 'first_name', 'last_name', 'display_user_type', 'is_staff')
-    list_filter = ('is_staff', 'is_superuser', 'is_active', 'groups')
+    list_filter = ('is_staff', 'is_superuser', 'is_active', 'is_deleted', 'groups')
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         ('Personal info', {'fields': ('first_name', 'last_name', 'birth_date', 
@@ -23,6 +23,10 @@ class CustomUserAdmin(UserAdmin):
     ordering = ('email',)
     filter_horizontal = ('groups', 'user_permissions',)
     
+    def get_queryset(self, request):
+        # Admins need to see (and restore) soft-deleted accounts too.
+        return User.all_objects.all()
+
     def display_user_type(self, obj):
         return obj.get_user_type_display()
     display_user_type.short_description = 'User Type'
@@ -51,10 +55,30 @@ class ComplaintAdmin(admin.ModelAdmin):
     list_filter = ('type', 'created_at')
     search_fields = ('user__email', 'message')
 
+class StatusTransitionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'object_id', 'from_status', 'to_status', 'user', 'created_at')
+    list_filter = ('kind', 'to_status')
+    search_fields = ('object_id',)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'customer', 'budget', 'created_date', 'archived_at')
+    list_filter = ('status',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(City)
 admin.site.register(Address)
 admin.site.register(Order, OrderAdmin)
 admin.site.register(Offer)
 admin.site.register(Complaint, ComplaintAdmin)
-admin.site.register(Rating, RatingAdmin)
\ No newline at end of file
+admin.site.register(Rating, RatingAdmin)
+admin.site.register(StatusTransition, StatusTransitionAdmin)
+admin.site.register(ArchivedOrder, ArchivedOrderAdmin)
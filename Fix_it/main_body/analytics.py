@@ -0,0 +1,305 @@
+"""Daily rollups behind the ``/analytics/`` endpoints.
+
+Orders, offers and ratings are summed per day of creation (in ``TIME_ZONE``)
+into ``DailyOrderRollup`` (by city and status), ``DailyOfferRollup`` (by
+city, worker and status) and ``DailyRatingRollup`` (by city, worker and
+rate). A report over any date range adds up a few rows per day instead of
+scanning the order tables. The archive tables are rolled up together with
+the live ones, so archiving an order doesn't change the numbers.
+
+``refresh`` rebuilds only the days that changed since its last run, found
+through ``RollupCursor``:
+
+- orders, offers and ratings with an id above the cursor's (new rows)
+- ``StatusTransition`` entries above the cursor's (status changes, including
+  accepted and rejected offers), which dirty the day their order or offer
+  was created
+- the last ``recent_days`` days, which catches rows whose transaction
+  committed after a run had moved the cursor past their id
+
+Other edits, such as a changed budget or a deleted order, aren't in that
+feed and show up when their day is rebuilt again; ``rebuild`` with a range
+(``rollup_analytics --since``) or a periodic ``--full`` run covers them.
+"""
+import datetime
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F, Count, Max, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import (
+    Order, Offer, Rating, ArchivedOrder, ArchivedOffer, ArchivedRating, StatusTransition,
+    DailyOrderRollup, DailyOfferRollup, DailyRatingRollup, RollupCursor,
+)
+
+CURSOR_NAME = 'daily'
+
+# Days rebuilt per transaction by a long rebuild
+CHUNK_DAYS = 31
+
+ONE_DAY = datetime.timedelta(days=1)
+
+
+def day_bounds(first, last):
+    """Aware datetimes covering the days ``first`` to ``last`` inclusive."""
+    start = timezone.make_aware(datetime.datetime.combine(first, datetime.time.min))
+    end = timezone.make_aware(datetime.datetime.combine(last + ONE_DAY, datetime.time.min))
+    return start, end
+
+
+def day_runs(days, max_length=CHUNK_DAYS):
+    """Group days into ``(first, last)`` runs of consecutive days, at most ``max_length`` long."""
+    runs = []
+    for day in sorted(set(days)):
+        if runs and day - runs[-1][1] == ONE_DAY and (day - runs[-1][0]).days < max_length:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return [tuple(run) for run in runs]
+
+
+def _archived_offers():
+    # Offers archived before they recorded created_date fall back to the order's date.
+    return ArchivedOffer.objects.annotate(at=Coalesce('created_date', 'order__created_date'))
+
+
+def _accepted_worker(offer_model):
+    return Subquery(offer_model.objects.filter(
+        order=OuterRef('order'), is_accept=True).values('worker')[:1])
+
+
+def _add(totals, rows, key):
+    for row in rows:
+        bucket = totals[tuple(row.pop(field) for field in key)]
+        for name, value in row.items():
+            bucket[name] += value or 0
+
+
+def _order_totals(start, end):
+    key = ('day', 'city', 'status')
+    totals = defaultdict(Counter)
+    for orders, offers in ((Order.objects, Offer.objects), (ArchivedOrder.objects, ArchivedOffer.objects)):
+        in_range = orders.filter(created_date__gte=start, created_date__lt=end)
+        _add(totals, in_range.values(
+            'status', day=TruncDate('created_date'), city=F('address__city'),
+        ).annotate(orders=Count('pk'), budget_sum=Sum('budget')).order_by(), key)
+        # The order flow accepts at most one offer per order, so joining from
+        # the accepted offers counts each order once.
+        _add(totals, offers.filter(
+            is_accept=True, order__created_date__gte=start, order__created_date__lt=end,
+        ).values(
+            day=TruncDate('order__created_date'), city=F('order__address__city'),
+            order_status=F('order__status'),
+        ).annotate(
+            accepted_orders=Count('pk'), accepted_budget_sum=Sum('order__budget'),
+            accepted_price_sum=Sum('price'),
+        ).order_by(), ('day', 'city', 'order_status'))
+    return totals
+
+
+def _offer_totals(start, end):
+    key = ('day', 'city', 'worker', 'status')
+    totals = defaultdict(Counter)
+    for offers, at in ((Offer.objects.all(), 'created_date'), (_archived_offers(), 'at')):
+        _add(totals, offers.filter(**{f'{at}__gte': start, f'{at}__lt': end}).values(
+            'worker', 'status', day=TruncDate(at), city=F('order__address__city'),
+        ).annotate(offers=Count('pk'), price_sum=Sum('price')).order_by(), key)
+    return totals
+
+
+def _rating_totals(start, end):
+    key = ('day', 'city', 'worker', 'rate')
+    totals = defaultdict(Counter)
+    for ratings, offers in ((Rating.objects, Offer), (ArchivedRating.objects, ArchivedOffer)):
+        _add(totals, ratings.filter(created_at__gte=start, created_at__lt=end).values(
+            'rate', day=TruncDate('created_at'), city=F('order__address__city'),
+            worker=_accepted_worker(offers),
+        ).annotate(ratings=Count('pk')).order_by(), key)
+    return totals
+
+
+ROLLUPS = (
+    (DailyOrderRollup, _order_totals, ('day', 'city_id', 'status')),
+    (DailyOfferRollup, _offer_totals, ('day', 'city_id', 'worker_id', 'status')),
+    (DailyRatingRollup, _rating_totals, ('day', 'city_id', 'worker_id', 'rate')),
+)
+
+
+def rebuild(first, last):
+    """Recompute the rollups of the days ``first`` to ``last``; returns the rows written."""
+    written = 0
+    for run_first, run_last in day_runs(_days_between(first, last)):
+        written += _rebuild_run(run_first, run_last)
+    return written
+
+
+def _days_between(first, last):
+    return [first + ONE_DAY * n for n in range((last - first).days + 1)]
+
+
+def _rebuild_run(first, last):
+    start, end = day_bounds(first, last)
+    written = 0
+    with transaction.atomic():
+        # Serializes concurrent rebuilds, which would otherwise insert the same keys twice.
+        RollupCursor.objects.select_for_update().get_or_create(name=CURSOR_NAME)
+        for model, totals, fields in ROLLUPS:
+            rows = [model(**dict(zip(fields, key)), **values) for key, values in totals(start, end).items()]
+            model.objects.filter(day__gte=first, day__lte=last).delete()
+            model.objects.bulk_create(rows, batch_size=1000)
+            written += len(rows)
+    return written
+
+
+def _created_days(queryset, field):
+    return set(queryset.annotate(created_day=TruncDate(field)).order_by()
+               .values_list('created_day', flat=True).distinct())
+
+
+def _new_row_sources():
+    """Cursor field -> (queryset, creation time field) pairs holding the rows it counts."""
+    return {
+        'order_id': [(Order.objects.all(), 'created_date'), (ArchivedOrder.objects.all(), 'created_date')],
+        'offer_id': [(Offer.objects.all(), 'created_date'), (_archived_offers(), 'at')],
+        'rating_id': [(Rating.objects.all(), 'created_at'), (ArchivedRating.objects.all(), 'created_at')],
+    }
+
+
+def changed_days(cursor):
+    """Days whose rollups are stale since ``cursor``, and the ids the cursor should move to."""
+    days = set()
+    marks = {}
+    sources = _new_row_sources()
+    for field, querysets in sources.items():
+        since = getattr(cursor, field)
+        marks[field] = since
+        for queryset, at in querysets:
+            queryset = queryset.filter(pk__gt=since)
+            top = queryset.aggregate(top=Max('pk'))['top']
+            if top is not None:
+                days |= _created_days(queryset.filter(pk__lte=top), at)
+                marks[field] = max(marks[field], top)
+
+    transitions = StatusTransition.objects.filter(pk__gt=cursor.transition_id)
+    top = transitions.aggregate(top=Max('pk'))['top']
+    marks['transition_id'] = top if top is not None else cursor.transition_id
+    if top is not None:
+        transitions = transitions.filter(pk__lte=top)
+        order_ids = transitions.filter(kind=1).values('object_id')
+        offer_ids = transitions.filter(kind=2).values('object_id')
+        for orders, at in sources['order_id']:
+            days |= _created_days(orders.filter(pk__in=order_ids), at)
+        for offers, at in sources['offer_id']:
+            changed = offers.filter(pk__in=offer_ids)
+            # An accepted offer also changes its order's day.
+            days |= _created_days(changed, at) | _created_days(changed, 'order__created_date')
+    return days, marks
+
+
+def refresh(recent_days=1):
+    """Rebuild the days changed since the last refresh; returns ``(days rebuilt, rows written)``."""
+    cursor, _ = RollupCursor.objects.get_or_create(name=CURSOR_NAME)
+    days, marks = changed_days(cursor)
+    today = timezone.localdate()
+    days.update(today - ONE_DAY * n for n in range(recent_days + 1))
+    written = sum(_rebuild_run(first, last) for first, last in day_runs(days))
+    RollupCursor.objects.filter(name=CURSOR_NAME).update(refreshed_at=timezone.now(), **marks)
+    return len(days), written
+
+
+def first_day():
+    """The earliest creation day in the order tables, or None if they're empty."""
+    firsts = [orders.aggregate(first=Min('created_date'))['first']
+              for orders in (Order.objects, ArchivedOrder.objects)]
+    firsts = [first for first in firsts if first is not None]
+    return timezone.localtime(min(firsts)).date() if firsts else None
+
+
+def rebuild_all():
+    """Rebuild every day from the first order to today and move the cursor past
+    everything read; returns ``(first day, rows written)``."""
+    marks = {field: max(queryset.aggregate(top=Max('pk'))['top'] or 0 for queryset, _ in querysets)
+             for field, querysets in _new_row_sources().items()}
+    marks['transition_id'] = StatusTransition.objects.aggregate(top=Max('pk'))['top'] or 0
+    today = timezone.localdate()
+    first = first_day() or today
+    written = rebuild(first, today)
+    RollupCursor.objects.update_or_create(
+        name=CURSOR_NAME, defaults=dict(refreshed_at=timezone.now(), **marks))
+    return first, written
+
+
+# Reports
+
+def _report(model, params, group_by, filters, **aggregates):
+    queryset = model.objects.filter(day__gte=params['date_from'], day__lte=params['date_to'])
+    for field in filters:
+        if params.get(field) is not None:
+            queryset = queryset.filter(**{field: params[field]})
+    if not group_by:
+        return [queryset.aggregate(**aggregates)]
+    return list(queryset.values(*group_by).annotate(**aggregates).order_by(*group_by))
+
+
+def _ratio(part, whole, digits=2):
+    return round(part / whole, digits) if whole else None
+
+
+def order_report(params, group_by):
+    rows = _report(
+        DailyOrderRollup, params, group_by, ('city', 'status'),
+        orders=Sum('orders'), budget=Sum('budget_sum'), accepted_orders=Sum('accepted_orders'),
+        accepted_budget=Sum('accepted_budget_sum'), accepted_price=Sum('accepted_price_sum'))
+    for row in rows:
+        orders, accepted = row['orders'] or 0, row['accepted_orders'] or 0
+        row.update(
+            orders=orders,
+            avg_budget=_ratio(row.pop('budget'), orders),
+            accepted_orders=accepted,
+            avg_accepted_budget=_ratio(row.pop('accepted_budget'), accepted),
+            avg_accepted_price=_ratio(row.pop('accepted_price'), accepted),
+        )
+    return rows
+
+
+def offer_report(params, group_by):
+    accepted = Q(status=2)
+    rows = _report(
+        DailyOfferRollup, params, group_by, ('city', 'worker', 'status'),
+        total=Sum('offers'), accepted=Sum('offers', filter=accepted),
+        rejected=Sum('offers', filter=Q(status=3)), price=Sum('price_sum'),
+        accepted_price=Sum('price_sum', filter=accepted))
+    for row in rows:
+        offers, accepted_offers = row.pop('total') or 0, row['accepted'] or 0
+        row.update(
+            offers=offers,
+            accepted=accepted_offers,
+            rejected=row['rejected'] or 0,
+            acceptance_rate=_ratio(accepted_offers, offers, 4),
+            avg_price=_ratio(row.pop('price'), offers),
+            avg_accepted_price=_ratio(row.pop('accepted_price'), accepted_offers),
+        )
+    return rows
+
+
+RATES = range(1, 6)
+
+
+def rating_report(params, group_by):
+    rows = _report(DailyRatingRollup, params, list(group_by) + ['rate'], ('city', 'worker'),
+                   ratings=Sum('ratings'))
+    grouped = {}
+    for row in rows:
+        key = tuple(row[field] for field in group_by)
+        report = grouped.setdefault(key, dict(zip(group_by, key), distribution=dict.fromkeys(RATES, 0)))
+        report['distribution'][row['rate']] = row['ratings']
+    for report in grouped.values():
+        distribution = report['distribution']
+        total = sum(distribution.values())
+        report.update(ratings=total,
+                      average=_ratio(sum(rate * n for rate, n in distribution.items()), total))
+    if not grouped and not group_by:
+        return [{'distribution': dict.fromkeys(RATES, 0), 'ratings': 0, 'average': None}]
+    return list(grouped.values())
@@ -0,0 +1,57 @@
+from django.db import transaction
+from .models import Order, Offer, Rating, ArchivedOrder, ArchivedOffer, ArchivedRating
+
+# Only orders that can no longer change are archived.
+ARCHIVABLE_STATUSES = (3, 4)  # Completed, Cancelled
+
+ORDER_FIELDS = ['id', 'status', 'notes', 'photo', 'short_video', 'budget', 'created_date',
+                'address_id', 'customer_id']
+OFFER_FIELDS = ['id', 'status', 'is_accept', 'price', 'company_paid', 'notes',
+                'last_time_date', 'expected_date', 'created_date', 'order_id', 'worker_id']
+RATING_FIELDS = ['id', 'rate', 'note', 'order_id', 'user_id', 'created_at']
+
+
+def archivable(before):
+    return Order.objects.filter(status__in=ARCHIVABLE_STATUSES, created_date__lt=before)
+
+
+def _copy(rows, model, fields):
+    return model.objects.bulk_create([model(**{f: getattr(row, f) for f in fields}) for row in rows])
+
+
+def archive_batch(ids):
+    """Move the given orders and their offers and ratings to the archive tables in one transaction."""
+    with transaction.atomic():
+        # Re-check the status under the lock: an order could have been
+        # reopened between picking the batch and getting here.
+        orders = list(Order.objects.select_for_update().filter(
+            pk__in=ids, status__in=ARCHIVABLE_STATUSES))
+        if not orders:
+            return 0, 0, 0
+        order_ids = [order.pk for order in orders]
+        offers = list(Offer.objects.filter(order_id__in=order_ids))
+        ratings = list(Rating.objects.filter(order_id__in=order_ids))
+
+        _copy(orders, ArchivedOrder, ORDER_FIELDS)
+        _copy(offers, ArchivedOffer, OFFER_FIELDS)
+        _copy(ratings, ArchivedRating, RATING_FIELDS)
+
+        Rating.objects.filter(order_id__in=order_ids).delete()
+        Offer.objects.filter(order_id__in=order_ids).delete()
+        Order.objects.filter(pk__in=order_ids).delete()
+    return len(orders), len(offers), len(ratings)
+
+
+def archive_orders(before, batch_size=500):
+    """Archive every completed/cancelled order created before ``before``; returns moved row counts."""
+    totals = [0, 0, 0]
+    last_id = 0
+    while True:
+        ids = list(archivable(before).filter(pk__gt=last_id).order_by('pk')
+                   .values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        last_id = ids[-1]
+        for i, moved in enumerate(archive_batch(ids)):
+            totals[i] += moved
+    return tuple(totals)
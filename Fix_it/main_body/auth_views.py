@@ -1,6 +1,6 @@
  
 from django.contrib.auth import authenticate, login, logout
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -10,19 +10,19 @@ from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from .models import User
+from .throttling import LoginThrottle, ForgotPasswordThrottle
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([LoginThrottle])
 def user_login(request):
     email = request.data.get('email')
     password = request.data.get('password')
     
+    # Soft-deleted users are hidden by the default manager, so authenticate()
+    # never returns them.
     user = authenticate(request, username=email, password=password)
     if user is not None:
-        if user.is_deleted:
-            return Response({'detail': 'This account has been deactivated'}, 
-                          status=status.HTTP_400_BAD_REQUEST)
-        
         login(request, user)
         return Response({
             'detail': 'Login successful',
@@ -43,10 +43,11 @@ def user_logout(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([ForgotPasswordThrottle])
 def forgot_password(request):
     email = request.data.get('email')
     try:
-        user = User.objects.get(email=email, is_deleted=False)
+        user = User.objects.get(email=email)
     except User.DoesNotExist:
         return Response({'detail': 'User not found'}, 
                       status=status.HTTP_404_NOT_FOUND)
@@ -71,7 +72,7 @@ def forgot_password(request):
 def reset_password(request, uidb64, token):
     try:
         uid = force_str(urlsafe_base64_decode(uidb64))
-        user = User.objects.get(pk=uid, is_deleted=False)
+        user = User.objects.get(pk=uid)
     except (TypeError, ValueError, OverflowError, User.DoesNotExist):
         user = None
     
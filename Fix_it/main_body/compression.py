@@ -0,0 +1,178 @@
+"""Compress responses with brotli or gzip, negotiated from ``Accept-Encoding``.
+
+Brotli is used when the ``brotli`` package is installed and the client
+prefers it; otherwise gzip. Bodies under ``COMPRESSION_MIN_SIZE`` bytes,
+binary content types and responses that already carry a
+``Content-Encoding`` (e.g. the prebuilt schema) are left alone.
+
+Streaming responses (exports, server-sent events) are compressed chunk by
+chunk and flushed after every chunk, so a client sees each event as soon as
+the view yields it instead of when the compressor's buffer fills.
+
+Responses of the views named in ``COMPRESSION_CACHE_VIEWS`` are the same for
+every caller, so their compressed bytes are kept in the cache keyed by a
+hash of the body and reused until ``COMPRESSION_CACHE_TIMEOUT``.
+"""
+import gzip
+import hashlib
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+
+from .metrics import record_cache
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml',
+                      'application/vnd.oai.openapi')
+
+
+def is_compressible(content_type):
+    media_type = content_type.split(';')[0].strip().lower()
+    return media_type.startswith(COMPRESSIBLE_TYPES) or media_type.endswith(('+json', '+xml'))
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def parse_accept_encoding(header):
+    """``{coding: q}`` for an Accept-Encoding header."""
+    accepted = {}
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(header):
+    """The best encoding we can produce for this Accept-Encoding, or None."""
+    accepted = parse_accept_encoding(header or '')
+    best, best_q = None, 0.0
+    for coding in available_encodings():  # our preference order breaks ties
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class StreamCompressor:
+    """Incremental compressor that flushes after every chunk."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self.compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            # wbits=31: zlib stream with a gzip header and trailer.
+            self.compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data):
+        if self.encoding == 'br':
+            return self.compressor.process(data) + self.compressor.flush()
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+
+def compress_stream(chunks, encoding):
+    compressor = StreamCompressor(encoding)
+    for data in chunks:
+        if data:
+            yield compressor.chunk(data)
+    yield compressor.finish()
+
+
+async def compress_async_stream(chunks, encoding):
+    compressor = StreamCompressor(encoding)
+    async for data in chunks:
+        if data:
+            yield compressor.chunk(data)
+    yield compressor.finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'COMPRESSION_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.should_compress(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compress_async_stream(response.streaming_content, encoding)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, encoding)
+            # The compressed length isn't known until the stream ends.
+            response.headers.pop('Content-Length', None)
+        else:
+            compressed = self.compress_content(request, response, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # The compressed body is a different representation, so a strong
+        # ETag must become weak (RFC 9110 8.8.1), as Django's GZipMiddleware does.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def should_compress(self, response):
+        if response.has_header('Content-Encoding') or response.status_code in (204, 206, 304):
+            return False
+        if 'no-transform' in response.get('Cache-Control', ''):
+            return False
+        if not is_compressible(response.get('Content-Type', '')):
+            return False
+        return response.streaming or len(response.content) >= settings.COMPRESSION_MIN_SIZE
+
+    def compress_content(self, request, response, encoding):
+        match = getattr(request, 'resolver_match', None)
+        cacheable = (request.method == 'GET' and response.status_code == 200 and match is not None
+                     and match.url_name in settings.COMPRESSION_CACHE_VIEWS)
+        if not cacheable:
+            return compress(response.content, encoding)
+        key = f'compressed:{encoding}:{hashlib.sha256(response.content).hexdigest()}'
+        compressed = cache.get(key)
+        record_cache('compression', compressed is not None)
+        if compressed is None:
+            compressed = compress(response.content, encoding)
+            cache.set(key, compressed, settings.COMPRESSION_CACHE_TIMEOUT)
+        return compressed
@@ -0,0 +1,16 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from . import profiling
+from .permissions import IsAdmin
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def profile_report(request):
+    config = profiling.get_config()
+    return Response({
+        'enabled': config['ENABLED'],
+        'slow_request_ms': config['SLOW_REQUEST_MS'],
+        'sample_rate': config['SAMPLE_RATE'],
+        'requests': list(reversed(profiling.recent_slow_requests)),
+    })
@@ -0,0 +1,358 @@
+"""Columnar bulk export of the main tables for offline analytics.
+
+``export`` writes each table in ``TABLES`` to
+``<directory>/<table>/date=YYYY-MM-DD/part-<run>-<n>.<suffix>``, partitioned
+by the day each row was created, in the layout Spark, DuckDB and
+``pyarrow.dataset`` read as a Hive-partitioned dataset. The format is
+Parquet (zstd) when ``pyarrow`` is installed. Without it the files are
+gzipped JSON lines, with a schema line and then one object per batch of
+rows, holding one list per column.
+
+Rows are read in primary-key order with ``QuerySet.iterator``, which
+streams them through a server-side cursor on PostgreSQL, from a healthy
+read replica when there is one. At most ``EXPORT_CHUNK_SIZE`` rows are
+held in memory at a time.
+
+Exports are incremental. ``_state.json`` in the export directory records
+the last id written for each table, and the next run appends new part files
+for newer rows only. A run stops before the first row younger than
+``EXPORT_SETTLE_SECONDS``, so a transaction still in flight can't commit an
+id below the recorded one. Rows are never rewritten. Status changes arrive through the
+``status_transition`` table.
+
+``max_rows`` caps a run at about that many rows per table; the rest are
+left for the next run, so a capped run finishes quickly and still commits
+its progress. The summary reports ``complete: False`` for a table that has
+more rows waiting.
+
+Nothing that identifies a person is exported: names, email addresses,
+phone numbers, birth dates, photos and free-text notes and messages are
+left out, and users are referenced by id.
+"""
+import fcntl
+import gzip
+import json
+import os
+from collections import OrderedDict
+from importlib.util import find_spec
+from typing import Callable, NamedTuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Max, Min
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from . import replicas
+from .models import (
+    User, Order, Offer, Rating, Complaint, StatusTransition,
+    ArchivedOrder, ArchivedOffer, ArchivedRating,
+)
+
+STATE_FILE = '_state.json'
+LOCK_FILE = '_export.lock'
+
+# Part files open at once per table; a partition evicted from this is
+# continued in a new part file if more of its rows turn up.
+MAX_OPEN_PARTS = 32
+
+
+class ExportInProgress(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'An export is already running.'
+    default_code = 'export_in_progress'
+
+
+class Table(NamedTuple):
+    sources: Callable  # () -> querysets holding the table's rows
+    date_field: str    # partition column, also used for the settle cutoff
+    columns: tuple     # (name, type) in file order
+    lookups: dict = {}  # column name -> ORM lookup, where they differ
+
+
+TABLES = {
+    'order': Table(
+        lambda: [Order.objects.all(), ArchivedOrder.objects.all()],
+        'created_date',
+        (('id', 'int64'), ('status', 'int16'), ('budget', 'float64'), ('created_date', 'timestamp'),
+         ('customer_id', 'int64'), ('city_id', 'int64')),
+        {'city_id': 'address__city'},
+    ),
+    'offer': Table(
+        # Offers archived before they recorded created_date take the order's.
+        lambda: [Offer.objects.annotate(created=F('created_date')),
+                 ArchivedOffer.objects.annotate(created=Coalesce('created_date', 'order__created_date'))],
+        'created_date',
+        (('id', 'int64'), ('order_id', 'int64'), ('worker_id', 'int64'), ('status', 'int16'),
+         ('is_accept', 'bool'), ('price', 'float64'), ('company_paid', 'bool'),
+         ('expected_date', 'timestamp'), ('created_date', 'timestamp')),
+        {'created_date': 'created'},
+    ),
+    'rating': Table(
+        lambda: [Rating.objects.all(), ArchivedRating.objects.all()],
+        'created_at',
+        (('id', 'int64'), ('order_id', 'int64'), ('user_id', 'int64'), ('rate', 'int16'),
+         ('created_at', 'timestamp')),
+    ),
+    'complaint': Table(
+        lambda: [Complaint.objects.all()],
+        'created_at',
+        (('id', 'int64'), ('user_id', 'int64'), ('type', 'int16'), ('created_at', 'timestamp')),
+    ),
+    'user': Table(
+        lambda: [User.all_objects.all()],
+        'date_joined',
+        (('id', 'int64'), ('user_type', 'int16'), ('work_experience', 'int64'), ('is_active', 'bool'),
+         ('is_deleted', 'bool'), ('date_joined', 'timestamp'), ('deleted_at', 'timestamp')),
+    ),
+    'status_transition': Table(
+        lambda: [StatusTransition.objects.all()],
+        'created_at',
+        (('id', 'int64'), ('kind', 'int16'), ('object_id', 'int64'), ('from_status', 'int16'),
+         ('to_status', 'int16'), ('user_id', 'int64'), ('created_at', 'timestamp')),
+    ),
+}
+
+
+def file_format():
+    # pyarrow is optional (pip install pyarrow) and slow to import, so only
+    # ParquetPart loads it.
+    return 'parquet' if find_spec('pyarrow') is not None else 'jsonl.gz'
+
+
+class ParquetPart:
+    suffix = '.parquet'
+
+    def __init__(self, path, columns):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        types = {
+            'int64': pyarrow.int64(), 'int16': pyarrow.int16(), 'float64': pyarrow.float64(),
+            'bool': pyarrow.bool_(), 'timestamp': pyarrow.timestamp('us', tz='UTC'),
+        }
+        self.schema = pyarrow.schema([(name, types[kind]) for name, kind in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write(self, rows):
+        pa = self.pyarrow
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), self.schema)]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class JsonPart:
+    suffix = '.jsonl.gz'
+
+    def __init__(self, path, columns):
+        self.names = [name for name, _ in columns]
+        self.file = gzip.open(path, 'wt', encoding='utf-8')
+        self.file.write(json.dumps({'schema': dict(columns)}) + '\n')
+
+    def write(self, rows):
+        batch = {name: list(values) for name, values in zip(self.names, zip(*rows))}
+        self.file.write(json.dumps(batch, cls=DjangoJSONEncoder) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class TableWriter:
+    """Buffers one table's rows per day and writes them to temporary part files."""
+
+    def __init__(self, directory, name, table, run, batch_size):
+        self.directory = os.path.join(directory, name)
+        self.table = table
+        self.run = run
+        self.batch_size = batch_size
+        self.part_class = ParquetPart if file_format() == 'parquet' else JsonPart
+        self.date_index = [column for column, _ in table.columns].index(table.date_field)
+        self.buffers = {}
+        self.buffered = 0
+        self.open_parts = OrderedDict()
+        self.files = []  # (temporary path, final path)
+
+    def add(self, row):
+        day = timezone.localtime(row[self.date_index]).date()
+        self.buffers.setdefault(day, []).append(row)
+        self.buffered += 1
+        # Rows come in id order, which is nearly creation order, so this is
+        # usually one or two days' worth.
+        if self.buffered >= self.batch_size:
+            for day in list(self.buffers):
+                self.flush(day)
+
+    def flush(self, day):
+        rows = self.buffers.pop(day, None)
+        if not rows:
+            return
+        self.buffered -= len(rows)
+        part = self.open_parts.get(day)
+        if part is None:
+            part = self.open_parts[day] = self.open_part(day)
+            while len(self.open_parts) > MAX_OPEN_PARTS:
+                self.open_parts.popitem(last=False)[1].close()
+        self.open_parts.move_to_end(day)
+        part.write(rows)
+
+    def open_part(self, day):
+        partition = os.path.join(self.directory, f'date={day:%Y-%m-%d}')
+        os.makedirs(partition, exist_ok=True)
+        name = f'part-{self.run}-{len(self.files)}{self.part_class.suffix}'
+        # Dataset readers skip names starting with '_' until the run commits.
+        temporary = os.path.join(partition, '_' + name)
+        self.files.append((temporary, os.path.join(partition, name)))
+        return self.part_class(temporary, self.table.columns)
+
+    def close(self):
+        for day in list(self.buffers):
+            self.flush(day)
+        for part in self.open_parts.values():
+            part.close()
+        self.open_parts.clear()
+
+
+def load_state(directory):
+    try:
+        with open(os.path.join(directory, STATE_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'tables': {}, 'pending': None}
+
+
+def save_state(directory, state):
+    path = os.path.join(directory, STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def _remove_run_files(directory, run=None):
+    """Delete uncommitted part files, and every file of ``run`` if given."""
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.startswith('_part-') or (run and name.startswith(f'part-{run}-')):
+                os.remove(os.path.join(root, name))
+
+
+def export_table(table, writer, since, settle, alias, chunk_size, max_rows=None):
+    """Stream rows of ``table`` with ids above ``since`` into ``writer``.
+
+    ``settle`` is the ``(start, end)`` of the window around now in which a
+    row counts as young. Returns ``(rows, last id, complete)``; ``complete``
+    is False when ``max_rows`` left rows for the next run.
+    """
+    lookups = [table.lookups.get(column, column) for column, _ in table.columns]
+    date_lookup = table.lookups.get(table.date_field, table.date_field)
+    sources = table.sources()
+    # Stop short of the first young row in the live table, so every id up
+    # to the recorded one has been written. Rows dated further ahead (clock
+    # skew, imported data) don't hold the export back.
+    live = sources[0].using(alias).filter(pk__gt=since)
+    young = live.filter(**{f'{date_lookup}__range': settle}).aggregate(first=Min('pk'))['first']
+    until = young - 1 if young is not None else live.aggregate(last=Max('pk'))['last'] or since
+    complete = True
+    if max_rows:
+        # The max_rows-th id of each source; below the lowest of them every
+        # source holds at most max_rows rows.
+        for queryset in sources:
+            cap = (queryset.using(alias).filter(pk__gt=since, pk__lte=until)
+                   .order_by('pk').values_list('pk', flat=True)[max_rows - 1:max_rows].first())
+            if cap is not None and cap < until:
+                until, complete = cap, False
+    count = 0
+    for queryset in sources:
+        rows = (queryset.using(alias)
+                .filter(pk__gt=since, pk__lte=until)
+                .order_by('pk')
+                .values_list(*lookups))
+        for row in rows.iterator(chunk_size=chunk_size):
+            writer.add(row)
+            count += 1
+    return count, until, complete
+
+
+def export(directory=None, tables=None, chunk_size=None, max_rows=None):
+    """Append rows added since the last export.
+
+    Returns ``{table: {'rows', 'files', 'last_id', 'complete'}}``.
+    """
+    directory = directory or settings.EXPORT_DIR
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise ExportInProgress()
+        return _export(directory, tables or list(TABLES), chunk_size, max_rows)
+
+
+def _export(directory, tables, chunk_size, max_rows):
+    state = load_state(directory)
+    if state.get('format', file_format()) != file_format():
+        raise ImproperlyConfigured(
+            f"{directory} holds {state['format']} files; export {file_format()} to a new directory")
+    # A run that died while committing left some of its files in place; it
+    # never recorded its ids, so drop them all and export those rows again.
+    _remove_run_files(directory, state.get('pending'))
+    state['pending'] = None
+
+    now = timezone.now()
+    run = now.strftime('%Y%m%dT%H%M%S%f')
+    margin = timezone.timedelta(seconds=settings.EXPORT_SETTLE_SECONDS)
+    settle = (now - margin, now + margin)
+    alias = replicas.choose_replica() or 'default'
+
+    summary, writers = {}, []
+    for name in tables:
+        table = TABLES[name]
+        since = state['tables'].get(name, {}).get('last_id', 0)
+        writer = TableWriter(directory, name, table, run, chunk_size)
+        try:
+            rows, last_id, complete = export_table(table, writer, since, settle, alias, chunk_size,
+                                                   max_rows)
+        finally:
+            writer.close()
+        writers.append(writer)
+        summary[name] = {'rows': rows, 'files': len(writer.files), 'last_id': last_id,
+                         'complete': complete}
+
+    state['pending'] = run
+    save_state(directory, state)
+    for writer in writers:
+        for temporary, final in writer.files:
+            os.replace(temporary, final)
+    for name, result in summary.items():
+        state['tables'][name] = {'last_id': result['last_id'], 'exported_at': now.isoformat()}
+    state['pending'] = None
+    state['format'] = file_format()
+    save_state(directory, state)
+    return summary
+
+
+def list_files(directory=None, table=None):
+    """Committed part files, as ``{'table', 'date', 'name', 'path', 'size'}`` sorted by path."""
+    directory = directory or settings.EXPORT_DIR
+    files = []
+    for name in ([table] if table else TABLES):
+        for root, _, names in os.walk(os.path.join(directory, name)):
+            for file_name in names:
+                if not file_name.startswith('part-'):
+                    continue
+                path = os.path.join(root, file_name)
+                relative = os.path.relpath(path, directory)
+                files.append({
+                    'table': name,
+                    'date': os.path.basename(root).partition('=')[2],
+                    'name': file_name,
+                    'path': relative.replace(os.sep, '/'),
+                    'size': os.path.getsize(path),
+                })
+    return sorted(files, key=lambda f: f['path'])
@@ -1,6 +1,6 @@
 # filters.py
 from django_filters import rest_framework as filters
-from .models import User, Order, Offer
+from .models import User, Order, Offer, ArchivedOrder
 from django.db import models as django_models
 from django_filters import DateFromToRangeFilter, NumberFilter
 
@@ -65,6 +65,11 @@ class OrderFilter(BaseOrderFilterSet):
             'budget': ['exact', 'lt', 'lte', 'gt', 'gte'],
             'created_date': ['exact', 'lt', 'lte', 'gt', 'gte'],
         }
+
+class ArchivedOrderFilter(OrderFilter):
+    class Meta(OrderFilter.Meta):
+        model = ArchivedOrder
+
 class OfferFilter(BaseFilterSet):
     price_min = NumberFilter(field_name='price', lookup_expr='gte')
     price_max = NumberFilter(field_name='price', lookup_expr='lte')
@@ -0,0 +1,128 @@
+"""Password hashing on a bounded, per-process thread pool.
+
+PBKDF2 is deliberately slow (about a second of CPU per hash at Django's
+default cost), and during a login storm every worker thread ends up inside
+it, so unrelated requests queue behind logins. ``BoundedPBKDF2PasswordHasher``
+runs each hash on a pool of ``PASSWORD_HASHING_THREADS`` threads. At most
+``PASSWORD_HASHING_QUEUE`` more hashes may wait for a free thread; past that
+the hash is refused with ``HashingBusy``. ``exception_handler`` turns that
+into a 429 with ``Retry-After`` for the API, and ``HashingBusyMiddleware``
+does the same for plain Django views such as the admin login. hashlib
+releases the GIL while hashing, so the pool caps how many cores logins can
+take while the remaining threads keep serving.
+
+The hasher keeps the ``pbkdf2_sha256`` format, so stored passwords stay
+valid. Its cost comes from ``PASSWORD_HASH_ITERATIONS`` (see
+``manage.py calibrate_hasher``). When that changes, Django's
+``check_password`` re-hashes a user's password at their next successful
+login.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.http import JsonResponse
+from rest_framework.exceptions import Throttled
+from rest_framework.views import exception_handler as drf_exception_handler
+
+
+class HashingBusy(Exception):
+    """The hashing pool and its queue are full; raised from ``check_password``/``set_password``."""
+    detail = 'Too many sign-ins in progress, please try again shortly.'
+    retry_after = 1
+
+    def __init__(self):
+        super().__init__(self.detail)
+
+
+def exception_handler(exc, context):
+    # REST_FRAMEWORK['EXCEPTION_HANDLER']: answer like a throttled request.
+    if isinstance(exc, HashingBusy):
+        exc = Throttled(wait=exc.retry_after, detail=exc.detail)
+    return drf_exception_handler(exc, context)
+
+
+class HashingBusyMiddleware:
+    """429 for views outside DRF (admin login, Django's auth views)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, HashingBusy):
+            response = JsonResponse({'detail': exception.detail}, status=429)
+            response['Retry-After'] = str(exception.retry_after)
+            return response
+
+
+class HashingPool:
+    def __init__(self, threads, queue):
+        self.config = (threads, queue)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='password-hash')
+        self.slots = threading.BoundedSemaphore(threads + queue)
+        self.pid = os.getpid()
+
+    def run(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            return self.executor.submit(func, *args).result()
+        finally:
+            self.slots.release()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The pool for this process; None when offloading is off (PASSWORD_HASHING_THREADS=0)."""
+    global _pool
+    config = (settings.PASSWORD_HASHING_THREADS, settings.PASSWORD_HASHING_QUEUE)
+    if config[0] <= 0:
+        return None
+    pool = _pool
+    # Threads don't survive a fork, so a preloaded master's pool is rebuilt in each worker.
+    if pool is None or pool.pid != os.getpid() or pool.config != config:
+        with _pool_lock:
+            pool = _pool
+            if pool is None or pool.pid != os.getpid() or pool.config != config:
+                if pool is not None and pool.pid == os.getpid():
+                    pool.shutdown()
+                pool = _pool = HashingPool(*config)
+    return pool
+
+
+def reset():
+    """Drop the current pool so the next hash builds one from the current settings."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.shutdown()
+        _pool = None
+
+
+def run_hash(func, *args):
+    pool = get_pool()
+    if pool is None or threading.current_thread().name.startswith('password-hash'):
+        return func(*args)
+    return pool.run(func, *args)
+
+
+class BoundedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """Django's PBKDF2-SHA256 hasher with a configurable cost, run on the hashing pool."""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
+
+    def encode(self, password, salt, iterations=None):
+        return run_hash(super().encode, password, salt, iterations)
@@ -0,0 +1,120 @@
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from .models import IdempotencyKey
+from .metrics import record_cache
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def _digest(*parts):
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+
+def _fingerprint(request):
+    try:
+        payload = json.dumps(request.data, sort_keys=True, default=str)
+    except TypeError:
+        payload = repr(request.data)
+    return _digest(request.method, request.path, payload)
+
+
+def _claim(user, key, request_hash):
+    """Insert the in-flight marker; return ``(row, True)`` if we own the key, else ``(existing row, False)``.
+
+    The marker only holds the key for ``IDEMPOTENCY_IN_FLIGHT_LEASE``; a
+    request whose worker died never finishes, and its lease then runs out
+    like an expired response.
+    """
+    lease = getattr(settings, 'IDEMPOTENCY_IN_FLIGHT_LEASE', 120)
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user, key=key, request_hash=request_hash,
+                    expires_at=timezone.now() + timedelta(seconds=lease))
+            return record, True
+        except IntegrityError:
+            existing = IdempotencyKey.objects.filter(user=user, key=key).first()
+            if existing is None:
+                continue
+            if existing.expires_at > timezone.now():
+                return existing, False
+            IdempotencyKey.objects.filter(pk=existing.pk, expires_at__lte=timezone.now()).delete()
+    return IdempotencyKey.objects.get(user=user, key=key), False
+
+
+def _replay(record, request_hash):
+    if record.request_hash != request_hash:
+        return Response(
+            {"detail": f"{HEADER} was already used with a different request"},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    if record.status_code is None:
+        return Response(
+            {"detail": f"A request with this {HEADER} is still being processed"},
+            status=status.HTTP_409_CONFLICT,
+            headers={'Retry-After': '1'}
+        )
+    return Response(record.response_body, status=record.status_code,
+                    headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(view_method):
+    """Make a DRF view method replay its stored response for a repeated Idempotency-Key.
+
+    Keys are scoped per user and per method + path. The first request claims
+    the key with an in-flight row; concurrent duplicates get 409 until it
+    finishes (or its lease runs out), later retries get the stored response
+    without re-running the view until ``IDEMPOTENCY_KEY_TTL``. Server errors
+    release the key so the client can retry for real.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        client_key = request.headers.get(HEADER)
+        if not client_key or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+        if len(client_key) > MAX_KEY_LENGTH:
+            return Response(
+                {"detail": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        key = _digest(request.method, request.path, client_key)
+        request_hash = _fingerprint(request)
+        record, claimed = _claim(request.user, key, request_hash)
+        record_cache('idempotency', not claimed)
+        if not claimed:
+            return _replay(record, request_hash)
+
+        # Filtered by id: if this request outlived its lease, a retry may own the key now.
+        mine = IdempotencyKey.objects.filter(pk=record.pk)
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            mine.delete()
+            raise
+        if response.status_code >= 500:
+            mine.delete()
+        else:
+            ttl = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+            mine.update(status_code=response.status_code, response_body=response.data,
+                        expires_at=timezone.now() + timedelta(seconds=ttl))
+        return response
+    return wrapper
+
+
+class IdempotentCreateMixin:
+    """Honour ``Idempotency-Key`` on ``create``; decorate other POST actions with ``idempotent``."""
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from main_body.archive import archivable, archive_orders
+from main_body.models import Order, Offer, Rating
+
+
+class Command(BaseCommand):
+    help = ('Move completed and cancelled orders older than the archive window, with their '
+            'offers and ratings, into the archive tables. Runs in batches, one transaction each.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Archive orders created more than this many days ago '
+                                 '(default: ORDER_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days is None:
+            days = getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 365)
+        cutoff = timezone.now() - timedelta(days=days)
+
+        if options['dry_run']:
+            self.stdout.write(f'{archivable(cutoff).count()} orders created before '
+                              f'{cutoff:%Y-%m-%d} would be archived')
+            return
+
+        before = self.hot_counts()
+        orders, offers, ratings = archive_orders(cutoff, batch_size=options['batch_size'])
+        after = self.hot_counts()
+        self.stdout.write(f'Archived {orders} orders, {offers} offers and {ratings} ratings '
+                          f'created before {cutoff:%Y-%m-%d}')
+        for table, count in before.items():
+            self.stdout.write(f'  {table}: {count} -> {after[table]} rows')
+
+    def hot_counts(self):
+        return {
+            'orders': Order.objects.count(),
+            'offers': Offer.objects.count(),
+            'ratings': Rating.objects.count(),
+        }
@@ -0,0 +1,245 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, reset_queries
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from main_body.models import User, Order, Offer, Rating
+
+
+# What a worker does before serving its first request.
+BOOT_SCRIPT = "import django; django.setup(); from django.urls import resolve; resolve('/api/orders/')"
+
+# Loaded on demand (docs routes, schema builds, Parquet exports); importing them at boot is a regression.
+# rest_framework.schemas.coreapi can't be deferred: rest_framework.views imports the
+# rest_framework.schemas package, which imports it, so every DRF process loads it at boot.
+DEFERRED_MODULES = ('drf_spectacular.openapi', 'drf_spectacular.generators', 'drf_spectacular.views',
+                    'pyarrow')
+
+
+def measure_startup(runs):
+    """Median boot cost over ``runs`` fresh interpreters, from ``python -X importtime``."""
+    import_ms, wall_ms, heaviest, loaded = [], [], {}, set()
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'Fix_it_app.settings')}
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT],
+                                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        wall_ms.append((time.perf_counter() - started) * 1000)
+        if result.returncode:
+            raise CommandError(f'Boot failed: {result.stderr[-2000:]}')
+        total = 0
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            loaded.add(name.strip())
+            if not name.startswith('  '):  # top level, cumulative covers its children
+                total += int(cumulative)
+                heaviest[name.strip()] = int(cumulative) / 1000
+        import_ms.append(total / 1000)
+    return {
+        'runs': runs,
+        'import_ms': round(statistics.median(import_ms), 1),
+        'wall_ms': round(statistics.median(wall_ms), 1),
+        'heaviest': sorted(heaviest.items(), key=lambda item: -item[1])[:10],
+        'deferred_loaded': sorted(name for name in DEFERRED_MODULES if name in loaded),
+    }
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return 0.0
+    rank = max(0, min(len(samples) - 1, round(pct / 100 * len(samples) + 0.5) - 1))
+    return samples[rank]
+
+
+class Command(BaseCommand):
+    help = ('Measure throughput and p50/p95/p99 latency of every API endpoint against the '
+            'current database and compare with a stored baseline')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--only', nargs='*', default=None,
+                            help='Run only these scenario names')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--baseline', help='Compare against this results file')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed p95 slowdown vs baseline before failing (0.2 = 20%%)')
+        parser.add_argument('--startup', type=int, default=5, metavar='RUNS',
+                            help='Also measure process boot over this many fresh interpreters '
+                                 '(0 to skip)')
+        parser.add_argument('--conn-max-age', type=int, default=None,
+                            help='Override CONN_MAX_AGE for this run, e.g. 0 to measure the '
+                                 'cost of opening a connection per request')
+        parser.add_argument('--password', default='password123',
+                            help='Password of the seeded users, used by the login scenario')
+
+    def scenarios(self, password):
+        customer_id = Order.objects.values_list('customer_id', flat=True).first()
+        worker_id = Offer.objects.values_list('worker_id', flat=True).first()
+        admin = User.objects.filter(user_type=3).first()
+        if customer_id is None or worker_id is None:
+            raise CommandError('No orders/offers found; run "manage.py seed_data" first')
+        customer = User.objects.get(pk=customer_id)
+        worker = User.objects.get(pk=worker_id)
+        order_id = Order.objects.filter(customer=customer).values_list('pk', flat=True).first()
+        offer_id = Offer.objects.filter(worker=worker).values_list('pk', flat=True).first()
+        rating = Rating.objects.values_list('user_id', flat=True).first()
+
+        scenarios = [
+            ('order-list:customer', customer, 'get', reverse('order-list'), None),
+            ('order-list:worker', worker, 'get', reverse('order-list'), None),
+            ('order-list:customer:filtered', customer, 'get',
+             reverse('order-list') + '?status=3&ordering=-budget&search=repair', None),
+            ('order-detail', customer, 'get', reverse('order-detail', args=[order_id]), None),
+            ('offer-list:worker', worker, 'get', reverse('offer-list'), None),
+            ('offer-list:customer', customer, 'get', reverse('offer-list'), None),
+            ('offer-detail', worker, 'get', reverse('offer-detail', args=[offer_id]), None),
+            ('rating-list:customer', customer, 'get', reverse('rating-list'), None),
+            ('city-list', None, 'get', reverse('city-list'), None),
+            ('address-list', customer, 'get', reverse('address-list'), None),
+            ('complaint-list', customer, 'get', reverse('complaint-list'), None),
+            ('user-detail', customer, 'get', reverse('user-detail', args=[customer.pk]), None),
+            ('login', None, 'post', reverse('login'),
+             {'email': customer.email, 'password': password}),
+        ]
+        if rating is not None:
+            scenarios.append(('rating-list:rater', User.objects.get(pk=rating), 'get',
+                              reverse('rating-list'), None))
+        if admin is not None:
+            scenarios += [
+                ('order-list:admin', admin, 'get', reverse('order-list'), None),
+                ('user-list:admin', admin, 'get', reverse('user-list'), None),
+                ('complaint-list:admin', admin, 'get', reverse('complaint-list'), None),
+            ]
+        return scenarios
+
+    def run_scenario(self, user, method, url, data, iterations, warmup):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        call = getattr(client, method)
+        for _ in range(warmup):
+            call(url, data, content_type='application/json') if data else call(url)
+        timings, queries, statuses = [], 0, set()
+        opened = []
+
+        def on_connect(sender, connection, **kwargs):
+            opened.append(connection.alias)
+
+        connection_created.connect(on_connect)
+        started = time.perf_counter()
+        try:
+            for _ in range(iterations):
+                reset_queries()
+                t0 = time.perf_counter()
+                response = call(url, data, content_type='application/json') if data else call(url)
+                # The test client skips Django's end-of-request connection
+                # cleanup; do it here so CONN_MAX_AGE behaves as in production.
+                close_old_connections()
+                timings.append((time.perf_counter() - t0) * 1000)
+                queries += len(connection.queries)
+                statuses.add(response.status_code)
+        finally:
+            connection_created.disconnect(on_connect)
+        elapsed = time.perf_counter() - started
+        timings.sort()
+        return {
+            'url': url,
+            'iterations': iterations,
+            'status': sorted(statuses),
+            'throughput_rps': round(iterations / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'queries_per_request': round(queries / iterations, 1),
+            'connections_per_request': round(len(opened) / iterations, 2),
+        }
+
+    def handle(self, *args, **options):
+        if options['conn_max_age'] is not None:
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = options['conn_max_age']
+        results = {
+            'meta': {
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'orders': Order.objects.count(),
+                'offers': Offer.objects.count(),
+                'ratings': Rating.objects.count(),
+                'users': User.objects.count(),
+                'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+                'pool': bool(connection.settings_dict.get('OPTIONS', {}).get('pool')),
+            },
+            'endpoints': {},
+        }
+        # DEBUG makes Django record queries so they can be counted per request.
+        # Throttling is off so repeated logins measure the endpoint, not the 429s.
+        with override_settings(DEBUG=True, ALLOWED_HOSTS=['*'], THROTTLE_ENABLED=False):
+            for name, user, method, url, data in self.scenarios(options['password']):
+                if options['only'] and name not in options['only']:
+                    continue
+                result = self.run_scenario(user, method, url, data,
+                                           options['iterations'], options['warmup'])
+                results['endpoints'][name] = result
+                self.stdout.write(
+                    f"{name:32} {result['throughput_rps']:>8} req/s  p50 {result['p50_ms']:>8} ms  "
+                    f"p95 {result['p95_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  "
+                    f"{result['queries_per_request']:>6} queries  "
+                    f"{result['connections_per_request']:>5} connects")
+
+        if options['startup']:
+            startup = results['startup'] = measure_startup(options['startup'])
+            self.stdout.write(f"{'startup':32} imports {startup['import_ms']:>8} ms  "
+                              f"boot {startup['wall_ms']:>8} ms")
+            for module, ms in startup['heaviest'][:5]:
+                self.stdout.write(f'    {ms:>8.1f} ms  {module}')
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2))
+        if options.get('startup') and results['startup']['deferred_loaded']:
+            raise CommandError('Loaded at startup but meant to be deferred: '
+                               + ', '.join(results['startup']['deferred_loaded']))
+        if options['baseline']:
+            self.compare(results, json.loads(Path(options['baseline']).read_text()),
+                         options['tolerance'])
+
+    def compare(self, results, baseline, tolerance):
+        regressions = []
+        for name, result in results['endpoints'].items():
+            before = baseline.get('endpoints', {}).get(name)
+            if not before:
+                continue
+            change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0
+            query_change = result['queries_per_request'] - before['queries_per_request']
+            marker = ''
+            if change > tolerance or query_change > 0:
+                marker = '  <-- REGRESSION'
+                regressions.append(name)
+            self.stdout.write(f'{name:32} p95 {before["p95_ms"]:>8} -> {result["p95_ms"]:>8} ms '
+                              f'({change:+.0%})  queries {before["queries_per_request"]} -> '
+                              f'{result["queries_per_request"]}{marker}')
+        before, after = baseline.get('startup'), results.get('startup')
+        if before and after and before['import_ms']:
+            change = (after['import_ms'] - before['import_ms']) / before['import_ms']
+            marker = ''
+            if change > tolerance:
+                marker = '  <-- REGRESSION'
+                regressions.append('startup')
+            self.stdout.write(f'{"startup":32} imports {before["import_ms"]:>8} -> '
+                              f'{after["import_ms"]:>8} ms ({change:+.0%}){marker}')
+        if regressions:
+            raise CommandError(f'Performance regressions in: {", ".join(regressions)}')
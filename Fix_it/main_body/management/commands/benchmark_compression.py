@@ -0,0 +1,75 @@
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from main_body import compression
+from main_body.management.commands.benchmark import Command as EndpointBenchmark
+
+GZIP_LEVELS = (1, 6, 9)
+BROTLI_QUALITIES = (1, 4, 5, 8, 11)
+
+
+class Command(BaseCommand):
+    help = ('Compare gzip and brotli settings on the seeded benchmark database: bytes on the '
+            'wire and CPU time per response for every GET endpoint')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Compress each body this many times and keep the fastest run')
+        parser.add_argument('--only', nargs='*', default=None,
+                            help='Run only these scenario names')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--password', default='password123')
+
+    def codecs(self):
+        codecs = [(f'gzip-{level}', 'gzip', {'COMPRESSION_GZIP_LEVEL': level}) for level in GZIP_LEVELS]
+        if compression.brotli is not None:
+            codecs += [(f'br-{quality}', 'br', {'COMPRESSION_BROTLI_QUALITY': quality})
+                       for quality in BROTLI_QUALITIES]
+        return codecs
+
+    def body(self, user, url):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        # No Accept-Encoding: the raw JSON the middleware would compress.
+        return client.get(url).content
+
+    def measure(self, content, encoding, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.process_time()
+            compressed = compression.compress(content, encoding)
+            elapsed = time.process_time() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return len(compressed), best * 1000
+
+    def handle(self, *args, **options):
+        if compression.brotli is None:
+            self.stdout.write('brotli is not installed; measuring gzip only (pip install brotli)')
+        results = {'codecs': [name for name, _, _ in self.codecs()], 'endpoints': {}}
+        with override_settings(ALLOWED_HOSTS=['*']):
+            scenarios = EndpointBenchmark().scenarios(options['password'])
+            for name, user, method, url, data in scenarios:
+                if method != 'get' or (options['only'] and name not in options['only']):
+                    continue
+                content = self.body(user, url)
+                endpoint = results['endpoints'][name] = {'url': url, 'bytes': len(content), 'codecs': {}}
+                self.stdout.write(f'{name:32} {len(content):>12,} bytes raw')
+                for codec, encoding, overrides in self.codecs():
+                    with override_settings(**overrides):
+                        size, cpu_ms = self.measure(content, encoding, options['repeat'])
+                    endpoint['codecs'][codec] = {
+                        'bytes': size,
+                        'ratio': round(len(content) / size, 2) if size else None,
+                        'cpu_ms': round(cpu_ms, 3),
+                        'mb_per_s': round(len(content) / 1e6 / (cpu_ms / 1000), 1) if cpu_ms else None,
+                    }
+                    self.stdout.write(f'    {codec:8} {size:>12,} bytes  x{len(content) / size:>6.1f}  '
+                                      f'{cpu_ms:>9.3f} ms cpu')
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2))
@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from main_body import hashing
+from main_body.management.commands.benchmark import percentile
+from main_body.models import User
+
+
+class Command(BaseCommand):
+    help = ('Flood the login endpoint from many threads while timing another endpoint, once per '
+            'PASSWORD_HASHING_THREADS value, to show what bounded hashing does to both')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hashing-threads', type=int, nargs='+', default=[0, 2],
+                            help='PASSWORD_HASHING_THREADS values to compare (0 hashes inline)')
+        parser.add_argument('--flood-threads', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per run')
+        parser.add_argument('--probe', default='city-list',
+                            help='URL name of the endpoint timed during the flood')
+        parser.add_argument('--throttle', action='store_true',
+                            help='Leave login throttling on (off by default, so every attempt '
+                                 'reaches the hasher)')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def loop(self, stop, record, request):
+        client = Client()
+        try:
+            while not stop.is_set():
+                started = time.perf_counter()
+                response = request(client)
+                record((time.perf_counter() - started) * 1000, response.status_code)
+        finally:
+            connections.close_all()
+
+    def run(self, email, probe_url, flood_threads, duration):
+        login_url = reverse('login')
+        logins, probes, lock = [], [], threading.Lock()
+        stop = threading.Event()
+
+        def login(client):
+            # Wrong password: the full hash still runs, and nothing is written.
+            return client.post(login_url, {'email': email, 'password': 'not-the-password'},
+                               content_type='application/json')
+
+        def record_into(samples):
+            def record(ms, status):
+                with lock:
+                    samples.append((ms, status))
+            return record
+
+        threads = [threading.Thread(target=self.loop, args=(stop, record_into(logins), login))
+                   for _ in range(flood_threads)]
+        threads.append(threading.Thread(target=self.loop, args=(
+            stop, record_into(probes), lambda client: client.get(probe_url))))
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        login_ms = sorted(ms for ms, _ in logins)
+        probe_ms = sorted(ms for ms, _ in probes)
+        return {
+            'logins': len(logins),
+            'login_rps': round(sum(1 for _, status in logins if status != 429) / duration, 1),
+            'rejected_429': sum(1 for _, status in logins if status == 429),
+            'login_p95_ms': round(percentile(login_ms, 95), 1),
+            'probe_requests': len(probes),
+            'probe_p50_ms': round(percentile(probe_ms, 50), 2),
+            'probe_p95_ms': round(percentile(probe_ms, 95), 2),
+            'probe_p99_ms': round(percentile(probe_ms, 99), 2),
+        }
+
+    def handle(self, *args, **options):
+        email = User.objects.values_list('email', flat=True).first()
+        if email is None:
+            raise CommandError('No users found; run "manage.py seed_data" first')
+        probe_url = reverse(options['probe'])
+        results = {'flood_threads': options['flood_threads'], 'duration': options['duration'], 'runs': {}}
+        with override_settings(ALLOWED_HOSTS=['*'], THROTTLE_ENABLED=options['throttle']):
+            for threads in options['hashing_threads']:
+                with override_settings(PASSWORD_HASHING_THREADS=threads):
+                    hashing.reset()
+                    result = self.run(email, probe_url, options['flood_threads'], options['duration'])
+                results['runs'][str(threads)] = result
+                self.stdout.write(
+                    f"hashing threads {threads:>2}: {result['login_rps']:>7} logins/s  "
+                    f"{result['rejected_429']:>6} x 429  login p95 {result['login_p95_ms']:>8} ms  |  "
+                    f"{options['probe']} p50 {result['probe_p50_ms']:>8} ms  "
+                    f"p95 {result['probe_p95_ms']:>8} ms  p99 {result['probe_p99_ms']:>8} ms")
+        hashing.reset()
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2))
@@ -0,0 +1,181 @@
+import http.cookiejar
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from main_body.management.commands.benchmark import percentile
+from main_body.models import Order
+
+# name -> environment for gunicorn.conf.py
+PROFILES = {
+    'sync': {'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_PRELOAD': '0'},
+    'sync-preload': {'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_PRELOAD': '1'},
+    'gthread': {'GUNICORN_WORKER_CLASS': 'gthread', 'GUNICORN_PRELOAD': '1'},
+    'uvicorn': {'GUNICORN_WORKER_CLASS': 'uvicorn', 'GUNICORN_PRELOAD': '1'},
+}
+
+
+def process_memory_kb(pid):
+    """Proportional set size of a process and its children, so shared pages count once."""
+    total = 0
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as fh:
+            pids += [int(child) for child in fh.read().split()]
+    except OSError:
+        pass
+    for each in pids:
+        try:
+            with open(f'/proc/{each}/smaps_rollup') as fh:
+                for line in fh:
+                    if line.startswith('Pss:'):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total
+
+
+class Command(BaseCommand):
+    help = ('Start gunicorn with each server profile from gunicorn.conf.py, load it over HTTP '
+            'and compare throughput, latency, boot time and memory. Run it against the '
+            'synthetic dataset from seed_data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='*', default=['sync', 'sync-preload', 'gthread'],
+                            choices=sorted(PROFILES))
+        parser.add_argument('--workers', type=int, default=None,
+                            help='WEB_CONCURRENCY for every profile (default: the config default)')
+        parser.add_argument('--duration', type=float, default=15.0, help='Seconds of load per profile')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent HTTP clients')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--password', default='password123',
+                            help='Password of the seeded users')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        order = Order.objects.select_related('customer').first()
+        if order is None:
+            raise CommandError('No orders found; run "manage.py seed_data" first')
+        self.email = order.customer.email
+        self.password = options['password']
+        self.base = f'http://127.0.0.1:{options["port"]}'
+        self.paths = ['/api/cities/', '/api/orders/', f'/api/orders/{order.pk}/', '/api/offers/']
+
+        results = {}
+        for name in options['profiles']:
+            # Every client logs in as the same customer, which the login bucket would refuse.
+            env = {**os.environ, **PROFILES[name], 'PORT': str(options['port']), 'THROTTLE_ENABLED': '0'}
+            if options['workers']:
+                env['WEB_CONCURRENCY'] = str(options['workers'])
+            result = self.run_profile(env, options['duration'], options['concurrency'])
+            results[name] = result
+            self.stdout.write(
+                f"{name:14} boot {result['boot_s']:>5} s  {result['throughput_rps']:>8} req/s  "
+                f"p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms  "
+                f"p99 {result['p99_ms']:>8} ms  errors {result['errors']:>4}  "
+                f"login errors {result['login_errors']:>4}  "
+                f"memory {result['memory_mb']:>7} MB")
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2))
+
+    def run_profile(self, env, duration, concurrency):
+        log = tempfile.TemporaryFile()
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+             '--access-logfile', os.devnull],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=log)
+        try:
+            self.wait_until_ready(server, log)
+            boot = time.perf_counter() - started
+            timings, errors, login_errors = self.load(duration, concurrency)
+            memory = process_memory_kb(server.pid)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+            log.close()
+        timings.sort()
+        return {
+            'boot_s': round(boot, 2),
+            'requests': len(timings),
+            'errors': errors,
+            'login_errors': login_errors,
+            'throughput_rps': round(len(timings) / duration, 1),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'memory_mb': round(memory / 1024, 1),
+        }
+
+    def wait_until_ready(self, server, log, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                log.seek(0)
+                raise CommandError(f'gunicorn exited: {log.read().decode()[-2000:]}')
+            try:
+                with urllib.request.urlopen(f'{self.base}/api/cities/', timeout=2):
+                    return
+            except (urllib.error.URLError, socket.timeout, ConnectionError):
+                time.sleep(0.1)
+        raise CommandError(f'gunicorn did not answer within {timeout}s')
+
+    def client(self):
+        opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        body = json.dumps({'email': self.email, 'password': self.password}).encode()
+        request = urllib.request.Request(f'{self.base}/api/login/', data=body,
+                                         headers={'Content-Type': 'application/json'})
+        opener.open(request, timeout=10).close()
+        return opener
+
+    def load(self, duration, concurrency):
+        timings, errors = [], {'requests': 0, 'logins': 0}
+        lock = threading.Lock()
+        stop_at = time.monotonic() + duration
+
+        def worker(offset):
+            opener = None
+            mine, failed, login_failed, i = [], 0, 0, offset
+            while time.monotonic() < stop_at:
+                if opener is None:
+                    try:
+                        opener = self.client()
+                    except (urllib.error.URLError, socket.timeout, ConnectionError):
+                        login_failed += 1
+                        time.sleep(0.1)
+                        continue
+                url = self.base + self.paths[i % len(self.paths)]
+                i += 1
+                t0 = time.perf_counter()
+                try:
+                    with opener.open(url, timeout=30) as response:
+                        response.read()
+                    mine.append((time.perf_counter() - t0) * 1000)
+                except (urllib.error.URLError, socket.timeout, ConnectionError):
+                    failed += 1
+            with lock:
+                timings.extend(mine)
+                errors['requests'] += failed
+                errors['logins'] += login_failed
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return timings, errors['requests'], errors['logins']
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from main_body import schema
+
+
+class Command(BaseCommand):
+    help = ('Generate the OpenAPI schema into OPENAPI_SCHEMA_DIR, where /api/schema/ serves it from. '
+            'Run it on every deploy, next to collectstatic.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', default=None,
+                            help='Directory to write to (default: OPENAPI_SCHEMA_DIR)')
+
+    def handle(self, *args, **options):
+        directory = options['output_dir'] or settings.OPENAPI_SCHEMA_DIR
+        for fmt, (path, tag) in schema.build(directory).items():
+            self.stdout.write(f'{fmt:5} {path} ({tag})')
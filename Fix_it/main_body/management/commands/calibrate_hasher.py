@@ -0,0 +1,37 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# OWASP's 2023 minimum for PBKDF2-HMAC-SHA256; never recommend less.
+MIN_ITERATIONS = 600_000
+
+
+class Command(BaseCommand):
+    help = ('Measure PBKDF2 on this machine and suggest PASSWORD_HASH_ITERATIONS for a target '
+            'time per hash. Changing the setting re-hashes each password at its next login.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=250,
+                            help='CPU time one hash should take (default 250 ms)')
+        parser.add_argument('--sample-iterations', type=int, default=200_000)
+
+    def handle(self, *args, **options):
+        sample = options['sample_iterations']
+        timings = []
+        for _ in range(3):
+            started = time.process_time()
+            hashlib.pbkdf2_hmac('sha256', b'calibration password', b'calibration salt', sample)
+            timings.append(time.process_time() - started)
+        per_iteration_ms = min(timings) * 1000 / sample
+
+        current = settings.PASSWORD_HASH_ITERATIONS
+        suggested = int(options['target_ms'] / per_iteration_ms) // 10_000 * 10_000
+        self.stdout.write(f'current: {current:,} iterations, {current * per_iteration_ms:.0f} ms per hash')
+        if suggested < MIN_ITERATIONS:
+            self.stdout.write(f'{options["target_ms"]:.0f} ms only allows {suggested:,} iterations on this '
+                              f'machine; staying at the minimum of {MIN_ITERATIONS:,}')
+            suggested = MIN_ITERATIONS
+        self.stdout.write(f'suggested: PASSWORD_HASH_ITERATIONS={suggested} '
+                          f'({suggested * per_iteration_ms:.0f} ms per hash)')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from main_body.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete expired Idempotency-Key records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        while True:
+            ids = list(IdempotencyKey.objects.filter(
+                expires_at__lte=timezone.now()
+            ).values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            total += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
+        self.stdout.write(f'Deleted {total} expired idempotency keys')
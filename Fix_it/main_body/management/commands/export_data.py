@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from main_body import export
+
+
+class Command(BaseCommand):
+    help = ('Append the rows added since the last export to the columnar export (Parquet with '
+            'pyarrow installed, gzipped JSON batches otherwise), one partition per day')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', default=None, help='Default: EXPORT_DIR')
+        parser.add_argument('--tables', nargs='+', choices=list(export.TABLES), default=None,
+                            help='Tables to export (default: all)')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Rows per cursor fetch and per written batch (default: EXPORT_CHUNK_SIZE)')
+        parser.add_argument('--max-rows', type=int, default=None,
+                            help='Export at most about this many rows per table (default: no limit)')
+
+    def handle(self, *args, **options):
+        directory = options['output_dir'] or settings.EXPORT_DIR
+        summary = export.export(directory, tables=options['tables'], chunk_size=options['chunk_size'],
+                                max_rows=options['max_rows'])
+        self.stdout.write(f'Exported {export.file_format()} to {directory}')
+        for name, result in summary.items():
+            self.stdout.write(f"  {name:18} {result['rows']:>9} rows  {result['files']:>4} files  "
+                              f"last id {result['last_id']}{'' if result['complete'] else '  (more waiting)'}")
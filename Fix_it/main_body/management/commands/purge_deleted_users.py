@@ -0,0 +1,72 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from main_body.models import User
+
+ANONYMIZED_DOMAIN = 'deleted.invalid'
+
+
+class Command(BaseCommand):
+    help = ('Anonymize or permanently delete users soft-deleted longer than the retention '
+            'window. Run it from cron; it works in small batches so it never holds long locks.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Retention window in days (default: USER_PURGE_RETENTION_DAYS)')
+        parser.add_argument('--mode', choices=['anonymize', 'delete'], default='anonymize',
+                            help='anonymize scrubs personal data and keeps the row so orders, '
+                                 'offers and ratings survive; delete removes the user and '
+                                 'everything that cascades from it')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days is None:
+            days = getattr(settings, 'USER_PURGE_RETENTION_DAYS', 90)
+        cutoff = timezone.now() - timedelta(days=days)
+        expired = User.all_objects.dead().filter(deleted_at__lt=cutoff).exclude(
+            email__endswith=f'@{ANONYMIZED_DOMAIN}')
+
+        if options['dry_run']:
+            self.stdout.write(f'{expired.count()} users deleted before {cutoff:%Y-%m-%d} would be '
+                              f'{options["mode"]}d')
+            return
+
+        batch_size = options['batch_size']
+        handled = 0
+        last_id = 0
+        while True:
+            ids = list(expired.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            with transaction.atomic():
+                if options['mode'] == 'delete':
+                    User.all_objects.filter(pk__in=ids).hard_delete()
+                else:
+                    self.anonymize(ids)
+            handled += len(ids)
+        self.stdout.write(f'{options["mode"].capitalize()}d {handled} users deleted before {cutoff:%Y-%m-%d}')
+
+    def anonymize(self, ids):
+        users = list(User.all_objects.filter(pk__in=ids))
+        unusable = make_password(None)
+        for user in users:
+            user.email = f'user-{user.pk}-{uuid.uuid4().hex[:8]}@{ANONYMIZED_DOMAIN}'
+            user.first_name = ''
+            user.last_name = ''
+            user.phone = None
+            user.photo = None
+            user.birth_date = None
+            user.gender = None
+            user.password = unusable
+            user.is_active = False
+        User.all_objects.bulk_update(
+            users, ['email', 'first_name', 'last_name', 'phone', 'photo', 'birth_date',
+                    'gender', 'password', 'is_active'])
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from main_body import partitions
+
+
+class Command(BaseCommand):
+    help = ('Create the monthly partitions of the order tables ahead of time and optionally '
+            'detach old ones. Run it daily from cron; it does nothing unless DB_PARTITIONING '
+            'is enabled on PostgreSQL.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=None,
+                            help='Months of empty partitions to keep ready '
+                                 '(default: DB_PARTITION_MONTHS_AHEAD)')
+        parser.add_argument('--retain-months', type=int, default=None,
+                            help='Detach partitions that ended more than this many months ago. '
+                                 'Detached tables are kept for backup or dropping by hand.')
+
+    def handle(self, *args, **options):
+        if not partitions.is_enabled(connection):
+            self.stdout.write('Partitioning is disabled for this database; nothing to do')
+            return
+        months_ahead = options['months_ahead']
+        if months_ahead is None:
+            months_ahead = getattr(settings, 'DB_PARTITION_MONTHS_AHEAD', 3)
+
+        with transaction.atomic():
+            result = partitions.roll(connection, months_ahead=months_ahead,
+                                     retain_months=options['retain_months'])
+        if not result:
+            self.stdout.write('No partitioned tables found; run migrate with DB_PARTITIONING=1 first')
+        for table, (created, detached) in result.items():
+            self.stdout.write(f'{table}: created {", ".join(created) or "nothing"}; '
+                              f'detached {", ".join(detached) or "nothing"}')
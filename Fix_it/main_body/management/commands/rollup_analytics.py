@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from main_body import analytics
+
+
+class Command(BaseCommand):
+    help = ('Update the daily analytics rollups. By default only the days changed since the last '
+            'run are rebuilt; run it every few minutes from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recent-days', type=int, default=1,
+                            help='Also rebuild this many days before today (default 1)')
+        parser.add_argument('--since', help='Rebuild every day from this date (YYYY-MM-DD) to today')
+        parser.add_argument('--full', action='store_true',
+                            help='Rebuild every day since the first order')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options['full']:
+            first, rows = analytics.rebuild_all()
+        elif options['since']:
+            first = parse_date(options['since'])
+            if first is None:
+                raise CommandError(f"Invalid date: {options['since']}")
+            rows = analytics.rebuild(first, today)
+        if options['full'] or options['since']:
+            self.stdout.write(f'Rebuilt {(today - first).days + 1} days from {first:%Y-%m-%d}: '
+                              f'{rows} rollup rows')
+            return
+
+        days, rows = analytics.refresh(recent_days=options['recent_days'])
+        self.stdout.write(f'Rebuilt {days} changed days: {rows} rollup rows')
@@ -0,0 +1,211 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from main_body.models import User, City, Address, Order, Offer, Complaint, Rating
+
+CITIES = [
+    ('Damascus', 33.5138, 36.2765), ('Aleppo', 36.2021, 37.1343), ('Homs', 34.7324, 36.7137),
+    ('Latakia', 35.5317, 35.7901), ('Hama', 35.1318, 36.7578), ('Tartus', 34.8890, 35.8866),
+    ('Daraa', 32.6189, 36.1021), ('Idlib', 35.9306, 36.6339), ('Raqqa', 35.9594, 39.0079),
+    ('Deir ez-Zor', 35.3359, 40.1408), ('Al-Hasakah', 36.5024, 40.7477), ('Qamishli', 37.0522, 41.2317),
+    ('As-Suwayda', 32.7090, 36.5695), ('Quneitra', 33.1258, 35.8245), ('Palmyra', 34.5503, 38.2691),
+]
+FIRST_NAMES = ['Ahmad', 'Omar', 'Sami', 'Rami', 'Lina', 'Rana', 'Hala', 'Yara', 'Karim', 'Nour',
+               'Hadi', 'Maya', 'Fadi', 'Dana', 'Ziad', 'Reem', 'Tarek', 'Salma', 'Bilal', 'Huda']
+LAST_NAMES = ['Haddad', 'Khoury', 'Nasser', 'Saleh', 'Hamdan', 'Aziz', 'Darwish', 'Issa',
+              'Mansour', 'Youssef', 'Kassem', 'Sabbagh', 'Attar', 'Halabi', 'Shami']
+STREETS = ['Baghdad St', 'Revolution St', 'Abu Rummaneh', 'Mezzeh Autostrad', 'Shaalan St',
+           'Hamra St', 'Al-Jalaa St', 'Kafr Souseh', 'Bab Touma', 'Al-Midan']
+NOTES = ['Leaking kitchen tap', 'Install ceiling fan', 'Repaint bedroom', 'Fix washing machine',
+         'Replace door lock', 'AC not cooling', 'Tile the bathroom', 'Electrical socket sparks',
+         'Assemble wardrobe', 'Water heater repair', None]
+
+ORDER_STATUS_WEIGHTS = [(1, 25), (2, 15), (3, 50), (4, 10)]
+USER_TYPE_WEIGHTS = [(1, 70), (2, 28), (4, 2)]
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Let bulk_create keep the generated dates instead of auto_now_add's 'now'."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def weighted(rng, weights):
+    return rng.choices([value for value, _ in weights], [weight for _, weight in weights])[0]
+
+
+class Command(BaseCommand):
+    help = 'Generate a realistic synthetic dataset with bulk inserts (for load tests and benchmarks)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--max-offers', type=int, default=6,
+                            help='Upper bound of offers per order (uniform)')
+        parser.add_argument('--complaints', type=int, default=None,
+                            help='Defaults to 2%% of --orders')
+        parser.add_argument('--days', type=int, default=730,
+                            help='Spread created dates over this many past days')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--password', default='password123',
+                            help='Password shared by every generated user')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.days = options['days']
+
+        cities = self.create_cities()
+        customers, workers = self.create_users(options['users'], options['password'])
+        if not customers or not workers:
+            self.stderr.write('Need at least one customer and one worker; increase --users')
+            return
+        addresses = self.create_addresses(customers, cities)
+        self.create_orders(options['orders'], addresses, workers, options['max_offers'])
+        complaints = options['complaints']
+        if complaints is None:
+            complaints = max(1, options['orders'] // 50)
+        self.create_complaints(complaints, customers + workers)
+
+    def random_date(self):
+        return self.now - timedelta(seconds=self.rng.randint(0, self.days * 86400))
+
+    def bulk(self, model, objects):
+        with transaction.atomic():
+            return model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def create_cities(self):
+        existing = {city.name: city for city in City.objects.all()}
+        missing = [City(name=name) for name, _, _ in CITIES if name not in existing]
+        for city in self.bulk(City, missing):
+            existing[city.name] = city
+        return [(existing[name], lat, lng) for name, lat, lng in CITIES]
+
+    def create_users(self, count, password):
+        # Hashing once keeps seeding fast; every user shares the same password.
+        password = make_password(password)
+        start = User.all_objects.count()
+        users = []
+        for i in range(start, start + count):
+            user_type = weighted(self.rng, USER_TYPE_WEIGHTS)
+            users.append(User(
+                email=f'{dict(User.USER_TYPE_CHOICES)[user_type].lower().replace(" ", "")}{i}@seed.fixit.test',
+                password=password,
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                user_type=user_type,
+                gender=self.rng.choice([1, 2]),
+                work_experience=self.rng.randint(0, 25) if user_type == 2 else None,
+                date_joined=self.random_date(),
+            ))
+        if not User.objects.filter(user_type=3).exists():
+            users.append(User(email='admin@seed.fixit.test', password=password, first_name='Seed',
+                              last_name='Admin', user_type=3, is_staff=True))
+        users = self.bulk(User, users)
+        self.stdout.write(f'Created {len(users)} users')
+        return ([u for u in users if u.user_type == 1], [u for u in users if u.user_type == 2])
+
+    def create_addresses(self, customers, cities):
+        addresses = []
+        for customer in customers:
+            for _ in range(self.rng.choice([1, 1, 1, 2])):
+                city, lat, lng = self.rng.choice(cities)
+                addresses.append(Address(
+                    address=f'{self.rng.randint(1, 200)} {self.rng.choice(STREETS)}',
+                    gps_position=f'{lat + self.rng.uniform(-0.05, 0.05):.6f},'
+                                 f'{lng + self.rng.uniform(-0.05, 0.05):.6f}',
+                    city=city,
+                    user=customer,
+                ))
+        addresses = self.bulk(Address, addresses)
+        self.stdout.write(f'Created {len(addresses)} addresses')
+        return addresses
+
+    def create_orders(self, count, addresses, workers, max_offers):
+        created = offers_created = ratings_created = 0
+        order_date = Order._meta.get_field('created_date')
+        rating_date = Rating._meta.get_field('created_at')
+        offer_date = Offer._meta.get_field('created_date')
+        while created < count:
+            batch = min(self.batch_size, count - created)
+            orders = []
+            for _ in range(batch):
+                address = self.rng.choice(addresses)
+                orders.append(Order(
+                    status=weighted(self.rng, ORDER_STATUS_WEIGHTS),
+                    notes=self.rng.choice(NOTES),
+                    budget=round(self.rng.lognormvariate(4.5, 0.8), 2),
+                    created_date=self.random_date(),
+                    address=address,
+                    customer_id=address.user_id,
+                ))
+            with explicit_dates(order_date):
+                orders = self.bulk(Order, orders)
+
+            offers, ratings = [], []
+            for order in orders:
+                n = self.rng.randint(0, max_offers)
+                if order.status in (2, 3):
+                    n = max(n, 1)
+                bidders = self.rng.sample(workers, min(n, len(workers)))
+                accepted = bidders[0] if order.status in (2, 3) and bidders else None
+                for worker in bidders:
+                    is_accepted = worker is accepted
+                    offers.append(Offer(
+                        status=2 if is_accepted else (1 if order.status == 1 else 3),
+                        is_accept=is_accepted,
+                        price=round(order.budget * self.rng.uniform(0.6, 1.3), 2),
+                        company_paid=is_accepted and order.status == 3 and self.rng.random() < 0.8,
+                        notes=self.rng.choice(['Can start tomorrow', 'Includes materials', None]),
+                        last_time_date=order.created_date + timedelta(hours=self.rng.randint(1, 72)),
+                        expected_date=order.created_date + timedelta(days=self.rng.randint(1, 14)),
+                        created_date=order.created_date + timedelta(minutes=self.rng.randint(5, 600)),
+                        order=order,
+                        worker=worker,
+                    ))
+                if order.status == 3 and self.rng.random() < 0.7:
+                    ratings.append(Rating(
+                        rate=weighted(self.rng, [(5, 45), (4, 30), (3, 12), (2, 6), (1, 7)]),
+                        note=self.rng.choice(['Great job', 'On time', 'Too slow', None]),
+                        order=order,
+                        user_id=order.customer_id,
+                        created_at=order.created_date + timedelta(days=self.rng.randint(1, 20)),
+                    ))
+            with explicit_dates(offer_date):
+                self.bulk(Offer, offers)
+            with explicit_dates(rating_date):
+                self.bulk(Rating, ratings)
+            created += len(orders)
+            offers_created += len(offers)
+            ratings_created += len(ratings)
+            self.stdout.write(f'Orders {created}/{count}')
+        self.stdout.write(f'Created {created} orders, {offers_created} offers, {ratings_created} ratings')
+
+    def create_complaints(self, count, users):
+        complaint_date = Complaint._meta.get_field('created_at')
+        complaints = [
+            Complaint(
+                type=self.rng.randint(1, 4),
+                message=self.rng.choice(['Worker arrived late', 'Overcharged', 'Rude behaviour',
+                                         'Job left unfinished', 'Payment not received']),
+                user=self.rng.choice(users),
+                created_at=self.random_date(),
+            )
+            for _ in range(count)
+        ]
+        with explicit_dates(complaint_date):
+            self.bulk(Complaint, complaints)
+        self.stdout.write(f'Created {count} complaints')
@@ -0,0 +1,329 @@
+"""Prometheus text-format metrics shared across gunicorn worker processes.
+
+Each process keeps its samples in memory. When ``METRICS_MULTIPROC_DIR`` is
+set, it also writes them to ``<dir>/metrics_<pid>.json`` at most once per
+``METRICS_FLUSH_INTERVAL`` seconds. ``/metrics`` then merges every file,
+so any worker can answer a scrape for the whole server. Call
+``mark_process_dead`` from gunicorn's ``child_exit`` hook to fold a dead
+worker's file into ``metrics_archive.json`` so counters never go backwards.
+"""
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+ARCHIVE_FILE = 'metrics_archive.json'
+
+logger = logging.getLogger('main_body.metrics')
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.samples = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.samples[key] = self.samples.get(key, 0) + amount
+        self.registry.maybe_flush()
+
+    @staticmethod
+    def merge(into, value):
+        return (into or 0) + value
+
+    def expose(self, samples):
+        for key, value in sorted(samples.items()):
+            yield f'{self.name}{_labels(self.labelnames, key)} {_format_value(value)}'
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames, buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            sample = self.samples.get(key)
+            if sample is None:
+                sample = self.samples[key] = [0] * len(self.buckets) + [0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample[i] += 1
+                    break
+            sample[-2] += 1
+            sample[-1] += value
+        self.registry.maybe_flush()
+
+    @staticmethod
+    def merge(into, value):
+        if into is None:
+            return list(value)
+        return [a + b for a, b in zip(into, value)]
+
+    def expose(self, samples):
+        for key, sample in sorted(samples.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, sample):
+                cumulative += count
+                yield (f'{self.name}_bucket'
+                       f'{_labels(self.labelnames, key, [("le", _format_value(bound))])} {cumulative}')
+            yield f'{self.name}_bucket{_labels(self.labelnames, key, [("le", "+Inf")])} {sample[-2]}'
+            yield f'{self.name}_sum{_labels(self.labelnames, key)} {_format_value(sample[-1])}'
+            yield f'{self.name}_count{_labels(self.labelnames, key)} {sample[-2]}'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        # Serializes flushes from the request threads of one process.
+        self.flush_lock = threading.Lock()
+        self.last_flush = 0.0
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.metrics.setdefault(name, Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.metrics.setdefault(
+            name, Histogram(self, name, documentation, labelnames, buckets))
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                name: [[list(key), value] for key, value in metric.samples.items()]
+                for name, metric in self.metrics.items()
+            }
+
+    def directory(self):
+        return getattr(settings, 'METRICS_MULTIPROC_DIR', None)
+
+    def maybe_flush(self):
+        directory = self.directory()
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0)
+        if not directory or time.monotonic() - self.last_flush < interval:
+            return
+        # Another thread flushing right now writes the same samples; don't wait for it.
+        if not self.flush_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() - self.last_flush >= interval:
+                self._flush(directory)
+        finally:
+            self.flush_lock.release()
+
+    def flush(self, directory):
+        with self.flush_lock:
+            self._flush(directory)
+
+    def _flush(self, directory):
+        """Write this process's file; errors are logged, never raised into a request."""
+        self.last_flush = time.monotonic()
+        path = os.path.join(directory, f'metrics_{os.getpid()}.json')
+        try:
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix=f'.metrics_{os.getpid()}-', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as fh:
+                    json.dump(self.snapshot(), fh)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError:
+            logger.exception('Could not write metrics to %s', path)
+
+    def collect(self):
+        """Merged samples per metric name: this process, or every process sharing the directory."""
+        directory = self.directory()
+        if not directory:
+            snapshots = [self.snapshot()]
+        else:
+            self.flush(directory)
+            snapshots = []
+            for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+                try:
+                    with open(path) as fh:
+                        snapshots.append(json.load(fh))
+                except (OSError, ValueError):
+                    continue  # a worker is mid-write or just exited
+        merged = {name: {} for name in self.metrics}
+        for snapshot in snapshots:
+            for name, samples in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                for key, value in samples:
+                    key = tuple(key)
+                    merged[name][key] = metric.merge(merged[name].get(key), value)
+        return merged
+
+    def expose(self):
+        lines = []
+        for name, samples in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            lines.extend(metric.expose(samples))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUESTS = registry.counter(
+    'fixit_http_requests_total', 'HTTP requests handled.',
+    ['view', 'action', 'method', 'status'])
+LATENCY = registry.histogram(
+    'fixit_http_request_duration_seconds', 'Time spent handling a request.',
+    ['view', 'action'])
+DB_QUERIES = registry.histogram(
+    'fixit_db_queries_per_request', 'SQL queries issued by one request.',
+    ['view', 'action'], buckets=QUERY_BUCKETS)
+DB_TIME = registry.histogram(
+    'fixit_db_duration_seconds_per_request', 'Time spent in SQL by one request.',
+    ['view', 'action'])
+CACHE = registry.counter(
+    'fixit_cache_requests_total', 'Cache lookups by cache name and result.',
+    ['cache', 'result'])
+
+THROTTLED = registry.counter(
+    'fixit_throttled_requests_total', 'Requests refused by a throttle bucket.',
+    ['scope', 'bucket'])
+
+
+def record_cache(cache, hit):
+    CACHE.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def record_throttle(scope, bucket):
+    THROTTLED.inc(scope=scope, bucket=bucket)
+
+
+def mark_process_dead(pid, directory=None):
+    """Fold a dead worker's samples into the archive file (gunicorn ``child_exit``)."""
+    directory = directory or registry.directory()
+    if not directory:
+        return
+    path = os.path.join(directory, f'metrics_{pid}.json')
+    archive = os.path.join(directory, ARCHIVE_FILE)
+    try:
+        with open(path) as fh:
+            dead = json.load(fh)
+    except (OSError, ValueError):
+        return
+    try:
+        with open(archive) as fh:
+            merged = json.load(fh)
+    except (OSError, ValueError):
+        merged = {}
+    for name, samples in dead.items():
+        metric = registry.metrics.get(name)
+        if metric is None:
+            continue
+        existing = {tuple(key): value for key, value in merged.get(name, [])}
+        for key, value in samples:
+            existing[tuple(key)] = metric.merge(existing.get(tuple(key)), value)
+        merged[name] = [[list(key), value] for key, value in existing.items()]
+    tmp = f'{archive}.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump(merged, fh)
+    os.replace(tmp, archive)
+    os.remove(path)
+
+
+class _QueryCounter:
+    __slots__ = ('queries', 'duration')
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.queries += 1
+
+
+class MetricsMiddleware:
+    """Count requests and observe latency and SQL load per DRF view and action."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = _QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        action = getattr(request, 'metrics_action', None) or request.method.lower()
+        REQUESTS.inc(view=view, action=action, method=request.method,
+                     status=response.status_code)
+        LATENCY.observe(duration, view=view, action=action)
+        DB_QUERIES.observe(counter.queries, view=view, action=action)
+        DB_TIME.observe(counter.duration, view=view, action=action)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # ViewSet.as_view() keeps the method -> action map on the view function.
+        actions = getattr(view_func, 'actions', None)
+        if actions:
+            request.metrics_action = actions.get(request.method.lower())
+        return None
+
+
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(registry.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
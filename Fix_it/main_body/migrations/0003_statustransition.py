@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-19 02:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_body', '0002_user_deleted_at_user_is_deleted'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Order'), (2, 'Offer')])),
+                ('object_id', models.BigIntegerField()),
+                ('from_status', models.PositiveSmallIntegerField()),
+                ('to_status', models.PositiveSmallIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'object_id'], name='transition_object_idx')],
+            },
+        ),
+    ]
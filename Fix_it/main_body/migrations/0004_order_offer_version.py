@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_body', '0003_statustransition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='offer',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-19 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_body', '0005_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'id'], name='order_customer_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['user', 'id'], name='rating_user_id_idx'),
+        ),
+    ]
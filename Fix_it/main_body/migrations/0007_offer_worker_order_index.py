@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-19 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_body', '0006_visibility_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['worker', 'order'], name='offer_worker_order_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-19 02:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main_body', '0007_offer_worker_order_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['user_type', 'id'], name='user_alive_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['date_joined'], name='user_alive_joined_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['deleted_at'], name='user_deleted_at_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2 on 2026-10-19 02:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_body', '0008_user_soft_delete_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'Pending'), (2, 'In Progress'), (3, 'Completed'), (4, 'Cancelled')])),
+                ('notes', models.CharField(blank=True, max_length=200, null=True)),
+                ('photo', models.TextField(blank=True, null=True)),
+                ('short_video', models.TextField(blank=True, null=True)),
+                ('budget', models.FloatField()),
+                ('created_date', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('address', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main_body.address')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOffer',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'Pending'), (2, 'Accepted'), (3, 'Rejected')])),
+                ('is_accept', models.BooleanField(default=False)),
+                ('price', models.FloatField()),
+                ('company_paid', models.BooleanField(default=False)),
+                ('notes', models.CharField(blank=True, max_length=200, null=True)),
+                ('last_time_date', models.DateTimeField(blank=True, null=True)),
+                ('expected_date', models.DateTimeField(blank=True, null=True)),
+                ('worker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='offers', to='main_body.archivedorder')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedRating',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('rate', models.PositiveSmallIntegerField()),
+                ('note', models.CharField(blank=True, max_length=200, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ratings', to='main_body.archivedorder')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['customer', 'id'], name='archived_order_customer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedoffer',
+            index=models.Index(fields=['worker', 'order'], name='archived_offer_worker_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_created_date(apps, schema_editor):
+    # Existing offers didn't record when they were made; the order's date is
+    # the closest honest value and keeps them in the right partition.
+    Offer = apps.get_model('main_body', 'Offer')
+    Order = apps.get_model('main_body', 'Order')
+    Offer.objects.update(created_date=Subquery(
+        Order.objects.filter(pk=OuterRef('order_id')).values('created_date')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_body', '0009_archive_tables'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='offer',
+            name='created_date',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='archivedoffer',
+            name='created_date',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(backfill_created_date, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def partition(apps, schema_editor):
+    # Only acts on PostgreSQL with DB_PARTITIONING enabled; see main_body.partitions.
+    from main_body.partitions import partition_all
+    partition_all(schema_editor.connection,
+                  months_ahead=getattr(settings, 'DB_PARTITION_MONTHS_AHEAD', 3))
+
+
+class Migration(migrations.Migration):
+    """Convert order, offer and rating into monthly range-partitioned tables.
+
+    The model state is unchanged, so unapplying this migration leaves the
+    tables partitioned; Django reads and writes them the same way.
+    """
+
+    dependencies = [
+        ('main_body', '0010_offer_created_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2 on 2026-10-19 03:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_body', '0011_partition_order_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCursor',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('order_id', models.BigIntegerField(default=0)),
+                ('offer_id', models.BigIntegerField(default=0)),
+                ('rating_id', models.BigIntegerField(default=0)),
+                ('transition_id', models.BigIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyOfferRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'Pending'), (2, 'Accepted'), (3, 'Rejected')])),
+                ('offers', models.PositiveIntegerField(default=0)),
+                ('price_sum', models.FloatField(default=0)),
+                ('city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main_body.city')),
+                ('worker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['worker', 'day'], name='offer_rollup_worker_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'city', 'worker', 'status'), name='offer_rollup_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyOrderRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'Pending'), (2, 'In Progress'), (3, 'Completed'), (4, 'Cancelled')])),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('budget_sum', models.FloatField(default=0)),
+                ('accepted_orders', models.PositiveIntegerField(default=0)),
+                ('accepted_budget_sum', models.FloatField(default=0)),
+                ('accepted_price_sum', models.FloatField(default=0)),
+                ('city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main_body.city')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'city', 'status'), name='order_rollup_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRatingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('rate', models.PositiveSmallIntegerField()),
+                ('ratings', models.PositiveIntegerField(default=0)),
+                ('city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main_body.city')),
+                ('worker', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['worker', 'day'], name='rating_rollup_worker_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'city', 'worker', 'rate'), name='rating_rollup_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+from django.db.models import F
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The resource was modified by another request. Reload it and retry with the new version.'
+    default_code = 'precondition_failed'
+
+
+class VersionedUpdateMixin:
+    """Optimistic concurrency for models with a ``version`` counter.
+
+    Clients send the version they read either as ``If-Match: "<version>"`` or
+    as a ``version`` field in the body. ``claim_version`` bumps the counter
+    with a conditional UPDATE and raises 412 when the stored version moved
+    on. Requests without a precondition keep the old last-write-wins
+    behaviour but still bump the counter.
+    """
+    etag_actions = ('retrieve', 'update', 'partial_update')
+
+    def get_expected_version(self):
+        request = self.request
+        value = request.headers.get('If-Match')
+        if value:
+            value = value.strip()
+            if value == '*':
+                return None
+            if value.startswith('W/'):
+                value = value[2:]
+            value = value.strip('"')
+        else:
+            value = request.data.get('version') if hasattr(request.data, 'get') else None
+            if value in (None, ''):
+                return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise PreconditionFailed()
+
+    def claim_version(self, instance):
+        """Bump ``instance.version``; call inside the transaction that saves it."""
+        expected = self.get_expected_version()
+        queryset = type(instance).objects.filter(pk=instance.pk)
+        if expected is not None:
+            queryset = queryset.filter(version=expected)
+        if not queryset.update(version=F('version') + 1):
+            raise PreconditionFailed()
+        if expected is not None:
+            instance.version = expected + 1
+        else:
+            instance.refresh_from_db(fields=['version'])
+        return instance.version
+
+    def save_sent_fields(self, serializer):
+        """Write only the fields in the request body.
+
+        A full-row save would write back every column ``get_object`` loaded,
+        including a status another request has changed since; status and
+        version are only written by their own conditional UPDATEs.
+        """
+        instance = serializer.instance
+        fields = [name for name in serializer.validated_data if name not in ('status', 'version')]
+        for name in fields:
+            setattr(instance, name, serializer.validated_data[name])
+        if fields:
+            instance.save(update_fields=fields)
+        return instance
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if (getattr(self, 'action', None) in self.etag_actions
+                and response.status_code == status.HTTP_200_OK
+                and isinstance(response.data, dict) and 'version' in response.data):
+            response['ETag'] = f'"{response.data["version"]}"'
+        return response
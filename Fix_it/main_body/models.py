@@ -1,8 +1,30 @@
 from django.db import models
+from django.db.models import Exists, OuterRef
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
-class UserManager(BaseUserManager):
+from django.core.serializers.json import DjangoJSONEncoder
+
+class SoftDeleteQuerySet(models.QuerySet):
+    """QuerySet for models with ``is_deleted``/``deleted_at`` soft-delete columns."""
+
+    def alive(self):
+        return self.filter(is_deleted=False)
+
+    def dead(self):
+        return self.filter(is_deleted=True)
+
+    def delete(self):
+        """Soft delete every row in one UPDATE, like ``Model.delete`` does per row."""
+        return self.update(is_deleted=True, deleted_at=timezone.now())
+
+    def hard_delete(self):
+        return super().delete()
+
+    def restore(self):
+        return self.update(is_deleted=False, deleted_at=None)
+
+class UserManager(BaseUserManager.from_queryset(SoftDeleteQuerySet)):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
             raise ValueError('The Email must be set')
@@ -22,7 +44,13 @@ class UserManager(BaseUserManager):
         if extra_fields.get('is_superuser') is not True:
             raise ValueError('Superuser must have is_superuser=True.')
         return self.create_user(email, password, **extra_fields)
-    
+
+class AliveUserManager(UserManager):
+    """Default manager: hides soft-deleted users. Use ``User.all_objects`` to see them."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
 class User(AbstractUser):
     USER_TYPE_CHOICES = (
         (1, 'Customer'),
@@ -53,18 +81,31 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name', 'user_type']
 
-    objects = UserManager()
-    
+    objects = AliveUserManager()
+    all_objects = UserManager()
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Partial indexes cover only live rows, so soft-deleted users
+            # stop costing index space and lookups on the hot paths.
+            models.Index(fields=['user_type', 'id'], condition=models.Q(is_deleted=False),
+                         name='user_alive_type_idx'),
+            models.Index(fields=['date_joined'], condition=models.Q(is_deleted=False),
+                         name='user_alive_joined_idx'),
+            # Lets the purge job find expired soft-deleted users without a scan.
+            models.Index(fields=['deleted_at'], condition=models.Q(is_deleted=True),
+                         name='user_deleted_at_idx'),
+        ]
+
     def delete(self, *args, **kwargs):
         """Soft delete user"""
         self.is_deleted = True
         self.deleted_at = timezone.now()
-        self.save()
+        self.save(update_fields=['is_deleted', 'deleted_at'])
 
-    REQUIRED_FIELDS = ['first_name', 'last_name', 'user_type']
+    def hard_delete(self, *args, **kwargs):
+        return super().delete(*args, **kwargs)
 
-    objects = UserManager()
-    
     groups = models.ManyToManyField(
         'auth.Group',
         verbose_name='groups',
@@ -97,6 +138,19 @@ class Address(models.Model):
     def __str__(self):
         return f"{self.address}, {self.city.name}"
 
+class OrderQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Customers see their own orders, workers the ones they bid on, staff all."""
+        if not user.is_authenticated:
+            return self.none()
+        if user.user_type == 1:  # Customer
+            return self.filter(customer=user)
+        if user.user_type == 2:  # Worker
+            # EXISTS instead of JOIN + DISTINCT: each order is probed once on
+            # the (worker, order) offer index no matter how many bids it has.
+            return self.filter(Exists(Offer.objects.filter(order=OuterRef('pk'), worker=user)))
+        return self
+
 class Order(models.Model):
     STATUS_CHOICES = (
         (1, 'Pending'),
@@ -115,10 +169,29 @@ class Order(models.Model):
     address = models.ForeignKey(Address, on_delete=models.CASCADE)
     customer = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='customer_orders')
+    version = models.PositiveIntegerField(default=1)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Serves "WHERE customer_id = ? ORDER BY id" for customer lists
+            # and the customer side of the rating visibility UNION.
+            models.Index(fields=['customer', 'id'], name='order_customer_id_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} - {self.get_status_display()}"
 
+class OfferQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Workers see their own offers, everyone else the offers on their orders."""
+        if not user.is_authenticated:
+            return self.none()
+        if user.user_type == 2:  # Worker
+            return self.filter(worker=user)
+        return self.filter(order__customer=user)
+
 class Offer(models.Model):
     STATUS_CHOICES = (
         (1, 'Pending'),
@@ -137,6 +210,15 @@ class Offer(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     worker = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='worker_offers')
+    version = models.PositiveIntegerField(default=1)
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    objects = OfferQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['worker', 'order'], name='offer_worker_order_idx'),
+        ]
 
     def __str__(self):
         return f"Offer #{self.id} for Order #{self.order.id}"
@@ -158,6 +240,22 @@ class Complaint(models.Model):
     def __str__(self):
         return f"Complaint #{self.id} - {self.get_type_display()}"
 
+class RatingQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Ratings the user wrote plus ratings left on the user's orders.
+
+        Each side of the UNION is a single indexed lookup (rating.user_id, and
+        order.customer_id joined on rating.order_id). The UNION de-duplicates
+        only the matching ids, where an OR across the join would need a
+        DISTINCT over the whole result and could not use either index.
+        """
+        if not user.is_authenticated:
+            return self.none()
+        model = self.model
+        visible_ids = model.objects.filter(user=user).values('pk').union(
+            model.objects.filter(order__customer=user).values('pk'))
+        return self.filter(pk__in=visible_ids)
+
 class Rating(models.Model):
     rate = models.PositiveSmallIntegerField(
         validators=[MinValueValidator(1), MaxValueValidator(5)]
@@ -167,5 +265,190 @@ class Rating(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = RatingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='rating_user_id_idx'),
+        ]
+
     def __str__(self):
         return f"Rating {self.rate} stars for Order #{self.order.id}"
+
+class StatusTransition(models.Model):
+    """Append-only log of status changes applied through main_body.transitions."""
+    KIND_CHOICES = (
+        (1, 'Order'),
+        (2, 'Offer'),
+    )
+
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    from_status = models.PositiveSmallIntegerField()
+    to_status = models.PositiveSmallIntegerField()
+    user = models.ForeignKey(
+        User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'object_id'], name='transition_object_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError('Status transitions are append-only')
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.object_id}: {self.from_status} -> {self.to_status}"
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a POST made with an ``Idempotency-Key`` header."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    # sha256 of the request scope and the client key, so the unique index
+    # stays fixed-width whatever clients send.
+    key = models.CharField(max_length=64)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # null while in flight
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key'),
+        ]
+
+    def __str__(self):
+        return f"Idempotency key {self.key[:12]} for user #{self.user_id}"
+
+
+class ArchivedOrderQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Same rules as ``Order.objects.visible_to`` over the archive tables."""
+        if not user.is_authenticated:
+            return self.none()
+        if user.user_type == 1:  # Customer
+            return self.filter(customer=user)
+        if user.user_type == 2:  # Worker
+            return self.filter(Exists(ArchivedOffer.objects.filter(order=OuterRef('pk'), worker=user)))
+        return self
+
+class ArchivedOrder(models.Model):
+    """Completed or cancelled order moved out of the hot tables by ``archive_orders``.
+
+    Rows keep their original ids so links and history entries stay valid.
+    """
+    STATUS_CHOICES = Order.STATUS_CHOICES
+
+    id = models.BigIntegerField(primary_key=True)
+    status = models.PositiveSmallIntegerField(choices=STATUS_CHOICES)
+    notes = models.CharField(max_length=200, null=True, blank=True)
+    photo = models.TextField(null=True, blank=True)
+    short_video = models.TextField(null=True, blank=True)
+    budget = models.FloatField()
+    created_date = models.DateTimeField()
+    address = models.ForeignKey(Address, on_delete=models.CASCADE, related_name='+')
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ArchivedOrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'id'], name='archived_order_customer_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order #{self.id} - {self.get_status_display()}"
+
+class ArchivedOffer(models.Model):
+    STATUS_CHOICES = Offer.STATUS_CHOICES
+
+    id = models.BigIntegerField(primary_key=True)
+    status = models.PositiveSmallIntegerField(choices=STATUS_CHOICES)
+    is_accept = models.BooleanField(default=False)
+    price = models.FloatField()
+    company_paid = models.BooleanField(default=False)
+    notes = models.CharField(max_length=200, null=True, blank=True)
+    last_time_date = models.DateTimeField(null=True, blank=True)
+    expected_date = models.DateTimeField(null=True, blank=True)
+    created_date = models.DateTimeField(null=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='offers')
+    worker = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['worker', 'order'], name='archived_offer_worker_idx'),
+        ]
+
+class ArchivedRating(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    rate = models.PositiveSmallIntegerField()
+    note = models.CharField(max_length=200, null=True, blank=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='ratings')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+
+
+# Daily analytics rollups, rebuilt day by day by main_body.analytics.refresh.
+# Each row sums the orders, offers or ratings created that day (UTC) with
+# the same key, so a date range is answered by adding up a few rows per day.
+
+class DailyOrderRollup(models.Model):
+    day = models.DateField()
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='+')
+    status = models.PositiveSmallIntegerField(choices=Order.STATUS_CHOICES)
+    orders = models.PositiveIntegerField(default=0)
+    budget_sum = models.FloatField(default=0)
+    # Orders with an accepted offer: their budgets and the accepted prices
+    accepted_orders = models.PositiveIntegerField(default=0)
+    accepted_budget_sum = models.FloatField(default=0)
+    accepted_price_sum = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'city', 'status'], name='order_rollup_key'),
+        ]
+
+class DailyOfferRollup(models.Model):
+    day = models.DateField()
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='+')
+    worker = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    status = models.PositiveSmallIntegerField(choices=Offer.STATUS_CHOICES)
+    offers = models.PositiveIntegerField(default=0)
+    price_sum = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'city', 'worker', 'status'], name='offer_rollup_key'),
+        ]
+        indexes = [
+            models.Index(fields=['worker', 'day'], name='offer_rollup_worker_idx'),
+        ]
+
+class DailyRatingRollup(models.Model):
+    day = models.DateField()
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='+')
+    # The worker whose offer was accepted on the rated order, if any
+    worker = models.ForeignKey(User, null=True, on_delete=models.CASCADE, related_name='+')
+    rate = models.PositiveSmallIntegerField()
+    ratings = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'city', 'worker', 'rate'], name='rating_rollup_key'),
+        ]
+        indexes = [
+            models.Index(fields=['worker', 'day'], name='rating_rollup_worker_idx'),
+        ]
+
+class RollupCursor(models.Model):
+    """How far ``analytics.refresh`` has read the tables it rolls up."""
+    name = models.CharField(max_length=50, primary_key=True)
+    order_id = models.BigIntegerField(default=0)
+    offer_id = models.BigIntegerField(default=0)
+    rating_id = models.BigIntegerField(default=0)
+    transition_id = models.BigIntegerField(default=0)
+    refreshed_at = models.DateTimeField(null=True)
@@ -0,0 +1,191 @@
+"""Monthly range partitioning of the order tables on PostgreSQL.
+
+Partitioning is opt-in (``DB_PARTITIONING=1``) and PostgreSQL only; on any
+other backend, or when it is switched off, every function here is a no-op.
+
+Each table is partitioned by its creation timestamp into one partition per
+calendar month named ``<table>_pYYYYMM``, plus a ``<table>_default``
+partition that catches rows outside the created range. PostgreSQL requires
+the partition key in every unique constraint, so the primary key becomes
+``(id, <column>)`` and foreign keys *pointing at* a partitioned table are
+dropped at the database level; Django still enforces ``on_delete`` itself.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection as default_connection
+
+# table -> partition key column. Offer and Rating are the children of Order.
+PARTITIONED_TABLES = {
+    'main_body_order': 'created_date',
+    'main_body_offer': 'created_date',
+    'main_body_rating': 'created_at',
+}
+
+
+def is_enabled(connection=None):
+    connection = connection or default_connection
+    return connection.vendor == 'postgresql' and getattr(settings, 'DB_PARTITIONING', False)
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1, day=1)
+
+
+def partition_name(table, start):
+    return f'{table}_p{start:%Y%m}'
+
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [table])
+    return cursor.fetchone() is not None
+
+
+def existing_partitions(cursor, table):
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = %s::regclass", [table])
+    return {row[0] for row in cursor.fetchall()}
+
+
+def create_partition(cursor, table, column, start):
+    """Create the partition for the month starting at ``start`` if it is missing.
+
+    Rows for that month already sitting in the default partition are moved
+    into the new one; PostgreSQL refuses to attach it otherwise.
+    """
+    name = partition_name(table, start)
+    if name in existing_partitions(cursor, table):
+        return False
+    end = add_months(start, 1)
+    qn = default_connection.ops.quote_name
+    default = f'{table}_default'
+    cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(default)}")
+    cursor.execute(f"CREATE TABLE {qn(name)} PARTITION OF {qn(table)} "
+                   f"FOR VALUES FROM (%s) TO (%s)", [start, end])
+    cursor.execute(f"WITH moved AS (DELETE FROM {qn(default)} WHERE {qn(column)} >= %s "
+                   f"AND {qn(column)} < %s RETURNING *) INSERT INTO {qn(table)} SELECT * FROM moved",
+                   [start, end])
+    cursor.execute(f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(default)} DEFAULT")
+    return True
+
+
+def ensure_partitions(cursor, table, column, first, last):
+    """Create monthly partitions covering ``first`` through ``last``; returns the names created."""
+    created = []
+    start = month_start(first)
+    while start <= last:
+        if create_partition(cursor, table, column, start):
+            created.append(partition_name(table, start))
+        start = add_months(start, 1)
+    return created
+
+
+def detach_partitions_before(cursor, table, before):
+    """Detach monthly partitions that end on or before ``before``; the tables are kept."""
+    qn = default_connection.ops.quote_name
+    detached = []
+    for name in sorted(existing_partitions(cursor, table)):
+        suffix = name[len(table) + 2:]
+        if not name.startswith(f'{table}_p') or not suffix.isdigit():
+            continue
+        start = datetime.strptime(suffix, '%Y%m').replace(tzinfo=dt_timezone.utc)
+        if add_months(start, 1) <= before:
+            cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}")
+            detached.append(name)
+    return detached
+
+
+def partition_table(cursor, table, column, months_ahead):
+    """Convert a plain table into a monthly partitioned one in place.
+
+    Must run inside a transaction; it holds an exclusive lock on the table
+    while the rows are copied.
+    """
+    if is_partitioned(cursor, table):
+        return
+    qn = default_connection.ops.quote_name
+    new = f'{table}_partitioned'
+    seq = f'{table}_id_seq_partitioned'
+
+    # Definitions to recreate once the new table has taken over the name.
+    cursor.execute("SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN "
+                   "(SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)",
+                   [table, table])
+    index_defs = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                   "WHERE conrelid = %s::regclass AND contype = 'f'", [table])
+    own_fks = cursor.fetchall()
+    cursor.execute("SELECT conrelid::regclass::text, conname FROM pg_constraint "
+                   "WHERE confrelid = %s::regclass AND contype = 'f'", [table])
+    referencing_fks = cursor.fetchall()
+
+    # Partitioned tables can't carry identity columns before PostgreSQL 17,
+    # so ids come from a plain sequence carried on from the current maximum.
+    cursor.execute(f"CREATE SEQUENCE {qn(seq)}")
+    cursor.execute(f"SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {qn(table)}), 0) + 1, false)", [seq])
+    cursor.execute(f"CREATE TABLE {qn(new)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+                   f"PARTITION BY RANGE ({qn(column)})")
+    cursor.execute(f"ALTER TABLE {qn(new)} ALTER COLUMN id SET DEFAULT nextval(%s)", [seq])
+    cursor.execute(f"CREATE TABLE {qn(table + '_default_new')} PARTITION OF {qn(new)} DEFAULT")
+
+    cursor.execute(f"SELECT MIN({qn(column)}) FROM {qn(table)}")
+    first = cursor.fetchone()[0] or datetime.now(dt_timezone.utc)
+    last = add_months(month_start(datetime.now(dt_timezone.utc)), months_ahead)
+    start = month_start(first)
+    while start <= last:
+        cursor.execute(f"CREATE TABLE {qn(partition_name(table, start) + '_new')} PARTITION OF {qn(new)} "
+                       f"FOR VALUES FROM (%s) TO (%s)", [start, add_months(start, 1)])
+        start = add_months(start, 1)
+    cursor.execute(f"INSERT INTO {qn(new)} SELECT * FROM {qn(table)}")
+
+    for referencing_table, name in referencing_fks:
+        cursor.execute(f"ALTER TABLE {referencing_table} DROP CONSTRAINT {qn(name)}")
+    cursor.execute(f"DROP TABLE {qn(table)}")
+    cursor.execute(f"ALTER TABLE {qn(new)} RENAME TO {qn(table)}")
+    for name in existing_partitions(cursor, table):
+        cursor.execute(f"ALTER TABLE {qn(name)} RENAME TO {qn(name[:-len('_new')])}")
+    cursor.execute(f"ALTER SEQUENCE {qn(seq)} OWNED BY {qn(table)}.id")
+    cursor.execute(f"ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, {qn(column)})")
+    for index_def in index_defs:
+        cursor.execute(index_def)
+    for name, definition in own_fks:
+        cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}")
+
+
+def partition_all(connection=None, months_ahead=3):
+    """Partition every table in PARTITIONED_TABLES; used by the migration."""
+    connection = connection or default_connection
+    if not is_enabled(connection):
+        return
+    with connection.cursor() as cursor:
+        for table, column in PARTITIONED_TABLES.items():
+            partition_table(cursor, table, column, months_ahead)
+
+
+def roll(connection=None, months_ahead=3, retain_months=None, now=None):
+    """Create partitions for the coming months and optionally detach old ones.
+
+    Returns ``{table: (created, detached)}``.
+    """
+    connection = connection or default_connection
+    if not is_enabled(connection):
+        return {}
+    now = now or datetime.now(dt_timezone.utc)
+    current = month_start(now)
+    result = {}
+    with connection.cursor() as cursor:
+        for table, column in PARTITIONED_TABLES.items():
+            if not is_partitioned(cursor, table):
+                continue
+            created = ensure_partitions(cursor, table, column, current, add_months(current, months_ahead))
+            detached = []
+            if retain_months is not None:
+                detached = detach_partitions_before(cursor, table, add_months(current, -retain_months))
+            result[table] = (created, detached)
+    return result
@@ -1,17 +1,32 @@
 from rest_framework import permissions
+from rest_framework.exceptions import PermissionDenied
+
+from .policy import ADMIN, CUSTOMER, SUPPORT, WORKER, decision_for
+
+
+class RolePolicy(permissions.BasePermission):
+    """Enforce ``policy.POLICIES`` for viewsets that set ``policy_resource``."""
+
+    def has_permission(self, request, view):
+        decision = decision_for(request, view)
+        if decision is None or decision.allowed:
+            return True
+        # Raised directly: DRF would tell an anonymous caller to log in instead,
+        # though the refusal (e.g. registering an admin) applies to anyone.
+        raise PermissionDenied(decision.message)
 
 class IsAdmin(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.user_type == 3
+        return request.user.is_authenticated and request.user.user_type == ADMIN
 
 class IsCustomer(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.user_type == 1
+        return request.user.is_authenticated and request.user.user_type == CUSTOMER
 
 class IsWorker(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.user_type == 2
+        return request.user.is_authenticated and request.user.user_type == WORKER
 
 class IsTechnicalSupport(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.user_type == 4
\ No newline at end of file
+        return request.user.is_authenticated and request.user.user_type == SUPPORT
@@ -0,0 +1,137 @@
+"""Declarative role policy for the main_body viewsets.
+
+``POLICIES`` maps a viewset's ``policy_resource`` and DRF action to the roles
+allowed to perform it:
+
+- ``ALLOW``: on anything the role can see (``visible_to``)
+- ``OWN``: only on objects the user owns, through the role's ``OWNER_FIELDS`` lookup
+
+A role missing from a listed action is refused with the action's message.
+Actions that aren't listed are left to the viewset's usual permissions.
+
+``permissions.RolePolicy`` makes the decision once per request and keeps it
+on the view. For ``OWN`` the viewset's ``get_queryset`` passes its queryset
+through ``restrict``, so the owner filter is part of the SQL and
+``get_object`` answers 404 for other users' objects without loading them.
+"""
+from functools import lru_cache
+from typing import NamedTuple
+
+CUSTOMER, WORKER, ADMIN, SUPPORT = 1, 2, 3, 4
+
+ALLOW = 'allow'
+OWN = 'own'
+
+_CHANGE_ORDER = {CUSTOMER: OWN, ADMIN: ALLOW}
+# Customers answer offers through accept only; the worker edits or withdraws their own.
+_CHANGE_OFFER = {WORKER: OWN, ADMIN: ALLOW}
+
+POLICIES = {
+    'order': {
+        'create': {CUSTOMER: ALLOW},
+        'update': _CHANGE_ORDER,
+        'partial_update': _CHANGE_ORDER,
+        'update_status': _CHANGE_ORDER,
+        'destroy': _CHANGE_ORDER,
+    },
+    'offer': {
+        'create': {WORKER: ALLOW},
+        'update': _CHANGE_OFFER,
+        'partial_update': _CHANGE_OFFER,
+        'destroy': _CHANGE_OFFER,
+        'accept': {CUSTOMER: OWN},
+    },
+}
+
+# (resource, role) -> lookup from the object to the user who owns it
+OWNER_FIELDS = {
+    ('order', CUSTOMER): 'customer',
+    ('offer', CUSTOMER): 'order__customer',
+    ('offer', WORKER): 'worker',
+}
+
+DENY_MESSAGES = {
+    ('order', 'create'): 'Only customers can create orders',
+    ('order', 'destroy'): "You don't have permission to delete this order",
+    ('order', None): "You don't have permission to update this order",
+    ('offer', 'create'): 'Only workers can create offers',
+    ('offer', 'accept'): 'Only the customer who owns the order can accept offers',
+    ('offer', 'destroy'): 'Only the worker who made this offer can delete it',
+    ('offer', None): 'Only the worker who made this offer can change it',
+}
+
+# (resource, role) -> the only fields that role may send when updating
+EDITABLE_FIELDS = {
+    ('order', CUSTOMER): frozenset({'status', 'notes', 'photo', 'short_video', 'budget', 'version'}),
+}
+
+# Account types not everyone may register: user_type -> (roles that may create it, message)
+RESTRICTED_USER_TYPES = {
+    ADMIN: ((), 'Cannot create admin users'),
+    SUPPORT: ((ADMIN,), 'Only admins can create Technical Support users'),
+}
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    own: bool = False
+    message: str = None
+
+
+@lru_cache(maxsize=None)
+def decide(resource, action, role):
+    """The table's answer for one (resource, action, role); None if the action isn't governed."""
+    rules = POLICIES.get(resource, {}).get(action)
+    if rules is None:
+        return None
+    rule = rules.get(role)
+    if rule is None:
+        message = DENY_MESSAGES.get((resource, action)) or DENY_MESSAGES.get((resource, None))
+        return Decision(False, message=message)
+    return Decision(True, own=rule == OWN)
+
+
+def user_type_denial(request):
+    """Message refusing registration of a restricted ``user_type``, or None."""
+    try:
+        requested = int(request.data.get('user_type'))
+    except (TypeError, ValueError):
+        return None  # the serializer reports a missing or invalid type
+    if requested not in RESTRICTED_USER_TYPES:
+        return None
+    roles, message = RESTRICTED_USER_TYPES[requested]
+    user = request.user
+    return None if user.is_authenticated and user.user_type in roles else message
+
+
+def decision_for(request, view):
+    """Decide for this request, memoized on the view (one instance per request)."""
+    if '_policy_decision' not in view.__dict__:
+        resource = getattr(view, 'policy_resource', None)
+        action = getattr(view, 'action', None)
+        decision = None
+        if resource == 'user' and action == 'create':
+            message = user_type_denial(request)
+            decision = Decision(False, message=message) if message else None
+        elif request.user.is_authenticated:
+            # Anonymous requests are left to the viewset's authentication checks.
+            decision = decide(resource, action, request.user.user_type)
+        view._policy_decision = decision
+    return view._policy_decision
+
+
+def restrict(request, view, queryset):
+    """Add the owner filter to ``queryset`` when the decision is OWN."""
+    decision = decision_for(request, view)
+    if decision is not None and decision.own:
+        owner = OWNER_FIELDS[(view.policy_resource, request.user.user_type)]
+        return queryset.filter(**{owner: request.user})
+    return queryset
+
+
+def disallowed_fields(request, view):
+    """Fields in the request body the user's role may not update."""
+    allowed = EDITABLE_FIELDS.get((view.policy_resource, request.user.user_type))
+    if allowed is None:
+        return set()
+    return set(request.data.keys()) - allowed
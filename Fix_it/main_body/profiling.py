@@ -0,0 +1,156 @@
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger('main_body.profiling')
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SLOW_REQUEST_MS': 500,
+    'SAMPLE_RATE': 1.0,
+    'KEEP': 100,
+}
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'API_PROFILING', {})}
+
+
+# Recently sampled slow requests for this process, newest last.
+recent_slow_requests = deque(maxlen=get_config()['KEEP'])
+
+
+def fingerprint(sql):
+    """Normalise a statement so the same query with different values groups together."""
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _LITERAL.sub('?', sql)
+
+
+class RequestProfile:
+    """``connection.execute_wrapper`` that tallies the queries of one request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.fingerprints = Counter()
+        self.render_started = None
+        self.render_time = 0.0
+        self.serialize_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def timed_serialization(self, to_representation):
+        """Wrap a root serializer's ``to_representation`` to add its time to ``serialize_time``."""
+        def wrapper(data):
+            start = time.perf_counter()
+            try:
+                return to_representation(data)
+            finally:
+                self.serialize_time += time.perf_counter() - start
+        return wrapper
+
+    def duplicates(self, limit=5):
+        return [(sql, count) for sql, count in self.fingerprints.most_common(limit) if count > 1]
+
+
+class ProfiledSerializerMixin:
+    """Time ``serializer.data`` of a generic view's serializers into the request profile.
+
+    For list and retrieve most of the response cost is here rather than in
+    rendering: the queryset is evaluated lazily and every field is converted
+    one object at a time. The queries it runs count towards both figures.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        profile = getattr(self.request, 'profile', None)
+        if profile is not None:
+            serializer.to_representation = profile.timed_serialization(serializer.to_representation)
+        return serializer
+
+
+class QueryProfilingMiddleware:
+    """Record query count, SQL time, duplicate queries, serialization and render time per request.
+
+    Disabled unless ``API_PROFILING['ENABLED']`` is set, in which case Django
+    drops the middleware at startup and it costs nothing. Requests slower than
+    ``SLOW_REQUEST_MS`` are sampled into a structured log line and kept in
+    ``recent_slow_requests`` for the admin debug view.
+    """
+
+    def __init__(self, get_response):
+        config = get_config()
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = config['SLOW_REQUEST_MS']
+        self.sample_rate = config['SAMPLE_RATE']
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        request.profile = profile
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - start) * 1000
+        sql_ms = profile.sql_time * 1000
+        response['Server-Timing'] = (
+            f'total;dur={total_ms:.1f}, db;dur={sql_ms:.1f}, '
+            f'serialize;dur={profile.serialize_time * 1000:.1f}, '
+            f'render;dur={profile.render_time * 1000:.1f}'
+        )
+        if total_ms >= self.slow_ms and random.random() < self.sample_rate:
+            self.record(request, response, profile, total_ms, sql_ms)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses render after this hook; time it via a post-render callback.
+        profile = getattr(request, 'profile', None)
+        if profile is not None:
+            profile.render_started = time.perf_counter()
+
+            def rendered(response):
+                profile.render_time = time.perf_counter() - profile.render_started
+            response.add_post_render_callback(rendered)
+        return response
+
+    def record(self, request, response, profile, total_ms, sql_ms):
+        match = getattr(request, 'resolver_match', None)
+        entry = {
+            'at': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 1),
+            'sql_ms': round(sql_ms, 1),
+            'serialize_ms': round(profile.serialize_time * 1000, 1),
+            'render_ms': round(profile.render_time * 1000, 1),
+            'queries': profile.queries,
+            'duplicate_queries': [
+                {'sql': sql[:300], 'count': count} for sql, count in profile.duplicates()
+            ],
+        }
+        recent_slow_requests.append(entry)
+        logger.warning(json.dumps(entry))
@@ -0,0 +1,175 @@
+"""Send read-only API traffic to read replicas.
+
+``ReplicaRoutingMiddleware`` marks GET/HEAD/OPTIONS requests to the
+main_body viewsets as read-only, and ``ReplicaRouter`` then answers
+``db_for_read`` with a healthy replica for the rest of the request.
+Everything else (writes, admin, auth views, management commands) stays on
+``default``.
+
+Read-your-writes: after a write the client is pinned to the primary for
+``REPLICA_STICKY_SECONDS``, through a cookie and, for authenticated users,
+a cache key, so a client reading right after saving sees its own change.
+With a shared cache backend the user pin holds across gunicorn workers.
+
+A replica whose replication lag exceeds ``REPLICA_MAX_LAG_SECONDS``, or
+that can't be reached, is skipped until the next check
+(``REPLICA_LAG_CHECK_INTERVAL``); with no healthy replica reads go to the
+primary.
+"""
+import contextvars
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections
+from django.utils.connection import ConnectionDoesNotExist
+from django.utils.functional import LazyObject, cached_property
+
+logger = logging.getLogger('main_body.replicas')
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'fixit_primary'
+
+_POSTGRES_LAG = (
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+_current = contextvars.ContextVar('main_body_replica_route', default=None)
+
+# alias -> (monotonic time of the check, lag in seconds or None if unreachable)
+_health = {}
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def replica_lag(alias):
+    """Replication lag of ``alias`` in seconds, or None if it can't be queried.
+
+    Only PostgreSQL reports lag; other backends (e.g. two local SQLite files)
+    count as always current.
+    """
+    try:
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            return 0.0
+        with connection.cursor() as cursor:
+            cursor.execute(_POSTGRES_LAG)
+            return float(cursor.fetchone()[0] or 0)
+    except (DatabaseError, ConnectionDoesNotExist) as exc:
+        logger.warning('Replica %s unavailable: %s', alias, exc)
+        return None
+
+
+def is_healthy(alias):
+    interval = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5)
+    checked_at, lag = _health.get(alias, (None, None))
+    now = time.monotonic()
+    if checked_at is None or now - checked_at > interval:
+        lag = replica_lag(alias)
+        _health[alias] = (now, lag)
+        if lag is not None and lag > getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 10):
+            logger.warning('Replica %s is %.1fs behind; reading from the primary', alias, lag)
+    return lag is not None and lag <= getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 10)
+
+
+def choose_replica():
+    healthy = [alias for alias in get_replicas() if is_healthy(alias)]
+    return random.choice(healthy) if healthy else None
+
+
+class Route:
+    """Routing decision for one safe-method request, resolved on its first query."""
+
+    def __init__(self, request):
+        self.request = request
+        self.active = False  # set once the request is known to hit an API viewset
+
+    @cached_property
+    def pinned_by_cookie(self):
+        return PIN_COOKIE in self.request.COOKIES
+
+    @cached_property
+    def replica(self):
+        return choose_replica()
+
+    def alias(self):
+        if not self.active:
+            return None
+        if self.pinned_by_cookie or self.replica is None:
+            return 'default'
+        # DRF authenticates inside the view, so the user is looked up lazily
+        # and the answer kept once it's known. The session user must not be
+        # resolved from here: loading it queries through this router again.
+        pinned = self.__dict__.get('pinned_user')
+        if pinned is None:
+            user = self.request.__dict__.get('user')
+            if isinstance(user, LazyObject):
+                user = getattr(self.request, '_cached_user', None)
+            if user is not None and user.is_authenticated:
+                pinned = self.__dict__['pinned_user'] = bool(cache.get(pin_key(user.pk)))
+        return 'default' if pinned else self.replica
+
+
+def current_read_alias():
+    route = _current.get()
+    return route.alias() if route is not None else None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return current_read_alias()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        if not get_replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in SAFE_METHODS:
+            request._replica_route = Route(request)
+            token = _current.set(request._replica_route)
+            try:
+                return self.get_response(request)
+            finally:
+                _current.reset(token)
+        response = self.get_response(request)
+        if response.status_code < 500:
+            self.pin(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        route = getattr(request, '_replica_route', None)
+        if route is not None and self.is_api_viewset(view_func):
+            route.active = True
+
+    def is_api_viewset(self, view_func):
+        view_class = getattr(view_func, 'cls', None)
+        return (view_class is not None and hasattr(view_func, 'actions')
+                and view_class.__module__.startswith('main_body.'))
+
+    def pin(self, request, response):
+        seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+        response.set_cookie(PIN_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax')
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            cache.set(pin_key(user.pk), 1, seconds)
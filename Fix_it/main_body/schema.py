@@ -0,0 +1,114 @@
+"""OpenAPI schema support, loaded only when a schema is generated.
+
+DRF resolves ``DEFAULT_SCHEMA_CLASS`` while the URLconf is built (the router
+inspects every viewset), so pointing it at drf_spectacular's AutoSchema made
+every worker boot and management command import the whole schema generator.
+``DeferredAutoSchema`` is configured instead. The views are annotated with
+``extend_schema_view`` where they are defined, which only needs the light
+``drf_spectacular.utils``; the annotation classes then derive from the
+placeholder. When ``SchemaGenerator`` builds each view it rebases the view's
+schema class onto the real AutoSchema, so settings and view classes are
+never changed at runtime.
+
+Deployed servers don't introspect per request: ``manage.py build_schema``
+writes the document once per deploy with ``build`` and ``Fix_it_app.docs``
+serves those files, or renders it once per process when none were built.
+"""
+import gzip
+import hashlib
+import os
+from functools import lru_cache
+
+from rest_framework.schemas.inspectors import ViewInspector
+
+# format -> file name in OPENAPI_SCHEMA_DIR; each has a ``.gz`` sibling.
+SCHEMA_FILES = {
+    'yaml': 'openapi.yaml',
+    'json': 'openapi.json',
+}
+
+
+class DeferredAutoSchema(ViewInspector):
+    """Placeholder schema for views until a schema is generated."""
+    # Read by extend_schema_view to find the view's actions; same as AutoSchema's.
+    method_mapping = {
+        'get': 'retrieve',
+        'post': 'create',
+        'put': 'update',
+        'patch': 'partial_update',
+        'delete': 'destroy',
+    }
+
+
+@lru_cache(maxsize=None)
+def auto_schema_class(schema_class):
+    """``schema_class`` with DeferredAutoSchema swapped for drf_spectacular's AutoSchema."""
+    from drf_spectacular.openapi import AutoSchema
+    if issubclass(schema_class, AutoSchema) or not issubclass(schema_class, DeferredAutoSchema):
+        return schema_class
+    # The same re-basing drf_spectacular applies when a view sets its own schema class.
+    bases = tuple(cls for cls in schema_class.__mro__ if cls not in DeferredAutoSchema.__mro__)
+    return type(schema_class.__name__, bases + AutoSchema.__mro__, {})
+
+
+def version_tag(content):
+    """ETag value for a schema document: the API version plus a content hash."""
+    from drf_spectacular.settings import spectacular_settings
+    return f'{spectacular_settings.VERSION}-{hashlib.sha256(content).hexdigest()[:16]}'
+
+
+def _write(path, content):
+    # Write beside the target and rename, so a running server never reads a half-written file.
+    partial = f'{path}.partial'
+    with open(partial, 'wb') as f:
+        f.write(content)
+    os.replace(partial, path)
+
+
+def compress(content):
+    # mtime=0 keeps the gzip bytes identical across builds of the same schema.
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def render():
+    """Generate the schema and render it in every format: ``{format: bytes}``."""
+    from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+    from drf_spectacular.settings import spectacular_settings
+
+    schema = spectacular_settings.DEFAULT_GENERATOR_CLASS().get_schema(request=None, public=True)
+    renderers = {'yaml': OpenApiYamlRenderer(), 'json': OpenApiJsonRenderer()}
+    return {fmt: renderers[fmt].render(schema, renderer_context={}) for fmt in SCHEMA_FILES}
+
+
+def build(directory):
+    """Generate the schema and write every format, plain and gzipped, to ``directory``.
+
+    Returns ``{format: (path, version tag)}``.
+    """
+    os.makedirs(directory, exist_ok=True)
+    written = {}
+    for fmt, content in render().items():
+        path = os.path.join(directory, SCHEMA_FILES[fmt])
+        _write(f'{path}.gz', compress(content))
+        _write(path, content)
+        written[fmt] = (path, version_tag(content))
+    return written
+
+
+def __getattr__(name):
+    # SPECTACULAR_SETTINGS['DEFAULT_GENERATOR_CLASS'] points here; the class
+    # subclasses drf_spectacular's generator, so it is built on first lookup.
+    if name != 'SchemaGenerator':
+        raise AttributeError(name)
+    from drf_spectacular.generators import SchemaGenerator as BaseSchemaGenerator
+
+    class SchemaGenerator(BaseSchemaGenerator):
+        def create_view(self, callback, method, request=None):
+            view = super().create_view(callback, method, request)
+            schema_class = auto_schema_class(type(view.schema))
+            if schema_class is not type(view.schema):
+                view.schema = schema_class()
+            return view
+
+    globals()['SchemaGenerator'] = SchemaGenerator
+    return SchemaGenerator
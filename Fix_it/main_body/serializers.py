@@ -1,8 +1,11 @@
 from rest_framework import serializers
-from .models import User, City, Address, Order, Offer, Complaint, Rating
+from rest_framework.validators import UniqueValidator
+from .models import User, City, Address, Order, Offer, Complaint, Rating, ArchivedOrder
 from django.contrib.auth.hashers import make_password
 from rest_framework import serializers
 from django_filters import rest_framework as filters
+from django.utils import timezone
+from .export import TABLES as EXPORT_TABLES
 
 
 class LoginRequestSerializer(serializers.Serializer):
@@ -11,6 +14,17 @@ class LoginRequestSerializer(serializers.Serializer):
 
 
 class UserSerializer(serializers.ModelSerializer):
+    # Soft-deleted users still hold their email/phone/photo, so uniqueness has
+    # to be checked against every row, not just the default (live) manager.
+    email = serializers.EmailField(
+        max_length=254, validators=[UniqueValidator(queryset=User.all_objects.all())])
+    phone = serializers.CharField(
+        max_length=45, required=False, allow_null=True, allow_blank=True,
+        validators=[UniqueValidator(queryset=User.all_objects.all())])
+    photo = serializers.CharField(
+        required=False, allow_null=True, allow_blank=True,
+        validators=[UniqueValidator(queryset=User.all_objects.all())])
+
     class Meta:
         model = User
         fields = ['id', 'email', 'first_name', 'last_name', 'birth_date', 'gender',
@@ -22,16 +36,7 @@ class UserSerializer(serializers.ModelSerializer):
         }
 
     def create(self, validated_data):
-        # Prevent creating admin users
-        if validated_data.get('user_type') == 3:  # Admin
-            raise serializers.ValidationError("Cannot create admin users")
-
-        # Only admin can create Technical Support
-        request = self.context.get('request')
-        if validated_data.get('user_type') == 4 and (not request or not request.user.is_authenticated or request.user.user_type != 3):
-            raise serializers.ValidationError(
-                "Only admins can create Technical Support users")
-
+        # Which account types a caller may create is checked by RolePolicy.
         validated_data['password'] = make_password(
             validated_data.get('password'))
         return super().create(validated_data)
@@ -60,19 +65,32 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['id', 'status', 'notes', 'photo', 'short_video', 'budget',
-                  'created_date', 'address', 'customer']
+                  'created_date', 'address', 'customer', 'version']
         extra_kwargs = {
-            'customer': {'read_only': True}
+            'customer': {'read_only': True},
+            'version': {'read_only': True},
         }
 
 
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    archived = serializers.BooleanField(default=True, read_only=True)
+
+    class Meta:
+        model = ArchivedOrder
+        fields = ['id', 'status', 'notes', 'photo', 'short_video', 'budget',
+                  'created_date', 'address', 'customer', 'archived', 'archived_at']
+        read_only_fields = fields
+
+
 class OfferSerializer(serializers.ModelSerializer):
     class Meta:
         model = Offer
         fields = ['id', 'status', 'is_accept', 'price', 'company_paid', 'notes',
-                  'last_time_date', 'expected_date', 'order', 'worker']
+                  'last_time_date', 'expected_date', 'order', 'worker', 'version']
         extra_kwargs = {
-            'worker': {'read_only': True}
+            'is_accept': {'read_only': True},  # set only by OfferViewSet.accept
+            'worker': {'read_only': True},
+            'version': {'read_only': True},
         }
 
     def create(self, validated_data):
@@ -109,3 +127,41 @@ class RatingSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 "Only completed orders can be rated")
         serializer.save(user=self.request.user)
+
+
+class AnalyticsQuerySerializer(serializers.Serializer):
+    """Query parameters of the analytics reports.
+
+    The view passes the fields its report can be grouped by as the
+    ``dimensions`` context. Without dates the report covers the last
+    ``DEFAULT_DAYS`` days up to today.
+    """
+    DEFAULT_DAYS = 30
+
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    group_by = serializers.CharField(required=False, allow_blank=True, default='day')
+    city = serializers.IntegerField(required=False)
+    worker = serializers.IntegerField(required=False)
+    status = serializers.IntegerField(required=False)
+
+    def validate_group_by(self, value):
+        fields = list(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+        dimensions = self.context['dimensions']
+        unknown = [f for f in fields if f not in dimensions]
+        if unknown:
+            raise serializers.ValidationError(
+                f"Cannot group by {', '.join(unknown)}; choose from {', '.join(dimensions)}")
+        return fields
+
+    def validate(self, attrs):
+        date_to = attrs.get('date_to') or timezone.localdate()
+        date_from = attrs.get('date_from') or date_to - timezone.timedelta(days=self.DEFAULT_DAYS - 1)
+        if date_from > date_to:
+            raise serializers.ValidationError({'date_from': 'Must not be after date_to'})
+        attrs.update(date_from=date_from, date_to=date_to)
+        return attrs
+
+
+class ExportRequestSerializer(serializers.Serializer):
+    tables = serializers.MultipleChoiceField(choices=list(EXPORT_TABLES), required=False)
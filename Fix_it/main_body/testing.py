@@ -0,0 +1,77 @@
+"""Query-count budgets for the API, used by tests_queries.py.
+
+Every endpoint is hit twice, once with ``SMALL`` rows of data and once with
+``LARGE`` rows. An endpoint fails if its query count grows with the data size
+(an N+1 in a serializer field or a per-row permission check) or if it goes over
+the budget declared for its viewset action in ``QUERY_BUDGETS``.
+"""
+import sys
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+SMALL = 10
+LARGE = 1000
+
+# (router basename, viewset action) -> maximum SQL queries per request
+QUERY_BUDGETS = {
+    ('user', 'list'): 1,
+    ('user', 'retrieve'): 1,
+    ('city', 'list'): 1,
+    ('address', 'list'): 1,
+    ('order', 'list'): 1,
+    ('order', 'retrieve'): 1,
+    ('offer', 'list'): 1,
+    ('offer', 'retrieve'): 1,
+    ('complaint', 'list'): 1,
+    ('rating', 'list'): 1,
+    ('rating', 'retrieve'): 1,
+}
+
+
+class QueryBudgetTestCase(APITestCase):
+    """Base class: subclasses implement ``grow(n)`` and call ``assertQueryBudget``."""
+    measurements = None
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.measurements = []
+
+    @classmethod
+    def tearDownClass(cls):
+        heaviest = sorted(cls.measurements, key=lambda m: m[2], reverse=True)[:5]
+        if heaviest:
+            sys.stderr.write(f'\nHeaviest endpoints in {cls.__name__} ({LARGE} rows):\n')
+            for label, small, large, budget in heaviest:
+                sys.stderr.write(f'  {label:40} {small:>3} -> {large:>3} queries (budget {budget})\n')
+        super().tearDownClass()
+
+    def grow(self, n):
+        raise NotImplementedError
+
+    def count_queries(self, user, url):
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, f'{url} returned {response.status_code}')
+        return len(captured)
+
+    def assertQueryBudget(self, basename, action, user, args=None, query=''):
+        budget = QUERY_BUDGETS[(basename, action)]
+        route = f'{basename}-list' if action == 'list' else f'{basename}-detail'
+        url = reverse(route, args=args) + query
+        label = f'{basename}.{action} as {user.get_user_type_display().lower()}{query}'
+
+        self.grow(SMALL)
+        small = self.count_queries(user, url)
+        self.grow(LARGE)
+        large = self.count_queries(user, url)
+        self.measurements.append((label, small, large, budget))
+
+        self.assertEqual(
+            small, large,
+            f'{label}: query count grows with data ({small} at {SMALL} rows, {large} at {LARGE} rows)')
+        self.assertLessEqual(large, budget, f'{label}: {large} queries, budget is {budget}')
@@ -1,7 +1,38 @@
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APITestCase
-from .models import User, City, Address, Order, Offer, Complaint, Rating
+from rest_framework.test import APITestCase, APIClient
+from django.test import TransactionTestCase, override_settings
+from django.db import connection, connections, OperationalError
+import random
+import threading
+import time
+from .models import User, City, Address, Order, Offer, Complaint, Rating, StatusTransition, IdempotencyKey
+from .models import ArchivedOrder, ArchivedOffer, ArchivedRating, DailyOrderRollup, RollupCursor
+from .serializers import OrderSerializer
+from .transitions import order_states, offer_states, TransitionConflict
+from . import views, profiling, metrics, partitions, replicas, compression, hashing, throttling, policy, export
+from . import idempotency
+from django.core.cache import cache
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.core.exceptions import ImproperlyConfigured
+from importlib import import_module
+from importlib.util import find_spec
+from Fix_it_app.database import configure_connections, pool_size
+from Fix_it_app import docs
+import gzip
+import json
+import zlib
+import os
+import tempfile
+import fcntl
+import unittest
+import runpy
+import urllib.error
+from unittest import mock
+from django.conf import settings
+from io import StringIO
+from django.core.management import call_command
 from django.utils import timezone
 from django.contrib.auth.hashers import check_password
 from django.contrib.auth.tokens import default_token_generator
@@ -111,7 +142,7 @@ class UserTests(APITestCase):
         }
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(User.objects.count(), 5)  # Including the new one
+        self.assertEqual(User.all_objects.count(), 5)  # Including the new one
 
     def test_search_users_by_email(self):
         url = reverse('user-list')
@@ -394,4 +425,1716 @@ class ComplaintTests(APITestCase):
         url = reverse('complaint-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
\ No newline at end of file
+        self.assertEqual(len(response.data), 1)
+
+
+class OfferAcceptTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass',
+            first_name='Customer',
+            last_name='User',
+            user_type=1
+        )
+        self.worker1 = User.objects.create_user(
+            email='worker1@example.com',
+            password='testpass',
+            first_name='Worker1',
+            last_name='User',
+            user_type=2
+        )
+        self.worker2 = User.objects.create_user(
+            email='worker2@example.com',
+            password='testpass',
+            first_name='Worker2',
+            last_name='User',
+            user_type=2
+        )
+        self.city = City.objects.create(name='Test City')
+        self.address = Address.objects.create(
+            address='123 Test St',
+            gps_position='0,0',
+            city=self.city,
+            user=self.customer
+        )
+        self.order = Order.objects.create(
+            status=1,
+            budget=100.00,
+            address=self.address,
+            customer=self.customer
+        )
+        self.offer1 = Offer.objects.create(
+            status=1, price=120.00, order=self.order, worker=self.worker1)
+        self.offer2 = Offer.objects.create(
+            status=1, price=110.00, order=self.order, worker=self.worker2)
+
+    def test_accept_offer_rejects_competitors(self):
+        self.client.force_authenticate(user=self.customer)
+        url = reverse('offer-accept', args=[self.offer1.id])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 2)
+        self.assertTrue(response.data['is_accept'])
+
+        self.order.refresh_from_db()
+        self.offer2.refresh_from_db()
+        self.assertEqual(self.order.status, 2)
+        self.assertEqual(self.offer2.status, 3)
+        self.assertFalse(self.offer2.is_accept)
+
+    def test_cannot_accept_second_offer(self):
+        self.client.force_authenticate(user=self.customer)
+        self.client.post(reverse('offer-accept', args=[self.offer1.id]))
+        response = self.client.post(reverse('offer-accept', args=[self.offer2.id]))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.offer1.refresh_from_db()
+        self.assertEqual(self.offer1.status, 2)
+
+    def test_worker_cannot_accept_offer(self):
+        self.client.force_authenticate(user=self.worker1)
+        response = self.client.post(reverse('offer-accept', args=[self.offer1.id]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 1)
+
+
+class OfferAcceptConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass',
+            first_name='Customer',
+            last_name='User',
+            user_type=1
+        )
+        city = City.objects.create(name='Test City')
+        address = Address.objects.create(
+            address='123 Test St',
+            gps_position='0,0',
+            city=city,
+            user=self.customer
+        )
+        self.order = Order.objects.create(
+            status=1,
+            budget=100.00,
+            address=address,
+            customer=self.customer
+        )
+        self.offers = []
+        for i in range(8):
+            worker = User.objects.create_user(
+                email=f'worker{i}@example.com',
+                password='testpass',
+                first_name='Worker',
+                last_name=str(i),
+                user_type=2
+            )
+            self.offers.append(Offer.objects.create(
+                status=1, price=100 + i, order=self.order, worker=worker))
+
+    def test_concurrent_accepts_pick_single_winner(self):
+        barrier = threading.Barrier(len(self.offers))
+        results = []
+
+        def accept(offer):
+            client = APIClient()
+            client.force_authenticate(user=self.customer)
+            barrier.wait()
+            try:
+                for attempt in range(50):
+                    try:
+                        response = client.post(reverse('offer-accept', args=[offer.id]))
+                    except OperationalError:
+                        # SQLite refuses a concurrent writer outright instead
+                        # of queueing it the way Postgres does; retry like a
+                        # client would.
+                        time.sleep(random.uniform(0.01, 0.05))
+                        continue
+                    results.append(response.status_code)
+                    break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=accept, args=(offer,)) for offer in self.offers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # A winner whose response failed after commit retries into a 409, so
+        # the database state is the source of truth for who won.
+        self.assertEqual(len(results), len(self.offers))
+        self.assertLessEqual(results.count(status.HTTP_200_OK), 1)
+        self.assertEqual(
+            results.count(status.HTTP_200_OK) + results.count(status.HTTP_409_CONFLICT),
+            len(self.offers))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 2)
+        self.assertEqual(Offer.objects.filter(order=self.order, status=2, is_accept=True).count(), 1)
+        self.assertEqual(Offer.objects.filter(order=self.order, status=3).count(), len(self.offers) - 1)
+
+
+class OrderTransitionTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass',
+            first_name='Customer',
+            last_name='User',
+            user_type=1
+        )
+        self.city = City.objects.create(name='Test City')
+        self.address = Address.objects.create(
+            address='123 Test St',
+            gps_position='0,0',
+            city=self.city,
+            user=self.customer
+        )
+        self.order = Order.objects.create(
+            status=1,
+            budget=100.00,
+            address=self.address,
+            customer=self.customer
+        )
+        self.client.force_authenticate(user=self.customer)
+
+    def test_update_status_records_history(self):
+        url = reverse('order-update-status', args=[self.order.id])
+        response = self.client.post(url, {'status': 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        transition = StatusTransition.objects.get(object_id=self.order.id)
+        self.assertEqual((transition.kind, transition.from_status, transition.to_status), (1, 1, 2))
+        self.assertEqual(transition.user, self.customer)
+
+    def test_pending_to_completed_rejected(self):
+        url = reverse('order-update-status', args=[self.order.id])
+        response = self.client.post(url, {'status': 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        url = reverse('order-detail', args=[self.order.id])
+        response = self.client.patch(url, {'status': 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 1)
+        self.assertFalse(StatusTransition.objects.exists())
+
+    def test_patch_status_and_fields(self):
+        url = reverse('order-detail', args=[self.order.id])
+        response = self.client.patch(url, {'status': 4, 'notes': 'No longer needed'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.notes), (4, 'No longer needed'))
+
+    def test_stale_transition_conflicts(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        order_states.apply(self.order, 4)
+        with self.assertRaises(TransitionConflict):
+            order_states.apply(stale, 2)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 4)
+
+    def test_transition_history_is_append_only(self):
+        order_states.apply(self.order, 2, user=self.customer)
+        transition = StatusTransition.objects.get()
+        transition.to_status = 3
+        with self.assertRaises(ValueError):
+            transition.save()
+
+
+class VersionedUpdateTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass',
+            first_name='Customer',
+            last_name='User',
+            user_type=1
+        )
+        self.worker = User.objects.create_user(
+            email='worker@example.com',
+            password='testpass',
+            first_name='Worker',
+            last_name='User',
+            user_type=2
+        )
+        self.city = City.objects.create(name='Test City')
+        self.address = Address.objects.create(
+            address='123 Test St',
+            gps_position='0,0',
+            city=self.city,
+            user=self.customer
+        )
+        self.order = Order.objects.create(
+            status=1,
+            budget=100.00,
+            address=self.address,
+            customer=self.customer
+        )
+        self.offer = Offer.objects.create(
+            status=1, price=120.00, order=self.order, worker=self.worker)
+
+    def test_retrieve_sets_etag(self):
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get(reverse('order-detail', args=[self.order.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], '"1"')
+
+    def test_update_with_matching_if_match(self):
+        self.client.force_authenticate(user=self.customer)
+        url = reverse('order-detail', args=[self.order.id])
+        response = self.client.patch(url, {'notes': 'First'}, format='json', HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['version'], 2)
+        self.assertEqual(response['ETag'], '"2"')
+
+    def test_update_with_stale_if_match(self):
+        self.client.force_authenticate(user=self.customer)
+        url = reverse('order-detail', args=[self.order.id])
+        self.client.patch(url, {'notes': 'First'}, format='json')
+        response = self.client.patch(url, {'notes': 'Second'}, format='json', HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.notes, 'First')
+        self.assertEqual(self.order.version, 2)
+
+    def test_offer_update_with_stale_version_field(self):
+        self.client.force_authenticate(user=self.worker)
+        url = reverse('offer-detail', args=[self.offer.id])
+        response = self.client.patch(url, {'price': 130.00, 'version': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.patch(url, {'price': 140.00, 'version': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.offer.refresh_from_db()
+        self.assertEqual((self.offer.price, self.offer.version), (130.00, 2))
+
+    def test_update_without_precondition_keeps_concurrent_transition(self):
+        # A cancel lands between the PATCH loading the order and saving it.
+        original = views.OrderViewSet.get_object
+
+        def get_object(view):
+            order = original(view)
+            order_states.apply(Order.objects.get(pk=order.pk), 4, user=self.customer)
+            return order
+
+        self.client.force_authenticate(user=self.customer)
+        with mock.patch.object(views.OrderViewSet, 'get_object', get_object):
+            response = self.client.patch(reverse('order-detail', args=[self.order.id]),
+                                         {'notes': 'Ring twice'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.notes, self.order.version), (4, 'Ring twice', 3))
+
+    def test_worker_cannot_accept_own_offer_by_update(self):
+        self.client.force_authenticate(user=self.worker)
+        url = reverse('offer-detail', args=[self.offer.id])
+        response = self.client.patch(url, {'status': 2, 'is_accept': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(url, {'is_accept': True, 'price': 125.00}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.offer.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual((self.offer.status, self.offer.is_accept, self.offer.price), (1, False, 125.00))
+        self.assertEqual(self.order.status, 1)
+        self.assertFalse(StatusTransition.objects.exists())
+
+    def test_status_transition_bumps_version(self):
+        self.client.force_authenticate(user=self.customer)
+        self.client.post(reverse('order-update-status', args=[self.order.id]), {'status': 2}, format='json')
+        url = reverse('order-detail', args=[self.order.id])
+        response = self.client.patch(url, {'status': 1}, format='json', HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 2)
+
+
+class IdempotencyKeyTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass',
+            first_name='Customer',
+            last_name='User',
+            user_type=1
+        )
+        self.city = City.objects.create(name='Test City')
+        self.address = Address.objects.create(
+            address='123 Test St',
+            gps_position='0,0',
+            city=self.city,
+            user=self.customer
+        )
+        self.client.force_authenticate(user=self.customer)
+        self.url = reverse('order-list')
+        self.data = {'status': 1, 'budget': 200.00, 'address': self.address.id}
+
+    def test_retry_replays_response(self):
+        first = self.client.post(self.url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        second = self.client.post(self.url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_different_payload_rejected(self):
+        self.client.post(self.url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        response = self.client.post(self.url, dict(self.data, budget=300), format='json',
+                                    HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_in_flight_duplicate_conflicts(self):
+        self.client.post(self.url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        IdempotencyKey.objects.update(status_code=None, response_body=None)
+        response = self.client.post(self.url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_in_flight_key_held_for_lease_only(self):
+        with override_settings(IDEMPOTENCY_IN_FLIGHT_LEASE=120):
+            self.client.post(self.url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        record = IdempotencyKey.objects.get()
+        self.assertGreater(record.expires_at, timezone.now() + timezone.timedelta(hours=23))
+
+        # The worker that claimed the key was killed before it stored a response.
+        IdempotencyKey.objects.update(status_code=None, response_body=None,
+                                      expires_at=timezone.now() - timezone.timedelta(seconds=1))
+        response = self.client.post(self.url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_claim_expires_after_lease(self):
+        with override_settings(IDEMPOTENCY_IN_FLIGHT_LEASE=120):
+            record, claimed = idempotency._claim(self.customer, 'abc', 'h' * 64)
+        self.assertTrue(claimed)
+        self.assertLess(record.expires_at, timezone.now() + timezone.timedelta(seconds=121))
+
+    def test_expired_key_executes_again(self):
+        self.client.post(self.url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timezone.timedelta(seconds=1))
+        response = self.client.post(self.url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_no_key_creates_every_time(self):
+        self.client.post(self.url, self.data, format='json')
+        self.client.post(self.url, self.data, format='json')
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+@override_settings(API_PROFILING={'ENABLED': True, 'SLOW_REQUEST_MS': 0, 'SAMPLE_RATE': 1.0})
+class QueryProfilingTests(APITestCase):
+    def setUp(self):
+        profiling.recent_slow_requests.clear()
+        self.admin = User.objects.create_user(
+            email='admin@example.com',
+            password='adminpass',
+            first_name='Admin',
+            last_name='User',
+            user_type=3
+        )
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass',
+            first_name='Customer',
+            last_name='User',
+            user_type=1
+        )
+
+    def test_fingerprint_groups_repeated_queries(self):
+        self.assertEqual(
+            profiling.fingerprint("SELECT * FROM t WHERE id = 12 AND name = 'x' AND k IN (%s, %s)"),
+            "SELECT * FROM t WHERE id = ? AND name = ? AND k IN (...)")
+
+    def test_slow_requests_are_recorded(self):
+        self.client.force_authenticate(user=self.customer)
+        with self.assertLogs('main_body.profiling', level='WARNING'):
+            response = self.client.get(reverse('order-list'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        entry = profiling.recent_slow_requests[-1]
+        self.assertEqual(entry['view'], 'order-list')
+        self.assertGreaterEqual(entry['queries'], 1)
+
+    def test_serialization_is_timed_separately(self):
+        city = City.objects.create(name='Test City')
+        address = Address.objects.create(address='1 Test St', gps_position='0,0', city=city, user=self.customer)
+        Order.objects.create(status=1, budget=100, address=address, customer=self.customer)
+        original = OrderSerializer.to_representation
+
+        def slow(serializer, instance):
+            time.sleep(0.05)
+            return original(serializer, instance)
+
+        self.client.force_authenticate(user=self.customer)
+        with mock.patch.object(OrderSerializer, 'to_representation', slow), \
+                self.assertLogs('main_body.profiling', level='WARNING'):
+            response = self.client.get(reverse('order-list'))
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+        entry = profiling.recent_slow_requests[-1]
+        self.assertGreaterEqual(entry['serialize_ms'], 50)
+        self.assertLess(entry['render_ms'], entry['serialize_ms'])
+
+    def test_profile_view_is_admin_only(self):
+        with self.assertLogs('main_body.profiling', level='WARNING'):
+            self.client.force_authenticate(user=self.customer)
+            response = self.client.get(reverse('debug_profile'))
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+            self.client.force_authenticate(user=self.admin)
+            response = self.client.get(reverse('debug_profile'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['enabled'])
+        self.assertEqual(response.data['requests'][0]['view'], 'debug_profile')
+        self.assertEqual(response.data['requests'][0]['status'], 403)
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass',
+            first_name='Customer',
+            last_name='User',
+            user_type=1
+        )
+
+    def sample(self, text, prefix):
+        for line in text.splitlines():
+            if line.startswith(prefix):
+                return float(line.rsplit(' ', 1)[1])
+        return 0.0
+
+    def test_requests_are_labeled_by_view_and_action(self):
+        prefix = 'fixit_http_requests_total{view="order-list",action="list",method="GET",status="200"}'
+        before = self.sample(self.client.get('/metrics').content.decode(), prefix)
+        self.client.force_authenticate(user=self.customer)
+        self.client.get(reverse('order-list'))
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertEqual(self.sample(text, prefix), before + 1)
+        self.assertIn('# TYPE fixit_http_request_duration_seconds histogram', text)
+        self.assertIn('fixit_db_queries_per_request_bucket{view="order-list",action="list",le="+Inf"}', text)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_required_when_configured(self):
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_samples_merge_across_worker_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            key = ['order-list', 'list', 'GET', '200']
+            for pid, value in ((1001, 2), (1002, 3)):
+                with open(os.path.join(directory, f'metrics_{pid}.json'), 'w') as fh:
+                    json.dump({'fixit_http_requests_total': [[key, value]]}, fh)
+            metrics.mark_process_dead(1002, directory)
+            with override_settings(METRICS_MULTIPROC_DIR=directory):
+                merged = metrics.registry.collect()['fixit_http_requests_total']
+            self.assertFalse(os.path.exists(os.path.join(directory, 'metrics_1002.json')))
+        # collect() also flushes this process, which may have served order-list already.
+        own = {tuple(k): v for k, v in metrics.registry.snapshot()['fixit_http_requests_total']}
+        self.assertEqual(merged[tuple(key)], 5 + own.get(tuple(key), 0))
+
+    def test_concurrent_flushes_from_request_threads(self):
+        registry = metrics.Registry()
+        registry.counter('fixit_test_total', 'Test counter.').inc()
+        errors = []
+
+        def flush(directory):
+            try:
+                for _ in range(50):
+                    registry.flush(directory)
+                    registry.last_flush = 0.0
+                    registry.maybe_flush()
+            except Exception as exc:
+                errors.append(exc)
+
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(METRICS_MULTIPROC_DIR=directory):
+                threads = [threading.Thread(target=flush, args=(directory,)) for _ in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            self.assertEqual(errors, [])
+            self.assertEqual(os.listdir(directory), [f'metrics_{os.getpid()}.json'])
+
+    def test_flush_errors_are_logged_not_raised(self):
+        registry = metrics.Registry()
+        with self.assertLogs('main_body.metrics', 'ERROR'):
+            registry.flush(os.path.join(tempfile.gettempdir(), 'fixit-missing-metrics-dir'))
+
+
+class SeedDataAndBenchmarkTests(APITestCase):
+    def test_seed_and_benchmark(self):
+        call_command('seed_data', users=40, orders=60, max_offers=3, stdout=StringIO())
+        self.assertEqual(Order.objects.count(), 60)
+        self.assertTrue(User.objects.filter(user_type=2).exists())
+        self.assertTrue(User.objects.filter(user_type=3).exists())
+        # Orders that moved past Pending always have exactly one accepted offer.
+        for order in Order.objects.filter(status__in=[2, 3]):
+            self.assertEqual(order.offer_set.filter(is_accept=True).count(), 1)
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command('benchmark', iterations=2, warmup=0, only=['order-list:customer', 'city-list'],
+                         startup=1, output=output, stdout=StringIO())
+            with open(output) as fh:
+                results = json.load(fh)
+        self.assertEqual(set(results['endpoints']), {'order-list:customer', 'city-list'})
+        self.assertEqual(results['endpoints']['city-list']['status'], [200])
+        self.assertIn('connections_per_request', results['endpoints']['city-list'])
+        # Schema tooling stays out of worker boot (see main_body/schema.py).
+        self.assertEqual(results['startup']['deferred_loaded'], [])
+        self.assertGreater(results['startup']['import_ms'], 0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'compression.json')
+            call_command('benchmark_compression', repeat=1, only=['order-list:customer'],
+                         output=output, stdout=StringIO())
+            with open(output) as fh:
+                results = json.load(fh)
+        gzip_6 = results['endpoints']['order-list:customer']['codecs']['gzip-6']
+        self.assertLess(gzip_6['bytes'], results['endpoints']['order-list:customer']['bytes'])
+
+
+class RatingVisibilityTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass',
+            first_name='Customer',
+            last_name='User',
+            user_type=1
+        )
+        self.worker = User.objects.create_user(
+            email='worker@example.com',
+            password='testpass',
+            first_name='Worker',
+            last_name='User',
+            user_type=2
+        )
+        self.other = User.objects.create_user(
+            email='other@example.com',
+            password='testpass',
+            first_name='Other',
+            last_name='User',
+            user_type=1
+        )
+        self.city = City.objects.create(name='Test City')
+        address = Address.objects.create(
+            address='123 Test St', gps_position='0,0', city=self.city, user=self.customer)
+        other_address = Address.objects.create(
+            address='9 Other St', gps_position='0,0', city=self.city, user=self.other)
+        order = Order.objects.create(status=3, budget=100, address=address, customer=self.customer)
+        other_order = Order.objects.create(status=3, budget=100, address=other_address, customer=self.other)
+        self.own = Rating.objects.create(rate=5, order=order, user=self.customer)
+        self.by_worker = Rating.objects.create(rate=4, order=order, user=self.worker)
+        self.elsewhere = Rating.objects.create(rate=2, order=other_order, user=self.worker)
+        self.unrelated = Rating.objects.create(rate=3, order=other_order, user=self.other)
+
+    def test_visible_to_without_distinct(self):
+        queryset = Rating.objects.visible_to(self.customer)
+        self.assertNotIn('DISTINCT', str(queryset.query))
+        self.assertEqual(sorted(r.id for r in queryset), [self.own.id, self.by_worker.id])
+        self.assertEqual(
+            sorted(r.id for r in Rating.objects.visible_to(self.worker)),
+            [self.by_worker.id, self.elsewhere.id])
+
+    def test_rating_list_uses_visibility(self):
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get(reverse('rating-list'), {'ordering': '-rate'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in response.data], [self.own.id, self.by_worker.id])
+
+
+class WorkerOrderVisibilityTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass',
+            first_name='Customer',
+            last_name='User',
+            user_type=1
+        )
+        self.worker = User.objects.create_user(
+            email='worker@example.com',
+            password='testpass',
+            first_name='Worker',
+            last_name='User',
+            user_type=2
+        )
+        city = City.objects.create(name='Test City')
+        address = Address.objects.create(
+            address='123 Test St', gps_position='0,0', city=city, user=self.customer)
+        self.bid = Order.objects.create(status=1, budget=100, address=address, customer=self.customer)
+        self.not_bid = Order.objects.create(status=1, budget=200, address=address, customer=self.customer)
+        # Several bids on one order must not duplicate it in the worker's list.
+        for price in (80, 90, 95):
+            Offer.objects.create(status=1, price=price, order=self.bid, worker=self.worker)
+
+    def test_worker_sees_each_order_once(self):
+        queryset = Order.objects.visible_to(self.worker)
+        sql = str(queryset.query)
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('DISTINCT', sql)
+        self.assertEqual(list(queryset), [self.bid])
+
+    def test_worker_order_list(self):
+        self.client.force_authenticate(user=self.worker)
+        response = self.client.get(reverse('order-list'), {'ordering': '-budget'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([o['id'] for o in response.data], [self.bid.id])
+
+
+class SoftDeleteTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email='admin@example.com',
+            password='adminpass',
+            first_name='Admin',
+            last_name='User',
+            user_type=3
+        )
+        self.user = User.objects.create_user(
+            email='user@example.com',
+            password='testpass',
+            first_name='Test',
+            last_name='User',
+            phone='+100',
+            user_type=1
+        )
+        city = City.objects.create(name='Test City')
+        address = Address.objects.create(
+            address='123 Test St', gps_position='0,0', city=city, user=self.user)
+        self.order = Order.objects.create(status=3, budget=100, address=address, customer=self.user)
+
+    def test_default_manager_hides_deleted(self):
+        self.user.delete()
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertTrue(User.all_objects.filter(pk=self.user.pk, is_deleted=True).exists())
+        # Relations still resolve through the base manager.
+        self.assertEqual(Order.objects.get(pk=self.order.pk).customer, self.user)
+
+    def test_deleted_user_cannot_log_in(self):
+        self.user.delete()
+        response = self.client.post(reverse('login'), {'email': 'user@example.com', 'password': 'testpass'},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_deleted_email_cannot_be_reused(self):
+        self.user.delete()
+        response = self.client.post(reverse('user-list'), {
+            'email': 'user@example.com',
+            'password': 'newpass123',
+            'first_name': 'New',
+            'last_name': 'User',
+            'user_type': 1
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_purge_anonymizes_expired_users(self):
+        self.user.delete()
+        User.all_objects.filter(pk=self.user.pk).update(
+            deleted_at=timezone.now() - timezone.timedelta(days=100))
+        call_command('purge_deleted_users', days=90, stdout=StringIO())
+        user = User.all_objects.get(pk=self.user.pk)
+        self.assertTrue(user.email.endswith('@deleted.invalid'))
+        self.assertIsNone(user.phone)
+        self.assertFalse(user.has_usable_password())
+        self.assertTrue(Order.objects.filter(pk=self.order.pk).exists())
+
+    def test_purge_delete_mode_respects_retention(self):
+        self.user.delete()
+        call_command('purge_deleted_users', days=90, mode='delete', stdout=StringIO())
+        self.assertTrue(User.all_objects.filter(pk=self.user.pk).exists())
+        User.all_objects.filter(pk=self.user.pk).update(
+            deleted_at=timezone.now() - timezone.timedelta(days=100))
+        call_command('purge_deleted_users', days=90, mode='delete', stdout=StringIO())
+        self.assertFalse(User.all_objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(Order.objects.filter(pk=self.order.pk).exists())
+
+
+class OrderArchiveTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com', password='testpass', first_name='Test',
+            last_name='Customer', user_type=1)
+        self.worker = User.objects.create_user(
+            email='worker@example.com', password='testpass', first_name='Test',
+            last_name='Worker', user_type=2)
+        city = City.objects.create(name='Test City')
+        address = Address.objects.create(
+            address='123 Test St', gps_position='0,0', city=city, user=self.customer)
+        old = timezone.now() - timezone.timedelta(days=400)
+        self.old_done = Order.objects.create(status=3, budget=100, address=address, customer=self.customer)
+        self.old_open = Order.objects.create(status=2, budget=200, address=address, customer=self.customer)
+        self.recent_done = Order.objects.create(status=4, budget=300, address=address, customer=self.customer)
+        Order.objects.filter(pk__in=[self.old_done.pk, self.old_open.pk]).update(created_date=old)
+        self.offer = Offer.objects.create(order=self.old_done, worker=self.worker, price=90, status=2, is_accept=True)
+        self.rating = Rating.objects.create(order=self.old_done, user=self.customer, rate=5)
+
+    def archive(self):
+        out = StringIO()
+        call_command('archive_orders', days=365, batch_size=1, stdout=out)
+        return out.getvalue()
+
+    def test_moves_old_finished_orders_with_children(self):
+        output = self.archive()
+        self.assertIn('Archived 1 orders, 1 offers and 1 ratings', output)
+        self.assertFalse(Order.objects.filter(pk=self.old_done.pk).exists())
+        self.assertFalse(Offer.objects.filter(pk=self.offer.pk).exists())
+        self.assertFalse(Rating.objects.filter(pk=self.rating.pk).exists())
+        self.assertEqual(set(Order.objects.values_list('pk', flat=True)),
+                         {self.old_open.pk, self.recent_done.pk})
+
+        archived = ArchivedOrder.objects.get(pk=self.old_done.pk)
+        self.assertEqual(archived.customer, self.customer)
+        self.assertEqual(ArchivedOffer.objects.get(pk=self.offer.pk).order, archived)
+        self.assertEqual(ArchivedRating.objects.get(pk=self.rating.pk).rate, 5)
+
+    def test_dry_run_changes_nothing(self):
+        out = StringIO()
+        call_command('archive_orders', days=365, dry_run=True, stdout=out)
+        self.assertIn('1 orders', out.getvalue())
+        self.assertEqual(ArchivedOrder.objects.count(), 0)
+
+    def test_list_includes_archived_only_on_request(self):
+        self.archive()
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get(reverse('order-list'))
+        self.assertNotIn(self.old_done.pk, [o['id'] for o in response.data])
+
+        response = self.client.get(reverse('order-list'), {'include_archived': '1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = {o['id']: o for o in response.data}
+        self.assertEqual(set(rows), {self.old_done.pk, self.old_open.pk, self.recent_done.pk})
+        self.assertTrue(rows[self.old_done.pk]['archived'])
+
+        response = self.client.get(reverse('order-list'), {'include_archived': '1', 'status': 2})
+        self.assertEqual([o['id'] for o in response.data], [self.old_open.pk])
+
+    def test_retrieve_archived_order(self):
+        self.archive()
+        url = reverse('order-detail', args=[self.old_done.pk])
+        self.client.force_authenticate(user=self.worker)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(url, {'include_archived': '1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['budget'], 100)
+
+        other = User.objects.create_user(
+            email='other@example.com', password='testpass', first_name='O', last_name='C', user_type=1)
+        self.client.force_authenticate(user=other)
+        response = self.client.get(url, {'include_archived': '1'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PartitioningTests(APITestCase):
+    def test_month_helpers(self):
+        start = partitions.month_start(timezone.now().replace(year=2025, month=11, day=17))
+        self.assertEqual((start.year, start.month, start.day, start.hour), (2025, 11, 1, 0))
+        self.assertEqual(partitions.add_months(start, 2).strftime('%Y-%m'), '2026-01')
+        self.assertEqual(partitions.add_months(start, -11).strftime('%Y-%m'), '2024-12')
+        self.assertEqual(partitions.partition_name('main_body_order', start), 'main_body_order_p202511')
+
+    @override_settings(DB_PARTITIONING=True)
+    def test_noop_outside_postgres(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('exercises the fallback path')
+        self.assertFalse(partitions.is_enabled())
+        self.assertEqual(partitions.roll(), {})
+        out = StringIO()
+        call_command('roll_partitions', stdout=out)
+        self.assertIn('disabled', out.getvalue())
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'partitioning needs PostgreSQL')
+    @override_settings(DB_PARTITIONING=True, DB_PARTITION_MONTHS_AHEAD=2)
+    def test_postgres_conversion_and_roll(self):
+        customer = User.objects.create_user(
+            email='customer@example.com', password='testpass', first_name='Test',
+            last_name='Customer', user_type=1)
+        address = Address.objects.create(address='1 Part St', gps_position='0,0',
+                                         city=City.objects.create(name='Part City'), user=customer)
+        old = Order.objects.create(status=3, budget=100, address=address, customer=customer)
+        Order.objects.filter(pk=old.pk).update(created_date=timezone.now() - timezone.timedelta(days=400))
+        Offer.objects.create(order=old, worker=customer, price=90)
+
+        # Runs the migration's code path; the test transaction undoes the DDL.
+        migration = import_module('main_body.migrations.0011_partition_order_tables')
+        migration.partition(None, type('SchemaEditor', (), {'connection': connection})())
+        now = timezone.now()
+        current = partitions.month_start(now)
+        with connection.cursor() as cursor:
+            for table in partitions.PARTITIONED_TABLES:
+                self.assertTrue(partitions.is_partitioned(cursor, table))
+            names = partitions.existing_partitions(cursor, 'main_body_order')
+        self.assertIn(partitions.partition_name('main_body_order', partitions.add_months(current, 2)), names)
+        self.assertNotIn(partitions.partition_name('main_body_order', partitions.add_months(current, 3)),
+                         names)
+        self.assertIn(partitions.partition_name('main_body_order', partitions.month_start(
+            now - timezone.timedelta(days=400))), names)
+
+        # Rows survive the copy and new ones get fresh ids.
+        self.assertEqual(Order.objects.get(pk=old.pk).budget, 100)
+        self.assertGreater(Order.objects.create(status=1, budget=5, address=address,
+                                                customer=customer).pk, old.pk)
+
+        out = StringIO()
+        call_command('roll_partitions', months_ahead=4, retain_months=6, stdout=out)
+        self.assertIn(partitions.partition_name('main_body_order', partitions.add_months(current, 4)),
+                      out.getvalue())
+        self.assertFalse(Order.objects.filter(pk=old.pk).exists())  # its partition was detached
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_MAX_LAG_SECONDS=10)
+class ReplicaRoutingTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com', password='testpass', first_name='Test',
+            last_name='Customer', user_type=1)
+        city = City.objects.create(name='Test City')
+        self.address = Address.objects.create(
+            address='123 Test St', gps_position='0,0', city=city, user=self.customer)
+        replicas._health.clear()
+        cache.clear()
+        self.addCleanup(replicas._health.clear)
+
+    def route(self, cookies=None, user=None):
+        request = RequestFactory().get('/api/orders/')
+        request.COOKIES.update(cookies or {})
+        request.user = user
+        route = replicas.Route(request)
+        route.active = True
+        return route
+
+    def mark(self, lag):
+        replicas._health['replica1'] = (time.monotonic(), lag)
+
+    def test_reads_go_to_healthy_replica(self):
+        self.mark(0.5)
+        self.assertEqual(self.route().alias(), 'replica1')
+        self.assertEqual(self.route(user=self.customer).alias(), 'replica1')
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        self.mark(30)
+        self.assertEqual(self.route().alias(), 'default')
+
+    def test_recent_writer_is_pinned_to_primary(self):
+        self.mark(0)
+        self.assertEqual(self.route(cookies={replicas.PIN_COOKIE: '1'}).alias(), 'default')
+        cache.set(replicas.pin_key(self.customer.pk), 1, 5)
+        self.assertEqual(self.route(user=self.customer).alias(), 'default')
+
+    def test_router_only_routes_reads_inside_api_requests(self):
+        router = replicas.ReplicaRouter()
+        self.mark(0)
+        self.assertIsNone(router.db_for_read(Order))
+        route = self.route()
+        token = replicas._current.set(route)
+        try:
+            self.assertEqual(router.db_for_read(Order), 'replica1')
+            self.assertEqual(router.db_for_write(Order), 'default')
+            route.active = False
+            self.assertIsNone(router.db_for_read(Order))
+        finally:
+            replicas._current.reset(token)
+
+    def test_write_sets_pin_and_unreachable_replica_is_skipped(self):
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.post(reverse('order-list'), {'budget': 50, 'address': self.address.id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+        self.assertTrue(cache.get(replicas.pin_key(self.customer.pk)))
+
+        # replica1 isn't a configured database here, so the health check
+        # fails and the read is served by the primary.
+        self.client.cookies.clear()
+        cache.clear()
+        with self.assertLogs('main_body.replicas', 'WARNING'):
+            response = self.client.get(reverse('order-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+
+    def test_session_login_reads_from_healthy_replica(self):
+        # A second SQLite alias sharing the test database's connection, so it
+        # is healthy and sees the rows created inside the test transaction.
+        connections['replica1'] = connections['default']
+        self.addCleanup(delattr, connections._connections, 'replica1')
+        Order.objects.create(status=1, budget=50, address=self.address, customer=self.customer)
+        self.assertTrue(self.client.login(email='customer@example.com', password='testpass'))
+
+        routed = []
+        read_alias = replicas.current_read_alias
+
+        def record():
+            routed.append(read_alias())
+            return routed[-1]
+
+        with mock.patch.object(replicas, 'current_read_alias', record):
+            response = self.client.get(reverse('order-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(routed[-1], 'replica1')
+
+        # Once DRF has loaded the session user, its pin is honoured.
+        cache.set(replicas.pin_key(self.customer.pk), 1, 5)
+        with mock.patch.object(replicas, 'current_read_alias', record):
+            self.client.get(reverse('order-list'))
+        self.assertEqual(routed[-1], 'default')
+
+class ConnectionPoolingTests(APITestCase):
+    POSTGRES = {'ENGINE': 'django.db.backends.postgresql', 'NAME': 'fixit'}
+
+    def test_pool_size_fits_connection_limit(self):
+        self.assertEqual(pool_size(workers=4, threads=8, max_connections=100), {'min_size': 4, 'max_size': 8})
+        # 9 workers * 8 threads would need 72 connections but only 45 are left.
+        self.assertEqual(pool_size(workers=9, threads=8, max_connections=50), {'min_size': 2, 'max_size': 5})
+        with self.assertRaises(ImproperlyConfigured):
+            pool_size(workers=200, threads=1, max_connections=100)
+
+    def test_modes(self):
+        config = configure_connections({'ENGINE': 'django.db.backends.sqlite3'}, mode='persistent', conn_max_age=30)
+        self.assertEqual((config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS']), (30, True))
+        config = configure_connections({'ENGINE': 'django.db.backends.sqlite3'}, mode='off')
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        # SQLite has nothing to pool and keeps persistent connections instead.
+        config = configure_connections({'ENGINE': 'django.db.backends.sqlite3'}, mode='pool')
+        self.assertNotIn('OPTIONS', config)
+        with self.assertRaises(ImproperlyConfigured):
+            configure_connections({}, mode='bogus')
+
+    def test_pool_mode_on_postgres(self):
+        if find_spec('psycopg_pool') is None:
+            with self.assertRaises(ImproperlyConfigured):
+                configure_connections(dict(self.POSTGRES), mode='pool')
+            return
+        config = configure_connections(dict(self.POSTGRES), mode='pool', workers=2, threads=4)
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertEqual(config['OPTIONS']['pool']['max_size'], 4)
+
+
+class ServerConfigTests(APITestCase):
+    def load(self, **env):
+        with mock.patch.dict(os.environ, env, clear=False):
+            for name in ('WEB_CONCURRENCY', 'GUNICORN_THREADS'):
+                if name not in env:
+                    os.environ.pop(name, None)
+            return runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+
+    def test_sync_profile(self):
+        config = self.load(GUNICORN_WORKER_CLASS='sync', GUNICORN_PRELOAD='1')
+        self.assertEqual(config['worker_class'], 'sync')
+        self.assertEqual(config['threads'], 1)
+        self.assertEqual(config['workers'], os.cpu_count() * 2 + 1)
+        self.assertTrue(config['preload_app'])
+        self.assertEqual(config['wsgi_app'], 'Fix_it_app.wsgi:application')
+        self.assertEqual(config['max_requests_jitter'], config['max_requests'] // 10)
+
+    def test_gthread_profile(self):
+        config = self.load(GUNICORN_WORKER_CLASS='gthread', WEB_CONCURRENCY='3', GUNICORN_THREADS='8')
+        self.assertEqual((config['worker_class'], config['workers'], config['threads']), ('gthread', 3, 8))
+
+    def test_uvicorn_profile_disables_persistent_connections(self):
+        path = str(settings.BASE_DIR / 'gunicorn.conf.py')
+        with mock.patch('importlib.util.find_spec', return_value=object()):  # uvicorn may be missing
+            with mock.patch.dict(os.environ, {'GUNICORN_WORKER_CLASS': 'uvicorn'}):
+                os.environ.pop('DB_POOL_MODE', None)
+                config = runpy.run_path(path)
+                self.assertEqual((os.environ['DB_POOL_MODE'], os.environ['DB_CONN_MAX_AGE']), ('off', '0'))
+            self.assertEqual(config['wsgi_app'], 'Fix_it_app.asgi:application')
+            with self.assertRaises(RuntimeError):
+                self.load(GUNICORN_WORKER_CLASS='uvicorn', DB_POOL_MODE='persistent')
+
+    def test_unknown_worker_class(self):
+        with self.assertRaises(RuntimeError):
+            self.load(GUNICORN_WORKER_CLASS='eventlet')
+
+    def test_benchmark_load_counts_failed_logins(self):
+        from main_body.management.commands.benchmark_server import Command
+        command = Command()
+        command.base, command.paths = 'http://127.0.0.1:9', ['/api/cities/']
+        refused = urllib.error.HTTPError(command.base, 429, 'Too Many Requests', {}, None)
+        with mock.patch.object(Command, 'client', side_effect=refused):
+            timings, errors, login_errors = command.load(duration=0.3, concurrency=2)
+        self.assertEqual((timings, errors), ([], 0))
+        self.assertGreaterEqual(login_errors, 2)
+
+
+class ApiDocsTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.schema_dir = directory.name
+        settings_override = override_settings(OPENAPI_SCHEMA_DIR=self.schema_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def build(self):
+        call_command('build_schema', stdout=StringIO())
+
+    def test_schema_and_docs_are_served(self):
+        self.build()
+        response = self.client.get(reverse('schema'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'List all ratings', response.content)
+        self.assertIn(b'date_from', response.content)
+        # Generating it leaves DRF's settings and the view classes alone.
+        from rest_framework.settings import api_settings
+        from main_body.schema import DeferredAutoSchema
+        self.assertIs(api_settings.DEFAULT_SCHEMA_CLASS, DeferredAutoSchema)
+        response = self.client.get(reverse('swagger-ui'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_built_schema_is_cacheable(self):
+        self.build()
+        response = self.client.get(reverse('schema'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('max-age=86400', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        with open(os.path.join(self.schema_dir, 'openapi.yaml'), 'rb') as f:
+            self.assertEqual(gzip.decompress(response.content), f.read())
+
+        response = self.client.get(reverse('schema'), HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+        response = self.client.get(reverse('schema'), {'format': 'json'})
+        self.assertTrue(response['Content-Type'].startswith('application/vnd.oai.openapi+json'))
+        self.assertIn('/api/orders/', json.loads(response.content)['paths'])
+        self.assertTrue(response['ETag'].startswith('"1.0.0-'))
+
+    def test_missing_schema(self):
+        # Without a build the schema is rendered once in the process and served like a built one.
+        with mock.patch.dict(docs._generated, clear=True), \
+                self.assertLogs('Fix_it_app.docs', 'WARNING'):
+            response = self.client.get(reverse('schema'), HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn(b'List all ratings', gzip.decompress(response.content))
+            response = self.client.get(reverse('schema'), HTTP_ACCEPT_ENCODING='gzip',
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        with override_settings(DEBUG=True):
+            response = self.client.get(reverse('schema'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'List all ratings', response.content)
+
+    def test_browsable_api_only_in_debug(self):
+        response = self.client.get(reverse('city-list'), HTTP_ACCEPT='text/html')
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+
+class CompressionTests(APITestCase):
+    def setUp(self):
+        City.objects.bulk_create(City(name=f'City number {i}') for i in range(200))
+        cache.clear()
+
+    def test_negotiation(self):
+        self.assertEqual(compression.choose_encoding('gzip, deflate'), 'gzip')
+        self.assertIsNone(compression.choose_encoding('gzip;q=0, identity'))
+        self.assertIsNone(compression.choose_encoding(''))
+        self.assertEqual(compression.choose_encoding('*'), compression.available_encodings()[0])
+        expected = 'br' if compression.brotli is not None else 'gzip'
+        self.assertEqual(compression.choose_encoding('gzip;q=0.8, br'), expected)
+
+    def test_large_json_is_gzipped(self):
+        plain = self.client.get(reverse('city-list'))
+        response = self.client.get(reverse('city-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+
+    def test_small_bodies_are_not_compressed(self):
+        City.objects.all().delete()
+        response = self.client.get(reverse('city-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_cacheable_views_reuse_compressed_bytes(self):
+        before = dict(metrics.CACHE.samples)
+        first = self.client.get(reverse('city-list'), HTTP_ACCEPT_ENCODING='gzip')
+        second = self.client.get(reverse('city-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first.content, second.content)
+        hits = metrics.CACHE.samples.get(('compression', 'hit'), 0) - before.get(('compression', 'hit'), 0)
+        self.assertEqual(hits, 1)
+
+    def test_streaming_chunks_are_flushed(self):
+        from django.http import StreamingHttpResponse
+        events = [f'data: {{"event": {i}, "padding": "{"x" * 600}"}}\n\n'.encode() for i in range(3)]
+        middleware = compression.CompressionMiddleware(
+            lambda request: StreamingHttpResponse(iter(events), content_type='text/event-stream'))
+        response = middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        decompressor = zlib.decompressobj(31)
+        chunks = iter(response.streaming_content)
+        for event in events:
+            # Each event can be decoded as soon as its chunk arrives.
+            self.assertEqual(decompressor.decompress(next(chunks)), event)
+        decompressor.decompress(b''.join(chunks))
+        self.assertTrue(decompressor.eof)
+
+
+class StaticFilesTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.TemporaryDirectory()
+        cls.settings_override = override_settings(STATIC_ROOT=cls.static_root.name)
+        cls.settings_override.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.static_root.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        from django.contrib.staticfiles.storage import staticfiles_storage
+        self.hashed = staticfiles_storage.stored_name('admin/css/base.css')
+        self.url = staticfiles_storage.url('admin/css/base.css')
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        self.assertRegex(self.hashed, r'^admin/css/base\.[0-9a-f]{12}\.css$')
+        self.assertEqual(self.url, '/static/' + self.hashed)
+        path = os.path.join(self.static_root.name, self.hashed)
+        with open(path, 'rb') as plain, open(path + '.gz', 'rb') as compressed:
+            self.assertEqual(gzip.decompress(compressed.read()), plain.read())
+
+    def test_hashed_files_are_immutable_and_precompressed(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        body = gzip.decompress(b''.join(response.streaming_content))
+        with open(os.path.join(self.static_root.name, self.hashed), 'rb') as f:
+            self.assertEqual(body, f.read())
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_unhashed_and_missing_files(self):
+        response = self.client.get('/static/admin/css/base.css')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.client.get('/static/admin/css/missing.css').status_code, 404)
+        self.assertEqual(self.client.get('/static/../Fix_it_app/settings.py').status_code, 404)
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000, PASSWORD_HASHING_THREADS=1, PASSWORD_HASHING_QUEUE=0)
+class PasswordHashingTests(APITestCase):
+    def setUp(self):
+        hashing.reset()
+        self.addCleanup(hashing.reset)
+        self.user = User.objects.create_user(email='hash@example.com', password='testpass123',
+                                             first_name='Hash', last_name='User', user_type=1)
+
+    def test_hashes_run_on_the_pool(self):
+        threads = []
+        original = hashing.PBKDF2PasswordHasher.encode
+
+        def encode(hasher, *args):
+            threads.append(threading.current_thread().name)
+            return original(hasher, *args)
+
+        with mock.patch.object(hashing.PBKDF2PasswordHasher, 'encode', encode):
+            self.assertTrue(check_password('testpass123', self.user.password))
+        self.assertTrue(threads[0].startswith('password-hash'))
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+    def test_rehash_on_login_when_cost_changes(self):
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            response = self.client.post(reverse('login'), {'email': 'hash@example.com',
+                                                           'password': 'testpass123'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+
+    def test_saturated_pool_returns_429(self):
+        pool = hashing.get_pool()
+        pool.slots.acquire()  # the single slot is busy
+        try:
+            response = self.client.post(reverse('login'), {'email': 'hash@example.com',
+                                                           'password': 'testpass123'})
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(response['Retry-After'], '1')
+            with self.assertRaises(hashing.HashingBusy):
+                self.user.set_password('another-pass')
+
+            # Views outside DRF get the same answer instead of a 500.
+            response = self.client.post(reverse('admin:login'), {'username': 'hash@example.com',
+                                                                 'password': 'testpass123'})
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(response['Retry-After'], '1')
+        finally:
+            pool.slots.release()
+
+    def test_inline_when_disabled(self):
+        with override_settings(PASSWORD_HASHING_THREADS=0):
+            self.assertIsNone(hashing.get_pool())
+            self.assertTrue(check_password('testpass123', self.user.password))
+
+
+@override_settings(THROTTLE_BUCKETS={
+    'login': {'ip': '5/min', 'email': '2/min', 'global': '100/s'},
+    'forgot_password': {'ip': '1/min'},
+    'user.create': {'ip': '1/min'},
+})
+class ThrottlingTests(APITestCase):
+    def setUp(self):
+        throttling.get_store().clear()
+        self.addCleanup(throttling.get_store().clear)
+
+    def login(self, email, ip='10.0.0.1'):
+        return self.client.post(reverse('login'), {'email': email, 'password': 'wrong'},
+                                REMOTE_ADDR=ip)
+
+    def test_token_bucket(self):
+        self.assertEqual(throttling.parse_rate('30/min'), (30, 0.5))
+        state = None
+        for _ in range(2):
+            allowed, wait, state = throttling.take(state, 2, 1.0, now=100.0)
+            self.assertTrue(allowed)
+        allowed, wait, state = throttling.take(state, 2, 1.0, now=100.0)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 1.0)
+        allowed, wait, state = throttling.take(state, 2, 1.0, now=101.0)  # refilled one token
+        self.assertTrue(allowed)
+
+    def test_login_is_limited_per_email_then_per_ip(self):
+        for _ in range(2):
+            self.assertEqual(self.login('victim@example.com').status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.login('victim@example.com', ip='10.0.0.2')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+
+        # 10.0.0.1 has used two of its five tokens; three more addresses and it is out.
+        for i in range(3):
+            self.assertEqual(self.login(f'other{i}@example.com').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.login('other3@example.com').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.login('other3@example.com', ip='10.0.0.3').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertGreaterEqual(metrics.THROTTLED.samples.get(('login', 'ip'), 0), 1)
+
+    def test_forwarded_for_does_not_reset_the_ip_bucket(self):
+        for i in range(5):
+            response = self.client.post(reverse('login'), {'email': f'user{i}@example.com', 'password': 'x'},
+                                        REMOTE_ADDR='10.0.0.9', HTTP_X_FORWARDED_FOR=f'203.0.113.{i}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('login'), {'email': 'user9@example.com', 'password': 'x'},
+                                    REMOTE_ADDR='10.0.0.9', HTTP_X_FORWARDED_FOR='203.0.113.99')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        # Behind one trusted proxy the last forwarded address is the client.
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            response = self.client.post(reverse('login'), {'email': 'user9@example.com', 'password': 'x'},
+                                        REMOTE_ADDR='10.0.0.9', HTTP_X_FORWARDED_FOR='203.0.113.99')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_registration_and_forgot_password(self):
+        payload = {'email': 'new@example.com', 'first_name': 'New', 'last_name': 'User',
+                   'user_type': 1, 'password': 'testpass123'}
+        self.assertEqual(self.client.post(reverse('user-list'), payload).status_code,
+                         status.HTTP_201_CREATED)
+        payload['email'] = 'new2@example.com'
+        self.assertEqual(self.client.post(reverse('user-list'), payload).status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        # Only the create action is throttled.
+        self.assertEqual(self.client.get(reverse('user-detail', args=[User.objects.get().pk])).status_code,
+                         status.HTTP_200_OK)
+
+        self.client.post(reverse('forgot_password'), {'email': 'missing@example.com'})
+        self.assertEqual(self.client.post(reverse('forgot_password'), {'email': 'missing@example.com'}).status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_tiered_store_shares_buckets_through_the_cache(self):
+        cache.clear()
+        first, second = throttling.TieredBucketStore(), throttling.TieredBucketStore()  # two workers
+        self.assertEqual(first.take('throttle:test', 1, 0.01)[0], True)
+        self.assertEqual(second.take('throttle:test', 1, 0.01)[0], False)
+
+    def test_can_be_disabled(self):
+        with override_settings(THROTTLE_ENABLED=False):
+            for _ in range(4):
+                self.assertEqual(self.login('victim@example.com').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RolePolicyTests(APITestCase):
+    def setUp(self):
+        def make(email, user_type):
+            return User.objects.create_user(email=email, password='testpass', first_name='Policy',
+                                            last_name='User', user_type=user_type)
+        self.customer = make('customer@example.com', 1)
+        self.other_customer = make('other@example.com', 1)
+        self.worker = make('worker@example.com', 2)
+        self.admin = make('admin@example.com', 3)
+        self.support = make('support@example.com', 4)
+        city = City.objects.create(name='Policy City')
+        address = Address.objects.create(address='1 Policy St', gps_position='0,0', city=city,
+                                         user=self.customer)
+        self.order = Order.objects.create(status=1, budget=100, address=address, customer=self.customer)
+        self.offer = Offer.objects.create(status=1, price=90, order=self.order, worker=self.worker)
+
+    def test_table(self):
+        self.assertEqual(policy.decide('order', 'update', policy.CUSTOMER), policy.Decision(True, own=True))
+        self.assertEqual(policy.decide('order', 'destroy', policy.ADMIN), policy.Decision(True))
+        denied = policy.decide('order', 'update_status', policy.WORKER)
+        self.assertFalse(denied.allowed)
+        self.assertEqual(denied.message, "You don't have permission to update this order")
+        self.assertIsNone(policy.decide('order', 'list', policy.WORKER))
+
+    def test_denied_roles_are_refused_before_any_lookup(self):
+        self.client.force_authenticate(user=self.worker)
+        url = reverse('order-detail', args=[self.order.pk])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(url, {'notes': 'x'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(len(queries), 0)
+
+        self.client.force_authenticate(user=self.support)
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data['detail'], "You don't have permission to delete this order")
+        self.assertTrue(Order.objects.filter(pk=self.order.pk).exists())
+
+    def test_ownership_is_part_of_the_query(self):
+        self.client.force_authenticate(user=self.other_customer)
+        response = self.client.post(reverse('order-update-status', args=[self.order.pk]), {'status': 4})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post(reverse('offer-accept', args=[self.offer.pk]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(reverse('order-update-status', args=[self.order.pk]), {'status': 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_offer_changes_belong_to_its_worker(self):
+        url = reverse('offer-detail', args=[self.offer.pk])
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.patch(url, {'status': 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data['detail'], 'Only the worker who made this offer can change it')
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        other_worker = User.objects.create_user(email='other.worker@example.com', password='testpass',
+                                                first_name='Policy', last_name='User', user_type=2)
+        self.client.force_authenticate(user=other_worker)
+        self.assertEqual(self.client.patch(url, {'price': 1}, format='json').status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(user=self.worker)
+        self.assertEqual(self.client.patch(url, {'price': 95}, format='json').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_customer_field_restrictions(self):
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.patch(reverse('order-detail', args=[self.order.pk]),
+                                     {'customer': self.other_customer.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Invalid fields: customer', response.data['detail'])
+
+    def test_restricted_user_types(self):
+        payload = {'email': 'new@example.com', 'first_name': 'New', 'last_name': 'User'}
+        # Form posts carry the type as a string.
+        response = self.client.post(reverse('user-list'), {**payload, 'user_type': '3'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data['detail'], 'Cannot create admin users')
+        response = self.client.post(reverse('user-list'), {**payload, 'user_type': 4}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(reverse('user-list'), {**payload, 'user_type': 4}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_decision_is_made_once_per_request(self):
+        request = RequestFactory().patch('/')
+        request.user = self.customer
+        view = type('View', (), {'policy_resource': 'order', 'action': 'update'})()
+        with mock.patch.object(policy, 'decide', wraps=policy.decide) as decide:
+            first = policy.decision_for(request, view)
+            policy.restrict(request, view, Order.objects.all())
+            self.assertIs(policy.decision_for(request, view), first)
+        self.assertEqual(decide.call_count, 1)
+
+
+class AnalyticsTests(APITestCase):
+    def setUp(self):
+        def make(email, user_type):
+            return User.objects.create_user(email=email, password='testpass', first_name='Stats',
+                                            last_name='User', user_type=user_type)
+        self.customer = make('customer@example.com', 1)
+        self.worker = make('worker@example.com', 2)
+        self.other_worker = make('other@example.com', 2)
+        self.admin = make('admin@example.com', 3)
+        self.north = City.objects.create(name='North')
+        self.south = City.objects.create(name='South')
+        north = Address.objects.create(address='1 North St', gps_position='0,0', city=self.north,
+                                       user=self.customer)
+        south = Address.objects.create(address='1 South St', gps_position='0,0', city=self.south,
+                                       user=self.customer)
+        self.done = Order.objects.create(status=3, budget=100, address=north, customer=self.customer)
+        Offer.objects.create(status=2, is_accept=True, price=80, order=self.done, worker=self.worker)
+        Offer.objects.create(status=3, price=120, order=self.done, worker=self.other_worker)
+        Rating.objects.create(order=self.done, user=self.customer, rate=4)
+        self.open = Order.objects.create(status=1, budget=200, address=south, customer=self.customer)
+        self.pending = Offer.objects.create(status=1, price=150, order=self.open, worker=self.other_worker)
+        Order.objects.filter(pk=self.done.pk).update(created_date=timezone.now() - timezone.timedelta(days=3))
+        self.client.force_authenticate(user=self.admin)
+
+    def refresh(self, *args):
+        out = StringIO()
+        call_command('rollup_analytics', *args, stdout=out)
+        return out.getvalue()
+
+    def report(self, name, **params):
+        response = self.client.get(reverse(f'analytics-{name}'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response.data['results']
+
+    def test_reports(self):
+        self.refresh()
+        by_city = {row['city']: row for row in self.report('orders', group_by='city')}
+        self.assertEqual(by_city[self.north.pk]['orders'], 1)
+        self.assertEqual(by_city[self.north.pk]['avg_budget'], 100)
+        self.assertEqual(by_city[self.north.pk]['accepted_orders'], 1)
+        self.assertEqual(by_city[self.north.pk]['avg_accepted_price'], 80)
+        self.assertEqual(by_city[self.south.pk]['accepted_orders'], 0)
+        self.assertIsNone(by_city[self.south.pk]['avg_accepted_price'])
+
+        by_worker = {row['worker']: row for row in self.report('offers', group_by='worker')}
+        self.assertEqual(by_worker[self.worker.pk]['acceptance_rate'], 1)
+        self.assertEqual(by_worker[self.other_worker.pk]['offers'], 2)
+        self.assertEqual(by_worker[self.other_worker.pk]['rejected'], 1)
+        self.assertEqual(by_worker[self.other_worker.pk]['acceptance_rate'], 0)
+
+        [total] = self.report('ratings', group_by='')
+        self.assertEqual(total['ratings'], 1)
+        self.assertEqual(total['distribution'][4], 1)
+        self.assertEqual(total['average'], 4)
+        [rated] = self.report('ratings', group_by='worker')
+        self.assertEqual(rated['worker'], self.worker.pk)
+
+        # Only the days in range count.
+        today = timezone.localdate().isoformat()
+        [row] = self.report('orders', group_by='', date_from=today, date_to=today)
+        self.assertEqual(row['orders'], 1)
+
+    def test_refresh_follows_changes(self):
+        self.refresh()
+        order_states.apply(self.open, 4, user=self.admin)
+        offer_states.apply(self.pending, 3, user=self.admin)
+        late = Order.objects.create(status=1, budget=50, address=self.open.address, customer=self.customer)
+        Order.objects.filter(pk=late.pk).update(created_date=timezone.now() - timezone.timedelta(days=10))
+
+        self.assertIn('Rebuilt', self.refresh('--recent-days', '0'))
+        statuses = {row['status']: row['orders'] for row in self.report('orders', group_by='status')}
+        self.assertEqual(statuses, {1: 1, 3: 1, 4: 1})
+        [offers] = self.report('offers', group_by='', status=3)
+        self.assertEqual(offers['offers'], 2)
+        cursor = RollupCursor.objects.get()
+        self.assertEqual(cursor.order_id, late.pk)
+        self.assertEqual(cursor.transition_id, StatusTransition.objects.latest('pk').pk)
+
+    def test_archiving_keeps_the_numbers(self):
+        Order.objects.filter(pk=self.done.pk).update(created_date=timezone.now() - timezone.timedelta(days=400))
+        self.refresh('--full')
+        before = self.report('offers', group_by='', date_from='2000-01-01')
+        call_command('archive_orders', days=365, stdout=StringIO())
+        self.assertTrue(ArchivedOrder.objects.filter(pk=self.done.pk).exists())
+        self.refresh('--full')
+        self.assertEqual(self.report('offers', group_by='', date_from='2000-01-01'), before)
+        [ratings] = self.report('ratings', group_by='', date_from='2000-01-01')
+        self.assertEqual(ratings['ratings'], 1)
+
+    def test_one_query_for_any_range(self):
+        self.refresh('--full')
+        for name in ('orders', 'offers', 'ratings'):
+            with CaptureQueriesContext(connection) as queries:
+                self.report(name, date_from='2000-01-01', group_by='day,city')
+            self.assertEqual(len(queries), 1, name)
+        self.assertTrue(DailyOrderRollup.objects.exists())
+
+    def test_admin_only_and_validation(self):
+        self.client.force_authenticate(user=self.worker)
+        self.assertEqual(self.client.get(reverse('analytics-orders')).status_code,
+                         status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('analytics-ratings'), {'group_by': 'status'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('analytics-orders'),
+                                   {'date_from': '2025-02-01', 'date_to': '2025-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(EXPORT_DIR=self.directory, EXPORT_SETTLE_SECONDS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.customer = User.objects.create_user(
+            email='private.customer@example.com', password='testpass', first_name='Secretname',
+            last_name='Customer', user_type=1, phone='+15550001111')
+        self.worker = User.objects.create_user(
+            email='worker@example.com', password='testpass', first_name='Test',
+            last_name='Worker', user_type=2)
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='testpass', first_name='Test',
+            last_name='Admin', user_type=3)
+        city = City.objects.create(name='Export City')
+        self.address = Address.objects.create(address='1 Export St', gps_position='0,0', city=city,
+                                              user=self.customer)
+        self.old = Order.objects.create(status=3, budget=100, address=self.address, customer=self.customer,
+                                        notes='Call me on +15550001111')
+        self.new = Order.objects.create(status=1, budget=200, address=self.address, customer=self.customer)
+        Order.objects.filter(pk=self.old.pk).update(created_date=timezone.now() - timezone.timedelta(days=5))
+        Offer.objects.create(status=1, price=90, order=self.new, worker=self.worker)
+        Complaint.objects.create(type=1, message='Secretname was rude', user=self.customer)
+
+    def run_export(self, **options):
+        out = StringIO()
+        call_command('export_data', stdout=out, **options)
+        return out.getvalue()
+
+    def read(self, table):
+        """Rows of every committed file of ``table``, keyed by partition date."""
+        partitions = {}
+        for file in export.list_files(table=table):
+            with gzip.open(os.path.join(self.directory, file['path']), 'rt') as f:
+                schema = json.loads(f.readline())['schema']
+                for line in f:
+                    batch = json.loads(line)
+                    self.assertEqual(list(batch), list(schema))
+                    rows = partitions.setdefault(file['date'], [])
+                    rows.extend(dict(zip(batch, values)) for values in zip(*batch.values()))
+        return partitions
+
+    @unittest.skipIf(find_spec('pyarrow'), 'writes Parquet when pyarrow is installed')
+    def test_partitioned_by_day_without_personal_data(self):
+        self.assertIn('order', self.run_export())
+        orders = self.read('order')
+        old_day = timezone.localdate() - timezone.timedelta(days=5)
+        self.assertEqual([row['id'] for row in orders[old_day.isoformat()]], [self.old.pk])
+        self.assertEqual([row['id'] for row in orders[timezone.localdate().isoformat()]], [self.new.pk])
+        self.assertEqual(orders[old_day.isoformat()][0]['city_id'], self.address.city_id)
+
+        users = [row for rows in self.read('user').values() for row in rows]
+        self.assertEqual({row['id'] for row in users}, {self.customer.pk, self.worker.pk, self.admin.pk})
+        self.assertNotIn('email', users[0])
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.gz'):
+                    with gzip.open(os.path.join(root, name), 'rt') as f:
+                        content = f.read()
+                    for secret in ('private.customer', 'Secretname', '5550001111'):
+                        self.assertNotIn(secret, content)
+
+    @unittest.skipIf(find_spec('pyarrow'), 'writes Parquet when pyarrow is installed')
+    def test_incremental_runs_append_new_rows(self):
+        self.run_export()
+        first = {f['path'] for f in export.list_files()}
+        newer = Order.objects.create(status=1, budget=300, address=self.address, customer=self.customer)
+        order_states.apply(self.new, 4, user=self.customer)
+
+        self.run_export()
+        added = [f for f in export.list_files() if f['path'] not in first]
+        self.assertEqual({f['table'] for f in added}, {'order', 'status_transition'})
+        ids = sorted(row['id'] for rows in self.read('order').values() for row in rows)
+        self.assertEqual(ids, [self.old.pk, self.new.pk, newer.pk])
+        [transition] = [row for rows in self.read('status_transition').values() for row in rows]
+        self.assertEqual((transition['object_id'], transition['to_status']), (self.new.pk, 4))
+        self.assertEqual(export.load_state(self.directory)['tables']['order']['last_id'], newer.pk)
+
+    def test_capped_runs_commit_progress(self):
+        newer = Order.objects.create(status=1, budget=300, address=self.address, customer=self.customer)
+        summary = export.export(tables=['order'], max_rows=1)
+        self.assertEqual(summary['order'], {'rows': 1, 'files': 1, 'last_id': self.old.pk, 'complete': False})
+        summary = export.export(tables=['order'], max_rows=1)
+        self.assertEqual((summary['order']['last_id'], summary['order']['complete']), (self.new.pk, False))
+        summary = export.export(tables=['order'], max_rows=1)
+        self.assertEqual((summary['order']['last_id'], summary['order']['complete']), (newer.pk, True))
+        self.assertEqual(export.export(tables=['order'], max_rows=1)['order']['rows'], 0)
+
+        self.client.force_authenticate(user=self.admin)
+        with override_settings(EXPORT_REQUEST_MAX_ROWS=1):
+            response = self.client.post(reverse('export-list'), {'tables': ['offer', 'user']}, format='json')
+        self.assertEqual(response.data['user']['rows'], 1)
+        self.assertFalse(response.data['user']['complete'])
+        self.assertTrue(response.data['offer']['complete'])
+
+    def test_young_rows_wait_without_leaving_gaps(self):
+        self.run_export()
+        first = Order.objects.create(status=1, budget=300, address=self.address, customer=self.customer)
+        second = Order.objects.create(status=1, budget=400, address=self.address, customer=self.customer)
+        Order.objects.filter(pk=second.pk).update(created_date=timezone.now() - timezone.timedelta(days=1))
+        with override_settings(EXPORT_SETTLE_SECONDS=60):
+            summary = export.export(tables=['order'])
+        # The older-looking second order comes after a young one, so it waits too.
+        self.assertEqual(summary['order']['rows'], 0)
+        self.assertEqual(summary['order']['last_id'], self.new.pk)
+        summary = export.export(tables=['order'])
+        self.assertEqual((summary['order']['rows'], summary['order']['last_id']), (2, second.pk))
+        self.assertGreater(second.pk, first.pk)
+
+    def test_interrupted_run_is_redone(self):
+        state = export.load_state(self.directory)
+        state['pending'] = 'crashed'
+        export.save_state(self.directory, state)
+        partition = os.path.join(self.directory, 'order', 'date=2020-01-01')
+        os.makedirs(partition)
+        for name in ('part-crashed-0.jsonl.gz', '_part-other-0.jsonl.gz'):
+            open(os.path.join(partition, name), 'wb').close()
+        self.run_export()
+        self.assertEqual(os.listdir(partition), [])
+        self.assertIsNone(export.load_state(self.directory)['pending'])
+
+    def test_endpoint(self):
+        url = reverse('export-list')
+        self.client.force_authenticate(user=self.worker)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(url, {'tables': ['order', 'offer']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data), ['order', 'offer'])
+        self.assertEqual(response.data['order']['rows'], 2)
+        response = self.client.post(url, {'tables': ['address']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(url, {'table': 'order'})
+        self.assertEqual(response.data['tables']['order']['last_id'], self.new.pk)
+        file = response.data['files'][0]
+        download = self.client.get(file['url'])
+        self.assertEqual(download.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(b''.join(download.streaming_content)), file['size'])
+        download.close()
+        traversal = reverse('export-download', kwargs={'path': '../' * 3 + 'etc/passwd'})
+        self.assertEqual(self.client.get(traversal).status_code, status.HTTP_404_NOT_FOUND)
+        state = reverse('export-download', kwargs={'path': export.STATE_FILE})
+        self.assertEqual(self.client.get(state).status_code, status.HTTP_404_NOT_FOUND)
+
+        with open(os.path.join(self.directory, export.LOCK_FILE), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            response = self.client.post(url, {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    @unittest.skipUnless(find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_parquet(self):
+        import pyarrow.dataset
+        self.run_export()
+        dataset = pyarrow.dataset.dataset(os.path.join(self.directory, 'order'), partitioning='hive')
+        self.assertEqual(sorted(dataset.to_table().column('id').to_pylist()), [self.old.pk, self.new.pk])
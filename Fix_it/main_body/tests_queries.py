@@ -0,0 +1,116 @@
+from .models import User, City, Address, Order, Offer, Complaint, Rating
+from .testing import QueryBudgetTestCase
+
+
+class EndpointQueryBudgetTests(QueryBudgetTestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass',
+            first_name='Customer',
+            last_name='User',
+            user_type=1
+        )
+        self.worker = User.objects.create_user(
+            email='worker@example.com',
+            password='testpass',
+            first_name='Worker',
+            last_name='User',
+            user_type=2
+        )
+        self.admin = User.objects.create_user(
+            email='admin@example.com',
+            password='adminpass',
+            first_name='Admin',
+            last_name='User',
+            user_type=3
+        )
+        self.city = City.objects.create(name='Test City')
+        self.address = Address.objects.create(
+            address='123 Test St',
+            gps_position='0,0',
+            city=self.city,
+            user=self.customer
+        )
+        self.rows = 0
+
+    def grow(self, n):
+        """Bring every table the endpoints read up to ``n`` rows for our users."""
+        missing = n - self.rows
+        if missing <= 0:
+            return
+        City.objects.bulk_create([City(name=f'City {i}') for i in range(missing)])
+        Address.objects.bulk_create([
+            Address(address=f'{i} Test St', gps_position='0,0', city=self.city, user=self.customer)
+            for i in range(missing)
+        ])
+        User.objects.bulk_create([
+            User(email=f'bulk{self.rows + i}@example.com', first_name='Bulk', last_name='User',
+                 user_type=2)
+            for i in range(missing)
+        ])
+        orders = Order.objects.bulk_create([
+            Order(status=3, budget=100 + i, address=self.address, customer=self.customer)
+            for i in range(missing)
+        ])
+        Offer.objects.bulk_create([
+            Offer(status=2, price=90, order=order, worker=self.worker) for order in orders
+        ])
+        Rating.objects.bulk_create([
+            Rating(rate=5, order=order, user=self.customer) for order in orders
+        ])
+        Complaint.objects.bulk_create([
+            Complaint(type=1, message='Late', user=self.customer) for _ in range(missing)
+        ])
+        self.rows = n
+
+    def test_user_list(self):
+        self.assertQueryBudget('user', 'list', self.admin)
+
+    def test_user_retrieve(self):
+        self.assertQueryBudget('user', 'retrieve', self.admin, args=[self.customer.pk])
+
+    def test_city_list(self):
+        self.assertQueryBudget('city', 'list', self.customer)
+
+    def test_address_list(self):
+        self.assertQueryBudget('address', 'list', self.customer)
+
+    def test_order_list_customer(self):
+        self.assertQueryBudget('order', 'list', self.customer)
+
+    def test_order_list_customer_filtered(self):
+        self.assertQueryBudget('order', 'list', self.customer, query='?status=3&search=Test&ordering=-budget')
+
+    def test_order_list_worker(self):
+        self.assertQueryBudget('order', 'list', self.worker)
+
+    def test_order_list_admin(self):
+        self.assertQueryBudget('order', 'list', self.admin)
+
+    def test_order_retrieve(self):
+        self.grow(1)
+        order = Order.objects.filter(customer=self.customer).first()
+        self.assertQueryBudget('order', 'retrieve', self.customer, args=[order.pk])
+
+    def test_offer_list_worker(self):
+        self.assertQueryBudget('offer', 'list', self.worker)
+
+    def test_offer_list_customer(self):
+        self.assertQueryBudget('offer', 'list', self.customer)
+
+    def test_offer_retrieve(self):
+        self.grow(1)
+        offer = Offer.objects.filter(worker=self.worker).first()
+        self.assertQueryBudget('offer', 'retrieve', self.worker, args=[offer.pk])
+
+    def test_complaint_list(self):
+        self.assertQueryBudget('complaint', 'list', self.customer)
+
+    def test_rating_list(self):
+        self.assertQueryBudget('rating', 'list', self.customer)
+
+    def test_rating_retrieve(self):
+        self.grow(1)
+        rating = Rating.objects.filter(user=self.customer).first()
+        self.assertQueryBudget('rating', 'retrieve', self.customer, args=[rating.pk])
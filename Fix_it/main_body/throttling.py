@@ -0,0 +1,187 @@
+"""Token-bucket throttling for the unauthenticated endpoints.
+
+Each throttled scope has up to three buckets, checked in order:
+
+- ``ip``: one per client address (``get_ident``, honouring ``NUM_PROXIES``)
+- ``email``: one per email address in the request body, hashed in the key
+- ``global``: one for the whole scope, a last line of defence against
+  attacks spread over many addresses
+
+A rate is written as in DRF, ``'30/min'``. The bucket holds that many
+tokens and refills at that rate, so a client may burst up to the full
+count and then gets a steady trickle. Scopes and rates live in
+``THROTTLE_BUCKETS``. A viewset scope can be narrowed to a single action
+with ``'<scope>.<action>'``, e.g. ``'user.create'``, and a scope without an
+entry isn't throttled.
+
+Buckets live in ``THROTTLE_STORE``:
+
+- ``LocalBucketStore`` (default) is a bounded dict per process. It's the
+  fastest store, but each worker counts separately.
+- ``CacheBucketStore`` keeps buckets in the Django cache, shared by every
+  worker when the cache backend is.
+- ``TieredBucketStore`` checks the local bucket first, so floods are turned
+  away without a cache round trip, and then the shared one.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import record_throttle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+BUCKET_KINDS = ('ip', 'email', 'global')
+
+
+def parse_rate(rate):
+    """``'30/min'`` -> ``(30, 0.5)``: capacity and tokens per second."""
+    count, period = rate.split('/')
+    count = int(count)
+    return count, count / PERIODS[period[0]]
+
+
+def refill(state, capacity, per_second, now):
+    tokens, updated = state if state is not None else (capacity, now)
+    return min(capacity, tokens + (now - updated) * per_second)
+
+
+def take(state, capacity, per_second, now):
+    """Apply one request to a bucket; returns ``(allowed, wait, new state)``."""
+    tokens = refill(state, capacity, per_second, now)
+    if tokens >= 1:
+        return True, 0.0, (tokens - 1, now)
+    return False, (1 - tokens) / per_second, (tokens, now)
+
+
+class LocalBucketStore:
+    def __init__(self, max_keys=None):
+        self.max_keys = max_keys or getattr(settings, 'THROTTLE_LOCAL_MAX_KEYS', 100_000)
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, per_second):
+        with self.lock:
+            allowed, wait, self.buckets[key] = take(self.buckets.get(key), capacity, per_second,
+                                                    time.monotonic())
+            self.buckets.move_to_end(key)
+            # Forgetting the oldest bucket only ever refills it early.
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return allowed, wait
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class CacheBucketStore:
+    """Buckets in the Django cache. Read-modify-write, so concurrent workers may
+    each let through a request that should have been the last one; close
+    enough for throttling."""
+
+    def take(self, key, capacity, per_second):
+        now = time.time()
+        allowed, wait, state = take(cache.get(key), capacity, per_second, now)
+        # Once it would be full again the bucket is the same as a missing one.
+        cache.set(key, state, int((capacity - state[0]) / per_second) + 1)
+        return allowed, wait
+
+    def clear(self):
+        pass  # entries expire on their own
+
+
+class TieredBucketStore:
+    def __init__(self):
+        self.local = LocalBucketStore()
+        self.shared = CacheBucketStore()
+
+    def take(self, key, capacity, per_second):
+        allowed, wait = self.local.take(key, capacity, per_second)
+        if not allowed:
+            return allowed, wait
+        return self.shared.take(key, capacity, per_second)
+
+    def clear(self):
+        self.local.clear()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    path = getattr(settings, 'THROTTLE_STORE', 'main_body.throttling.LocalBucketStore')
+    if _store is None or _store[0] != path:
+        with _store_lock:
+            if _store is None or _store[0] != path:
+                _store = (path, import_string(path)())
+    return _store[1]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle a view with the buckets configured for its scope.
+
+    The scope is the class's ``scope`` or the view's ``throttle_scope``.
+    """
+    scope = None
+
+    def get_scope(self, view):
+        return self.scope or getattr(view, 'throttle_scope', None)
+
+    def get_rates(self, view):
+        scope = self.get_scope(view)
+        buckets = getattr(settings, 'THROTTLE_BUCKETS', {})
+        action = getattr(view, 'action', None)
+        if action and f'{scope}.{action}' in buckets:
+            return f'{scope}.{action}', buckets[f'{scope}.{action}']
+        return scope, buckets.get(scope)
+
+    def get_key(self, kind, request):
+        if kind == 'ip':
+            return self.get_ident(request)
+        if kind == 'email':
+            email = request.data.get('email') if hasattr(request.data, 'get') else None
+            if not email or not isinstance(email, str):
+                return None
+            return hashlib.sha256(email.strip().lower().encode()).hexdigest()[:32]
+        return 'all'
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        if not getattr(settings, 'THROTTLE_ENABLED', True):
+            return True
+        scope, rates = self.get_rates(view)
+        if not rates:
+            return True
+        store = get_store()
+        for kind in BUCKET_KINDS:
+            if kind not in rates:
+                continue
+            key = self.get_key(kind, request)
+            if key is None:
+                continue
+            capacity, per_second = parse_rate(rates[kind])
+            allowed, wait = store.take(f'throttle:{scope}:{kind}:{key}', capacity, per_second)
+            if not allowed:
+                self.wait_seconds = wait
+                record_throttle(scope, kind)
+                return False
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginThrottle(TokenBucketThrottle):
+    scope = 'login'
+
+
+class ForgotPasswordThrottle(TokenBucketThrottle):
+    scope = 'forgot_password'
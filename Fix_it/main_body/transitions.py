@@ -0,0 +1,106 @@
+from django.db import transaction
+from django.db.models import F
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from .models import Order, Offer, StatusTransition
+
+
+class InvalidTransition(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = 'Invalid status transition.'
+    default_code = 'invalid_transition'
+
+
+class TransitionConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The status was changed by another request. Reload and try again.'
+    default_code = 'transition_conflict'
+
+
+class StateMachine:
+    """Allowed status moves for one model.
+
+    Every transition is applied as a single conditional
+    ``UPDATE ... WHERE id = ? AND status = ?`` that touches only the status
+    columns and the version counter, so two requests racing on the same row
+    cannot both win and no other column is rewritten.
+    """
+
+    def __init__(self, model, kind, transitions):
+        self.model = model
+        self.kind = kind
+        self.transitions = transitions
+        self.labels = dict(model.STATUS_CHOICES)
+
+    def coerce(self, value):
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise InvalidTransition(f"Invalid status: {value}")
+        if value not in self.labels:
+            raise InvalidTransition(f"Invalid status: {value}")
+        return value
+
+    def check(self, current, new):
+        new = self.coerce(new)
+        if new != current and new not in self.transitions.get(current, ()):
+            raise InvalidTransition(
+                f"Cannot transition directly from {self.labels[current]} to {self.labels[new]}")
+        return new
+
+    def apply(self, obj, new_status, user=None, **fields):
+        """Move ``obj`` to ``new_status`` or raise; ``fields`` are written in the same UPDATE."""
+        new_status = self.check(obj.status, new_status)
+        if new_status == obj.status and not fields:
+            return obj
+        with transaction.atomic():
+            updated = self.model.objects.filter(pk=obj.pk, status=obj.status).update(
+                status=new_status, version=F('version') + 1, **fields)
+            if not updated:
+                raise TransitionConflict()
+            if new_status != obj.status:
+                StatusTransition.objects.create(
+                    kind=self.kind, object_id=obj.pk, from_status=obj.status,
+                    to_status=new_status, user=user if user and user.is_authenticated else None)
+        obj.status = new_status
+        obj.version += 1
+        for name, value in fields.items():
+            setattr(obj, name, value)
+        return obj
+
+    def apply_bulk(self, queryset, new_status, user=None, **fields):
+        """Move every row of ``queryset`` that may legally reach ``new_status``.
+
+        Rows already in ``new_status`` or in a state that cannot reach it are
+        left alone. Returns the number of rows moved.
+        """
+        new_status = self.coerce(new_status)
+        sources = [s for s, targets in self.transitions.items() if new_status in targets]
+        with transaction.atomic():
+            rows = list(queryset.filter(status__in=sources).values_list('pk', 'status'))
+            if not rows:
+                return 0
+            updated = self.model.objects.filter(
+                pk__in=[pk for pk, _ in rows], status__in=sources
+            ).update(status=new_status, version=F('version') + 1, **fields)
+            actor = user if user and user.is_authenticated else None
+            StatusTransition.objects.bulk_create([
+                StatusTransition(kind=self.kind, object_id=pk, from_status=current,
+                                 to_status=new_status, user=actor)
+                for pk, current in rows
+            ])
+        return updated
+
+
+order_states = StateMachine(Order, 1, {
+    1: {2, 4},     # Pending -> In Progress / Cancelled
+    2: {1, 3, 4},  # In Progress -> Pending / Completed / Cancelled
+    3: set(),      # Completed is final
+    4: set(),      # Cancelled is final
+})
+
+offer_states = StateMachine(Offer, 2, {
+    1: {2, 3},     # Pending -> Accepted / Rejected
+    2: set(),
+    3: set(),
+})
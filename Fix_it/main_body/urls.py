@@ -3,6 +3,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
 from .auth_views import user_login, user_logout, forgot_password, reset_password
+from .debug_views import profile_report
 router = DefaultRouter()
 router.register(r'users', views.UserViewSet, basename='user')
 router.register(r'cities', views.CityViewSet, basename='city')
@@ -11,6 +12,8 @@ router.register(r'orders', views.OrderViewSet, basename='order')
 router.register(r'offers', views.OfferViewSet, basename='offer')
 router.register(r'complaints', views.ComplaintViewSet, basename='complaint')
 router.register(r'ratings', views.RatingViewSet, basename='rating')
+router.register(r'analytics', views.AnalyticsViewSet, basename='analytics')
+router.register(r'exports', views.ExportViewSet, basename='export')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -19,4 +22,5 @@ urlpatterns = [
     path('logout/', user_logout, name='logout'),
     path('forgot-password/', forgot_password, name='forgot_password'),
     path('reset-password/<uidb64>/<token>/', reset_password, name='reset_password'),
+    path('_debug/profile/', profile_report, name='debug_profile'),
 ]
\ No newline at end of file
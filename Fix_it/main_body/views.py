@@ -1,23 +1,37 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied
-from .models import User, City, Address, Order, Offer, Complaint, Rating
+from .models import User, City, Address, Order, Offer, Complaint, Rating, ArchivedOrder
 from .serializers import (
     UserSerializer, CitySerializer, AddressSerializer,
     OrderSerializer, OfferSerializer, ComplaintSerializer,
-    RatingSerializer
+    RatingSerializer, ArchivedOrderSerializer, AnalyticsQuerySerializer, ExportRequestSerializer
 )
+import os
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404
+from django.utils._os import safe_join
+from django.db import transaction
 from rest_framework import serializers
-from django.utils import timezone
 from rest_framework.decorators import action
-from .filters import UserFilter, OrderFilter, OfferFilter
+from rest_framework.reverse import reverse
+from .filters import UserFilter, OrderFilter, OfferFilter, ArchivedOrderFilter
+from .transitions import order_states, offer_states, InvalidTransition
+from .mixins import VersionedUpdateMixin
+from .idempotency import IdempotentCreateMixin
+from .profiling import ProfiledSerializerMixin
+from .throttling import TokenBucketThrottle
+from .permissions import RolePolicy, IsAdmin
+from . import analytics, export, policy
 from rest_framework import filters as drf_filters
 from django_filters.rest_framework import DjangoFilterBackend
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_view, extend_schema
 
 
-class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.filter()
+class UserViewSet(ProfiledSerializerMixin, viewsets.ModelViewSet):
+    queryset = User.objects.all()
     serializer_class = UserSerializer
     pagination_class = None
     filter_backends = [
@@ -26,6 +40,10 @@ class UserViewSet(viewsets.ModelViewSet):
         drf_filters.OrderingFilter
     ]
     filterset_class = UserFilter
+    # Registration (create) is open to anyone; see THROTTLE_BUCKETS['user.create'].
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'user'
+    policy_resource = 'user'
     search_fields = [
         'email',
         'first_name',
@@ -43,10 +61,11 @@ class UserViewSet(viewsets.ModelViewSet):
     ]
     ordering = ['-date_joined']
     def get_queryset(self):
-        queryset = User.objects.all().order_by('id')
-        if not self.request.query_params.get('is_deleted', False):
-            queryset = queryset.filter(is_deleted=False)
-        return queryset
+        # The default manager already hides soft-deleted users; only reach
+        # for all_objects when the client filters on is_deleted explicitly.
+        if 'is_deleted' in self.request.query_params:
+            return User.all_objects.order_by('id')
+        return User.objects.order_by('id')
     def get_permissions(self):
         if self.action in ['create', 'retrieve']:
             permission_classes = [permissions.AllowAny]
@@ -54,39 +73,19 @@ class UserViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]
         else:
             permission_classes = [permissions.IsAuthenticated]
-        return [permission() for permission in permission_classes]
+        return [permission() for permission in permission_classes] + [RolePolicy()]
 
     def perform_destroy(self, instance):
         """Soft delete user"""
-        instance.is_deleted = True
-        instance.deleted_at = timezone.now()
-        instance.save()
-
-    def create(self, request, *args, **kwargs):
-        # Prevent creating admin users
-        if request.data.get('user_type') == 3:  # Admin
-            return Response(
-                {"detail": "Cannot create admin users"},
-                status=status.HTTP_403_FORBIDDEN
-            )
-
-        # Only admin can create Technical Support
-        if request.data.get('user_type') == 4:  # Technical Support
-            if not request.user.is_authenticated or request.user.user_type != 3:
-                return Response(
-                    {"detail": "Only admins can create Technical Support users"},
-                    status=status.HTTP_403_FORBIDDEN
-                )
-
-        return super().create(request, *args, **kwargs)
+        instance.delete()
 
-class CityViewSet(viewsets.ModelViewSet):
+class CityViewSet(ProfiledSerializerMixin, viewsets.ModelViewSet):
     queryset = City.objects.all().order_by('id')  # Add ordering
     serializer_class = CitySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     pagination_class = None  # Add this
     
-class AddressViewSet(viewsets.ModelViewSet):
+class AddressViewSet(ProfiledSerializerMixin, viewsets.ModelViewSet):
     serializer_class = AddressSerializer
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = None  # Add this to prevent pagination in tests
@@ -97,7 +96,7 @@ class AddressViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ProfiledSerializerMixin, IdempotentCreateMixin, VersionedUpdateMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     pagination_class = None
     filter_backends = [
@@ -121,6 +120,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         'status'
     ]
     ordering = ['-created_date']
+    policy_resource = 'order'
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -129,82 +129,90 @@ class OrderViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]
         else:
             permission_classes = [permissions.IsAuthenticated]
-        return [permission() for permission in permission_classes]
+        return [permission() for permission in permission_classes] + [RolePolicy()]
 
     def get_queryset(self):
         user = self.request.user
         status_filter = self.request.query_params.get('status', None)
 
-        queryset = Order.objects.all().order_by('id')
+        queryset = policy.restrict(self.request, self, Order.objects.visible_to(user).order_by('id'))
 
         if status_filter:
             queryset = queryset.filter(status=status_filter)
-
-        if not user.is_authenticated:
-            return queryset.none()
-
-        if user.user_type == 1:  # Customer
-            return queryset.filter(customer=user)
-        elif user.user_type == 2:  # Worker
-            return queryset.filter(offer__worker=user).distinct()
         return queryset
-    
-    def create(self, request, *args, **kwargs):
-        if not request.user.is_authenticated:
-            return Response(status=status.HTTP_401_UNAUTHORIZED)
-        if request.user.user_type != 1:
-            return Response(
-                {"detail": "Only customers can create orders"},
-                status=status.HTTP_403_FORBIDDEN
-            )
-        return super().create(request, *args, **kwargs)
 
     def perform_create(self, serializer):
         serializer.save(customer=self.request.user)
 
+    def include_archived(self):
+        return self.request.query_params.get('include_archived') in ('1', 'true', 'True')
+
+    def get_archived_queryset(self):
+        """Archived orders visible to the user, run through the same filters, search and ordering."""
+        request = self.request
+        queryset = ArchivedOrder.objects.visible_to(request.user).order_by('id')
+        status_filter = request.query_params.get('status', None)
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        queryset = ArchivedOrderFilter(request.query_params, queryset=queryset, request=request).qs
+        for backend in (drf_filters.SearchFilter, drf_filters.OrderingFilter):
+            queryset = backend().filter_queryset(request, queryset, self)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if not self.include_archived() or response.status_code != status.HTTP_200_OK:
+            return response
+        # The archive is a separate table, so the two result sets are merged
+        # here rather than in SQL; re-sort the combined list by the first
+        # requested ordering key so archived rows don't just trail the hot ones.
+        archived = ArchivedOrderSerializer(self.get_archived_queryset(), many=True).data
+        results = list(response.data) + list(archived)
+        ordering = drf_filters.OrderingFilter().get_ordering(request, self.get_queryset(), self)
+        if ordering:
+            key = ordering[0].lstrip('-')
+            if all(key in row for row in results):
+                results.sort(key=lambda row: (row[key] is None, row[key]),
+                             reverse=ordering[0].startswith('-'))
+        response.data = results
+        return response
+
     def retrieve(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return Response(status=status.HTTP_401_UNAUTHORIZED)
         try:
             return super().retrieve(request, *args, **kwargs)
         except Exception:
+            if self.include_archived() and str(kwargs.get('pk')).isdigit():
+                archived = ArchivedOrder.objects.visible_to(request.user).filter(
+                    pk=kwargs.get('pk')).first()
+                if archived is not None:
+                    return Response(ArchivedOrderSerializer(archived).data)
             return Response(status=status.HTTP_404_NOT_FOUND)
 
     def update(self, request, *args, **kwargs):
-        order = self.get_object()
-        user = request.user
-
-        # Only customer who owns the order or admin can update
-        if user.user_type not in [1, 3] or (user.user_type == 1 and order.customer != user):
+        # Who may update which order is decided by RolePolicy and the queryset.
+        invalid_fields = policy.disallowed_fields(request, self)
+        if invalid_fields:
+            allowed_fields = policy.EDITABLE_FIELDS[('order', request.user.user_type)]
             return Response(
-                {"detail": "You don't have permission to update this order"},
-                status=status.HTTP_403_FORBIDDEN
+                {"detail": f"Customers can only update {', '.join(sorted(allowed_fields))}. "
+                           f"Invalid fields: {', '.join(sorted(invalid_fields))}"},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-        # For customers, only allow updating certain fields
-        if user.user_type == 1:
-            allowed_fields = {'status', 'notes',
-                              'photo', 'short_video', 'budget'}
-            provided_fields = set(request.data.keys())
-            invalid_fields = provided_fields - allowed_fields
-            if invalid_fields:
-                return Response(
-                    {"detail": f"Customers can only update {', '.join(allowed_fields)}. Invalid fields: {', '.join(invalid_fields)}"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        # Status transition validation
-        current_status = order.status
-        new_status = request.data.get('status')
-        if new_status is not None and isinstance(new_status, int):
-            if current_status == 1 and new_status == 3:  # Pending -> Completed
-                return Response(
-                    {"detail": "Cannot transition directly from Pending to Completed"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
         return super().update(request, *args, **kwargs)
 
+    def perform_update(self, serializer):
+        # Status moves go through the state machine; the rest of the fields
+        # are saved in the same transaction once the transition has won.
+        new_status = serializer.validated_data.pop('status', None)
+        with transaction.atomic():
+            self.claim_version(serializer.instance)
+            if new_status is not None:
+                order_states.apply(serializer.instance, new_status, user=self.request.user)
+            self.save_sent_fields(serializer)
+
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
         order = self.get_object()
@@ -216,36 +224,17 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Validate status transition
-        if order.status == 1 and new_status == 3:
-            return Response(
-                {"detail": "Cannot transition directly from Pending to Completed"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        # Check permissions
-        user = request.user
-        if user.user_type not in [1, 3] or (user.user_type == 1 and order.customer != user):
-            return Response(
-                {"detail": "You don't have permission to update this order"},
-                status=status.HTTP_403_FORBIDDEN
-            )
-
-        order.status = new_status
-        order.save()
+        order_states.apply(order, new_status, user=request.user)
 
         return Response({'detail': 'Order status updated successfully'})
 
     def perform_destroy(self, instance):
-        user = self.request.user
-        if user.user_type not in [1, 3] or (user.user_type == 1 and instance.customer != user):
-            raise PermissionDenied(
-                "You don't have permission to delete this order")
         instance.delete()
 
-class OfferViewSet(viewsets.ModelViewSet):
+class OfferViewSet(ProfiledSerializerMixin, IdempotentCreateMixin, VersionedUpdateMixin, viewsets.ModelViewSet):
     serializer_class = OfferSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [permissions.IsAuthenticated, RolePolicy]
+    policy_resource = 'offer'
     pagination_class = None 
     filter_backends = [
         DjangoFilterBackend,
@@ -270,21 +259,45 @@ class OfferViewSet(viewsets.ModelViewSet):
     ordering = ['-last_time_date']
 
     def get_queryset(self):
-        user = self.request.user
-        if user.user_type == 2:  # Worker
-            return Offer.objects.filter(worker=user).order_by('id')
-        # Customers can see offers for their orders
-        return Offer.objects.filter(order__customer=user).order_by('id')
-
-    def create(self, request, *args, **kwargs):
-        if request.user.user_type != 2:
-            return Response(
-                {"detail": "Only workers can create offers"},
-                status=status.HTTP_403_FORBIDDEN
-            )
-        return super().create(request, *args, **kwargs)
+        return policy.restrict(self.request, self, Offer.objects.visible_to(self.request.user).order_by('id'))
+
+    def perform_update(self, serializer):
+        new_status = serializer.validated_data.pop('status', None)
+        if new_status == 2:
+            # Accepting also moves the order and rejects the other offers.
+            raise InvalidTransition('Offers can only be accepted through the accept action')
+        with transaction.atomic():
+            self.claim_version(serializer.instance)
+            if new_status is not None:
+                offer_states.apply(serializer.instance, new_status, user=self.request.user)
+            self.save_sent_fields(serializer)
 
-class ComplaintViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['post'])
+    def accept(self, request, pk=None):
+        # Only the order's customer gets this far (RolePolicy), and only for their own offers.
+        offer = self.get_object()
+
+        with transaction.atomic():
+            # Lock the order row so competing accepts on the same order queue up
+            # behind this one and then see it already In Progress.
+            order = Order.objects.select_for_update().get(pk=offer.order_id)
+            if order.status != 1 or offer.status != 1:
+                return Response(
+                    {"detail": "Only pending offers on pending orders can be accepted"},
+                    status=status.HTTP_409_CONFLICT
+                )
+            # Both transitions are conditional UPDATEs, which keeps this
+            # correct on backends where select_for_update is a no-op (SQLite).
+            order_states.apply(order, 2, user=request.user)
+            offer_states.apply(offer, 2, user=request.user, is_accept=True)
+            offer_states.apply_bulk(
+                Offer.objects.filter(order=order).exclude(pk=offer.pk), 3,
+                user=request.user, is_accept=False)
+
+        offer.refresh_from_db()
+        return Response(self.get_serializer(offer).data)
+
+class ComplaintViewSet(ProfiledSerializerMixin, viewsets.ModelViewSet):
     serializer_class = ComplaintSerializer
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = None  # Add this
@@ -298,8 +311,6 @@ class ComplaintViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-from drf_spectacular.utils import extend_schema_view, extend_schema
-
 @extend_schema_view(
     list=extend_schema(description="List all ratings"),
     create=extend_schema(description="Create a new rating"),
@@ -308,8 +319,7 @@ from drf_spectacular.utils import extend_schema_view, extend_schema
     partial_update=extend_schema(description="Partially update a rating"),
     destroy=extend_schema(description="Delete a rating"),
 )
- 
-class RatingViewSet(viewsets.ModelViewSet):
+class RatingViewSet(ProfiledSerializerMixin, viewsets.ModelViewSet):
     serializer_class = RatingSerializer
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = None  # Add this
@@ -317,12 +327,95 @@ class RatingViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Rating.objects.none()
-        user = self.request.user
-        return (Rating.objects.filter(order__customer=user) | 
-                Rating.objects.filter(user=user)).order_by('id').distinct()
+        return Rating.objects.visible_to(self.request.user).order_by('id')
     def perform_create(self, serializer):
         order = serializer.validated_data['order']
         if order.status != 3:  # Only completed orders can be rated
             raise serializers.ValidationError(
                 "Only completed orders can be rated")
         serializer.save(user=self.request.user)
+
+
+_report_schema = extend_schema(parameters=[AnalyticsQuerySerializer], responses=OpenApiTypes.OBJECT)
+
+
+@extend_schema_view(orders=_report_schema, offers=_report_schema, ratings=_report_schema)
+class AnalyticsViewSet(viewsets.ViewSet):
+    """Admin reports summed from the daily rollups in main_body.analytics.
+
+    ``?date_from=&date_to=`` (inclusive, default the last 30 days),
+    ``?group_by=`` a comma-separated list of the report's dimensions (empty
+    for one total row) and optional ``city``/``worker``/``status`` filters.
+    """
+    permission_classes = [IsAdmin]
+
+    def report(self, request, build, dimensions):
+        params = AnalyticsQuerySerializer(data=request.query_params, context={'dimensions': dimensions})
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+        return Response({
+            'date_from': data['date_from'],
+            'date_to': data['date_to'],
+            'group_by': data['group_by'],
+            'results': build(data, data['group_by']),
+        })
+
+    @action(detail=False)
+    def orders(self, request):
+        """Orders created, average budget, and budget vs accepted price of the accepted ones."""
+        return self.report(request, analytics.order_report, ('day', 'city', 'status'))
+
+    @action(detail=False)
+    def offers(self, request):
+        """Offers made, acceptance rate and average prices."""
+        return self.report(request, analytics.offer_report, ('day', 'city', 'worker', 'status'))
+
+    @action(detail=False)
+    def ratings(self, request):
+        """Rating counts per star, total and average."""
+        return self.report(request, analytics.rating_report, ('day', 'city', 'worker'))
+
+
+@extend_schema_view(
+    list=extend_schema(responses=OpenApiTypes.OBJECT),
+    create=extend_schema(request=ExportRequestSerializer, responses=OpenApiTypes.OBJECT),
+    download=extend_schema(responses={(200, 'application/octet-stream'): OpenApiTypes.BINARY}),
+)
+class ExportViewSet(viewsets.ViewSet):
+    """Columnar exports for offline analytics (main_body.export), for admins.
+
+    GET lists the exported files, POST appends the rows added since the
+    last export, and ``files/<path>`` downloads one file.
+    """
+    permission_classes = [IsAdmin]
+
+    def list(self, request):
+        table = request.query_params.get('table')
+        if table is not None and table not in export.TABLES:
+            raise serializers.ValidationError({'table': f'Unknown table: {table}'})
+        files = export.list_files(table=table)
+        for file in files:
+            file['url'] = reverse('export-download', kwargs={'path': file['path']}, request=request)
+        return Response({
+            'format': export.file_format(),
+            'tables': export.load_state(settings.EXPORT_DIR)['tables'],
+            'files': files,
+        })
+
+    def create(self, request):
+        params = ExportRequestSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        chosen = params.validated_data.get('tables')
+        tables = [name for name in export.TABLES if name in chosen] if chosen else None
+        return Response(export.export(tables=tables, max_rows=settings.EXPORT_REQUEST_MAX_ROWS))
+
+    @action(detail=False, url_path=r'files/(?P<path>.+)')
+    def download(self, request, path=None):
+        try:
+            full_path = safe_join(settings.EXPORT_DIR, path)
+        except SuspiciousFileOperation:
+            raise Http404
+        name = os.path.basename(full_path)
+        if not name.startswith('part-') or not os.path.isfile(full_path):
+            raise Http404
+        return FileResponse(open(full_path, 'rb'), as_attachment=True, filename=name)